@@ -0,0 +1,61 @@
+"""
+Helpers shared by the benchmarks: timing, and machine-readable output.
+"""
+
+import argparse
+import datetime
+import importlib.metadata
+import json
+import platform
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+def seconds_per_call(
+    f: Callable[[], Any], iterations: int, *, warmup: int = 1000, repeats: int = 5
+) -> float:
+    """
+    Returns the best of several timed runs of f, in seconds per call. Taking
+    the minimum filters out noise from the rest of the machine.
+    """
+    for _ in range(warmup):
+        f()
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            f()
+        samples.append((time.perf_counter() - start) / iterations)
+    return min(samples)
+
+
+def metadata() -> Dict[str, Any]:
+    """
+    Describes the environment a benchmark ran in, so that results from
+    different releases and machines can be told apart.
+    """
+    return {
+        "tesseral_fastapi_version": importlib.metadata.version("tesseral-fastapi"),
+        "python_version": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+def add_output_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+
+
+def report(results: Dict[str, Any], output: Optional[str] = None) -> None:
+    """
+    Prints results, with metadata, as JSON to stdout, and to output if given.
+    """
+    results = {**results, "metadata": metadata()}
+    text = json.dumps(results, indent=2)
+    print(text)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
@@ -0,0 +1,103 @@
+"""
+Compares authenticating a batch of access tokens one at a time with
+authenticate_access_tokens.
+
+The batch holds a fixed share of duplicate tokens, as a replayed audit log
+does. Each token is first authenticated in a sequential loop of
+authenticate_access_token calls, and then with single authenticate_access_tokens
+calls, on the event loop and with a thread pool as the verification executor.
+It reports tokens per second for each, and the speedup over the loop.
+
+Usage:
+    python -m benchmarks.batch_verification [--tokens N] [--duplicates FRACTION] [--threads N] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from tesseral_fastapi._access_token_authenticator import AsyncAccessTokenAuthenticator
+from tests._fixtures import PUBLISHABLE_KEY, ConfigAPIStub, SigningKey
+
+from ._harness import add_output_argument, report
+
+_REPEATS = 5
+
+
+async def _authenticator(
+    signing_key: SigningKey, executor: Optional[Executor]
+) -> AsyncAccessTokenAuthenticator:
+    authenticator = AsyncAccessTokenAuthenticator(
+        publishable_key=PUBLISHABLE_KEY,
+        http_client=ConfigAPIStub(signing_key).http_client(),
+        verification_executor=executor,
+    )
+    await authenticator.project_id()
+    return authenticator
+
+
+async def _sequential(
+    authenticator: AsyncAccessTokenAuthenticator, access_tokens: List[str]
+) -> None:
+    for access_token in access_tokens:
+        await authenticator.authenticate_access_token(access_token=access_token)
+
+
+async def _tokens_per_second(run: Any, access_tokens: List[str]) -> float:
+    # best of several runs, to filter out noise from the rest of the machine
+    samples = []
+    for _ in range(_REPEATS):
+        start = time.perf_counter()
+        await run(access_tokens)
+        samples.append(time.perf_counter() - start)
+    return len(access_tokens) / min(samples)
+
+
+async def _main(tokens: int, duplicates: float, threads: int) -> Dict[str, Any]:
+    signing_key = SigningKey("session_signing_key_bench")
+    distinct = [
+        signing_key.access_token(ttl_seconds=3600 + i)
+        for i in range(tokens - int(tokens * duplicates))
+    ]
+    access_tokens = distinct + random.choices(distinct, k=tokens - len(distinct))
+    random.shuffle(access_tokens)
+
+    on_loop = await _authenticator(signing_key, None)
+    results: Dict[str, Any] = {
+        "sequential_tokens_per_second": await _tokens_per_second(
+            lambda access_tokens: _sequential(on_loop, access_tokens), access_tokens
+        ),
+        "batch_tokens_per_second": await _tokens_per_second(
+            on_loop.authenticate_access_tokens, access_tokens
+        ),
+    }
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        offloaded = await _authenticator(signing_key, executor)
+        results["batch_offloaded_tokens_per_second"] = await _tokens_per_second(
+            offloaded.authenticate_access_tokens, access_tokens
+        )
+
+    sequential = results["sequential_tokens_per_second"]
+    return {
+        "benchmark": "batch_verification",
+        "tokens": tokens,
+        "duplicates": duplicates,
+        "threads": threads,
+        **results,
+        "batch_speedup": results["batch_tokens_per_second"] / sequential,
+        "batch_offloaded_speedup": results["batch_offloaded_tokens_per_second"]
+        / sequential,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--duplicates", type=float, default=0.25)
+    parser.add_argument("--threads", type=int, default=4)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    report(asyncio.run(_main(args.tokens, args.duplicates, args.threads)), args.output)
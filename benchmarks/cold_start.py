@@ -0,0 +1,134 @@
+"""
+Measures how long a fresh worker takes from lifespan startup to serving its
+first 200, with a slow config API.
+
+Modes:
+- lazy: prewarm_on_startup=False, so the first request fetches the config.
+- prewarm: the config is fetched during lifespan startup.
+- snapshot: a config snapshot saved by an earlier worker is loaded during
+  lifespan startup, and refreshed in the background.
+
+Usage:
+    python -m benchmarks.cold_start [--config-api-latency-ms N] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message
+
+from tesseral_fastapi import RequireAuthMiddleware
+from tests._fixtures import PUBLISHABLE_KEY, ConfigAPIStub, SigningKey
+
+from . import middleware_overhead
+from ._harness import add_output_argument, report
+
+_RUNS = 5
+
+
+def _app(config_api: ConfigAPIStub, **kwargs: Any) -> ASGIApp:
+    app = FastAPI()
+
+    @app.get("/")
+    async def read_root():
+        return PlainTextResponse("ok")
+
+    app.add_middleware(
+        RequireAuthMiddleware,
+        publishable_key=PUBLISHABLE_KEY,
+        http_client=config_api.http_client(),
+        **kwargs,
+    )
+    return app
+
+
+async def _startup(app: ASGIApp) -> "asyncio.Future[None]":
+    """Runs lifespan startup, and returns the task running the lifespan."""
+    messages: "asyncio.Queue[Message]" = asyncio.Queue()
+    started = asyncio.Event()
+
+    async def receive() -> Message:
+        return await messages.get()
+
+    async def send(message: Message) -> None:
+        if message["type"] == "lifespan.startup.complete":
+            started.set()
+
+    lifespan = asyncio.ensure_future(
+        app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send)
+    )
+    await messages.put({"type": "lifespan.startup"})
+    await started.wait()
+    return lifespan
+
+
+async def _cold_start(
+    signing_key: SigningKey,
+    scope: Dict[str, Any],
+    latency_seconds: float,
+    **kwargs: Any,
+) -> Dict[str, float]:
+    config_api = ConfigAPIStub(signing_key)
+    config_api.latency_seconds = latency_seconds
+    app = _app(config_api, **kwargs)
+
+    start = time.perf_counter()
+    lifespan = await _startup(app)
+    started = time.perf_counter()
+    assert await middleware_overhead._request(app, scope) == 200
+    served = time.perf_counter()
+
+    lifespan.cancel()
+    return {
+        "startup_ms": (started - start) * 1e3,
+        "first_request_ms": (served - started) * 1e3,
+        "startup_to_first_200_ms": (served - start) * 1e3,
+    }
+
+
+def _best(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    return {key: min(sample[key] for sample in samples) for key in samples[0]}
+
+
+async def _main(latency_seconds: float) -> Dict[str, Any]:
+    signing_key = SigningKey("session_signing_key_bench")
+    scope = middleware_overhead._scope(signing_key.access_token(ttl_seconds=3600))
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, "config.json")
+        # an earlier worker saves the snapshot
+        await _cold_start(signing_key, scope, 0, config_snapshot_path=snapshot_path)
+
+        modes: List[Tuple[str, Dict[str, Any]]] = [
+            ("lazy", {"prewarm_on_startup": False}),
+            ("prewarm", {}),
+            ("snapshot", {"config_snapshot_path": snapshot_path}),
+        ]
+        results = {}
+        for mode, kwargs in modes:
+            results[mode] = _best(
+                [
+                    await _cold_start(signing_key, scope, latency_seconds, **kwargs)
+                    for _ in range(_RUNS)
+                ]
+            )
+
+    return {
+        "benchmark": "cold_start",
+        "config_api_latency_ms": latency_seconds * 1e3,
+        **results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config-api-latency-ms", type=float, default=100)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    report(asyncio.run(_main(args.config_api_latency_ms / 1e3)), args.output)
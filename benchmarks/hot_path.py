@@ -0,0 +1,165 @@
+"""
+Benchmarks each step of the authentication hot path, with no network access:
+access tokens are signed by a locally generated P-256 key, and the config API
+is stubbed out in-process.
+
+Reports:
+- access token verification throughput, with and without building the full
+  AccessTokenClaims
+- config parsing cost, for JWKS of varying size
+- credential classification cost
+- public path matching cost, against 100 public paths and prefixes
+- Auth construction cost
+- RequireAuthMiddleware overhead per request, over a no-op route
+
+Usage:
+    python -m benchmarks.hot_path [--iterations N] [--output FILE]
+"""
+
+import argparse
+import asyncio
+from typing import Any, Dict
+
+from tesseral_fastapi._access_token_authenticator import (
+    _authenticate_access_token,
+    _parse_config,
+    _verify_access_token,
+)
+from tesseral_fastapi._auth import Auth
+from tesseral_fastapi._credentials import classify_credential
+from tesseral_fastapi._public_paths import _PublicPathMatcher
+from tests._fixtures import SigningKey, config_json
+
+from . import middleware_overhead
+from ._harness import add_output_argument, report, seconds_per_call
+
+_JWKS_SIZES = [1, 4, 16, 64]
+
+
+def _access_token_verification(iterations: int) -> Dict[str, Any]:
+    signing_key = SigningKey("session_signing_key_bench")
+    jwks = _parse_config(config_json(signing_key)).jwks
+    access_token = signing_key.access_token(ttl_seconds=3600)
+
+    verify = seconds_per_call(
+        lambda: _verify_access_token(jwks=jwks, access_token=access_token),
+        iterations,
+        warmup=100,
+    )
+    authenticate = seconds_per_call(
+        lambda: _authenticate_access_token(jwks=jwks, access_token=access_token),
+        iterations,
+        warmup=100,
+    )
+    return {
+        "verify_us": verify * 1e6,
+        "verify_per_second": 1 / verify,
+        "verify_and_build_claims_us": authenticate * 1e6,
+        "verify_and_build_claims_per_second": 1 / authenticate,
+    }
+
+
+def _config_parsing(iterations: int) -> Dict[str, Any]:
+    results = {}
+    for size in _JWKS_SIZES:
+        keys = [SigningKey(f"session_signing_key_{i}") for i in range(size)]
+        text = config_json(*keys)
+        results[f"{size}_keys_us"] = (
+            seconds_per_call(
+                lambda: _parse_config(text), max(1, iterations // size), warmup=10
+            )
+            * 1e6
+        )
+    return results
+
+
+def _credential_classification(iterations: int) -> Dict[str, Any]:
+    access_token = SigningKey("session_signing_key_bench").access_token()
+    api_key = "api_key_" + "x" * 40
+    not_a_credential = "Basic dXNlcjpwYXNzd29yZA=="
+    return {
+        "access_token_us": seconds_per_call(
+            lambda: classify_credential(access_token), iterations
+        )
+        * 1e6,
+        "api_key_us": seconds_per_call(lambda: classify_credential(api_key), iterations)
+        * 1e6,
+        "invalid_us": seconds_per_call(
+            lambda: classify_credential(not_a_credential), iterations
+        )
+        * 1e6,
+    }
+
+
+def _public_path_matching(iterations: int) -> Dict[str, Any]:
+    matcher = _PublicPathMatcher(
+        paths=[f"/probes/{i}" for i in range(100)],
+        prefixes=[f"/public/{i}" for i in range(100)],
+        methods=["OPTIONS"],
+    )
+    empty = _PublicPathMatcher()
+    return {
+        "exact_match_us": seconds_per_call(
+            lambda: matcher.matches("GET", "/probes/50"), iterations
+        )
+        * 1e6,
+        "prefix_match_us": seconds_per_call(
+            lambda: matcher.matches("GET", "/public/50/a/b"), iterations
+        )
+        * 1e6,
+        "no_match_us": seconds_per_call(
+            lambda: matcher.matches("GET", "/api/widgets/123"), iterations
+        )
+        * 1e6,
+        "not_configured_us": seconds_per_call(
+            lambda: empty.matches("GET", "/api/widgets/123"), iterations
+        )
+        * 1e6,
+    }
+
+
+def _auth_construction(iterations: int) -> Dict[str, Any]:
+    signing_key = SigningKey("session_signing_key_bench")
+    access_token = signing_key.access_token(actions=["acme.widgets.edit"])
+    jwks = _parse_config(config_json(signing_key)).jwks
+    raw_claims = _verify_access_token(jwks=jwks, access_token=access_token).raw_claims
+
+    def construct() -> Auth:
+        auth = Auth()
+        auth._access_token = access_token
+        auth._access_token_raw_claims = raw_claims
+        return auth
+
+    def construct_and_use() -> None:
+        auth = construct()
+        auth.organization_id()
+        auth.has_permission("acme.widgets.edit")
+
+    return {
+        "construct_us": seconds_per_call(construct, iterations) * 1e6,
+        "construct_and_check_permission_us": seconds_per_call(
+            construct_and_use, iterations
+        )
+        * 1e6,
+    }
+
+
+def _main(iterations: int) -> Dict[str, Any]:
+    return {
+        "benchmark": "hot_path",
+        "iterations": iterations,
+        "access_token_verification": _access_token_verification(iterations // 10),
+        "config_parsing": _config_parsing(iterations // 10),
+        "credential_classification": _credential_classification(iterations),
+        "public_path_matching": _public_path_matching(iterations),
+        "auth_construction": _auth_construction(iterations),
+        "middleware_overhead": asyncio.run(middleware_overhead._main(iterations // 10)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    report(_main(args.iterations), args.output)
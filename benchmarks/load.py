@@ -0,0 +1,327 @@
+"""
+Drives RequireAuthMiddleware with thousands of concurrent requests while the
+config API and the API key backend misbehave.
+
+The app is driven in-process through the raw ASGI interface, by a fixed number
+of concurrent clients for a fixed duration. The config API and API key backend
+are in-process stubs, with injectable latency and errors, and each scenario
+changes them a third and two thirds of the way through the run, while requests
+are in flight. The JWKS is refreshed every second, so refreshes happen under
+load.
+
+Scenarios:
+- steady: well-behaved upstreams.
+- config_latency: the config API takes 50ms to respond.
+- config_outage: the config API fails for the middle third of the run. The
+  middleware serves its stale JWKS throughout.
+- config_outage_no_staleness: as config_outage, but with
+  jwks_max_staleness_seconds=0, so requests fail once the JWKS expires.
+- key_rotation: a third of the way through, a new signing key is published
+  and clients start using it; two thirds of the way through, the old key is
+  retired.
+- backend_errors: the API key backend fails for the middle third of the run.
+
+For each scenario it reports latency percentiles, the share of 401 and 500
+responses, and how many calls were made to each upstream.
+
+Usage:
+    python -m benchmarks.load [--duration SECONDS] [--concurrency N] [--scenario NAME]... [--output FILE]
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message
+
+from tesseral_fastapi import RequireAuthMiddleware
+from tests._fixtures import PUBLISHABLE_KEY, BackendAPIStub, ConfigAPIStub, SigningKey
+
+from ._harness import add_output_argument, report
+
+# Out of every 20 requests: 15 use an access token, 3 a valid API key, 1 an
+# invalid API key, and 1 no credentials at all.
+_CREDENTIAL_MIX = ["access_token"] * 15 + ["api_key"] * 3 + ["bad_api_key", "none"]
+
+# Access tokens are expensive to sign, so each key signs a pool of them up
+# front, which requests cycle through.
+_ACCESS_TOKENS_PER_KEY = 100
+
+_API_KEY = "api_key_load"
+_BAD_API_KEY = "api_key_unknown"
+
+
+class _Run:
+    """The upstream stubs and client state for one scenario."""
+
+    old_key: SigningKey
+    new_key: SigningKey
+    config_api: ConfigAPIStub
+    backend_api: BackendAPIStub
+    access_tokens: Dict[str, List[str]]
+    current_key: SigningKey
+
+    def __init__(
+        self, old_key: SigningKey, new_key: SigningKey, tokens: Dict[str, List[str]]
+    ):
+        self.old_key = old_key
+        self.new_key = new_key
+        self.config_api = ConfigAPIStub(old_key)
+        self.backend_api = BackendAPIStub({_API_KEY: {"organizationId": "org_load"}})
+        self.access_tokens = tokens
+        self.current_key = old_key
+
+    def credential(self, i: int) -> Optional[str]:
+        kind = _CREDENTIAL_MIX[i % len(_CREDENTIAL_MIX)]
+        if kind == "access_token":
+            tokens = self.access_tokens[self.current_key.kid]
+            return tokens[i % len(tokens)]
+        if kind == "api_key":
+            return _API_KEY
+        if kind == "bad_api_key":
+            return _BAD_API_KEY
+        return None
+
+
+def _start_config_outage(run: _Run) -> None:
+    run.config_api.status_code = 503
+
+
+def _end_config_outage(run: _Run) -> None:
+    run.config_api.status_code = 200
+
+
+def _start_backend_errors(run: _Run) -> None:
+    run.backend_api.status_code = 500
+
+
+def _end_backend_errors(run: _Run) -> None:
+    run.backend_api.status_code = None
+
+
+def _publish_new_key(run: _Run) -> None:
+    run.config_api.keys = [run.old_key, run.new_key]
+    run.current_key = run.new_key
+
+
+def _retire_old_key(run: _Run) -> None:
+    run.config_api.keys = [run.new_key]
+
+
+def _set_config_latency(run: _Run) -> None:
+    run.config_api.latency_seconds = 0.05
+
+
+class _Scenario:
+    # Extra RequireAuthMiddleware arguments.
+    middleware_kwargs: Dict[str, Any]
+    # Called before the run starts.
+    setup: Optional[Callable[[_Run], None]]
+    # Called a third of the way through the run.
+    at_one_third: Optional[Callable[[_Run], None]]
+    # Called two thirds of the way through the run.
+    at_two_thirds: Optional[Callable[[_Run], None]]
+
+    def __init__(
+        self,
+        *,
+        middleware_kwargs: Optional[Dict[str, Any]] = None,
+        setup: Optional[Callable[[_Run], None]] = None,
+        at_one_third: Optional[Callable[[_Run], None]] = None,
+        at_two_thirds: Optional[Callable[[_Run], None]] = None,
+    ):
+        self.middleware_kwargs = middleware_kwargs or {}
+        self.setup = setup
+        self.at_one_third = at_one_third
+        self.at_two_thirds = at_two_thirds
+
+
+_SCENARIOS = {
+    "steady": _Scenario(),
+    "config_latency": _Scenario(setup=_set_config_latency),
+    "config_outage": _Scenario(
+        at_one_third=_start_config_outage, at_two_thirds=_end_config_outage
+    ),
+    "config_outage_no_staleness": _Scenario(
+        middleware_kwargs={"jwks_max_staleness_seconds": 0},
+        at_one_third=_start_config_outage,
+        at_two_thirds=_end_config_outage,
+    ),
+    "key_rotation": _Scenario(
+        at_one_third=_publish_new_key, at_two_thirds=_retire_old_key
+    ),
+    "backend_errors": _Scenario(
+        at_one_third=_start_backend_errors, at_two_thirds=_end_backend_errors
+    ),
+}
+
+
+def _app(run: _Run, scenario: _Scenario) -> ASGIApp:
+    app = FastAPI()
+
+    @app.get("/")
+    async def read_root():
+        return PlainTextResponse("ok")
+
+    app.add_middleware(
+        RequireAuthMiddleware,
+        publishable_key=PUBLISHABLE_KEY,
+        jwks_refresh_interval_seconds=1,
+        http_client=run.config_api.http_client(),
+        api_keys_enabled=True,
+        tesseral_client=run.backend_api.tesseral_client(),
+        **scenario.middleware_kwargs,
+    )
+    return app
+
+
+async def _request(app: ASGIApp, credential: Optional[str]) -> int:
+    headers = [(b"host", b"localhost")]
+    if credential is not None:
+        headers.append((b"authorization", f"Bearer {credential}".encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/",
+        "raw_path": b"/",
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 1234),
+        "server": ("localhost", 80),
+    }
+    status = 0
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    # Like a server, treat an exception escaping the app as a 500.
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        return 500
+    return status
+
+
+def _percentile(samples: List[float], p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+async def _run_scenario(
+    scenario: _Scenario,
+    old_key: SigningKey,
+    new_key: SigningKey,
+    access_tokens: Dict[str, List[str]],
+    duration_seconds: float,
+    concurrency: int,
+) -> Dict[str, Any]:
+    run = _Run(old_key, new_key, access_tokens)
+    if scenario.setup:
+        scenario.setup(run)
+    app = _app(run, scenario)
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    counter = itertools.count()
+    start = time.perf_counter()
+    deadline = start + duration_seconds
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            request_start = time.perf_counter()
+            status = await _request(app, run.credential(next(counter)))
+            latencies.append(time.perf_counter() - request_start)
+            statuses[status] = statuses.get(status, 0) + 1
+            # Yield between requests, as a server would, even if handling the
+            # request never had to wait on anything.
+            await asyncio.sleep(0)
+
+    async def events() -> None:
+        await asyncio.sleep(duration_seconds / 3)
+        if scenario.at_one_third:
+            scenario.at_one_third(run)
+        await asyncio.sleep(duration_seconds / 3)
+        if scenario.at_two_thirds:
+            scenario.at_two_thirds(run)
+
+    await asyncio.gather(events(), *(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    requests = len(latencies)
+
+    return {
+        "requests": requests,
+        "requests_per_second": requests / elapsed,
+        "latency_p50_ms": _percentile(latencies, 0.5) * 1e3,
+        "latency_p99_ms": _percentile(latencies, 0.99) * 1e3,
+        "latency_p999_ms": _percentile(latencies, 0.999) * 1e3,
+        "status_counts": {str(k): v for k, v in sorted(statuses.items())},
+        # The credential mix alone makes 10% of requests 401s.
+        "unauthorized_rate": statuses.get(401, 0) / requests,
+        "server_error_rate": statuses.get(500, 0) / requests,
+        "config_api_calls": run.config_api.requests,
+        "backend_api_calls": run.backend_api.requests,
+    }
+
+
+async def _main(
+    duration_seconds: float, concurrency: int, scenarios: List[str]
+) -> Dict[str, Any]:
+    old_key = SigningKey("session_signing_key_old")
+    new_key = SigningKey("session_signing_key_new")
+    access_tokens = {
+        key.kid: [
+            key.access_token(ttl_seconds=3600 + i)
+            for i in range(_ACCESS_TOKENS_PER_KEY)
+        ]
+        for key in [old_key, new_key]
+    }
+
+    results = {}
+    for name in scenarios:
+        results[name] = await _run_scenario(
+            _SCENARIOS[name],
+            old_key,
+            new_key,
+            access_tokens,
+            duration_seconds,
+            concurrency,
+        )
+    return {
+        "benchmark": "load",
+        "duration_seconds": duration_seconds,
+        "concurrency": concurrency,
+        "scenarios": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=6)
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(_SCENARIOS),
+        help="A scenario to run. May be repeated. Defaults to all of them.",
+    )
+    add_output_argument(parser)
+    args = parser.parse_args()
+    scenarios = args.scenario or list(_SCENARIOS)
+    # Failed background refreshes are expected in some scenarios; keep their
+    # warnings out of the output.
+    logging.getLogger("tesseral_fastapi").setLevel(logging.ERROR)
+    report(asyncio.run(_main(args.duration, args.concurrency, scenarios)), args.output)
@@ -0,0 +1,129 @@
+"""
+Measures the per-request overhead of RequireAuthMiddleware on a trivial route.
+
+The app is driven in-process through the raw ASGI interface, and the config API
+is stubbed out, so the numbers only include middleware and routing cost.
+
+Usage:
+    python -m benchmarks.middleware_overhead [--requests N] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message
+
+from tesseral_fastapi import RequireAuthMiddleware
+from tests._fixtures import PUBLISHABLE_KEY, ConfigAPIStub, SigningKey
+
+from ._harness import add_output_argument, report
+
+
+def _app(
+    *, middleware: bool, signing_key: SigningKey, access_token_cache_size: int = 0
+) -> ASGIApp:
+    app = FastAPI()
+
+    @app.get("/")
+    async def read_root():
+        return PlainTextResponse("ok")
+
+    if middleware:
+        app.add_middleware(
+            RequireAuthMiddleware,
+            publishable_key=PUBLISHABLE_KEY,
+            http_client=ConfigAPIStub(signing_key).http_client(),
+            access_token_cache_size=access_token_cache_size,
+        )
+
+    return app
+
+
+def _scope(access_token: str) -> Dict[str, Any]:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/",
+        "raw_path": b"/",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"user-agent", b"benchmark"),
+            (b"authorization", f"Bearer {access_token}".encode()),
+        ],
+        "client": ("127.0.0.1", 1234),
+        "server": ("localhost", 80),
+    }
+
+
+async def _request(app: ASGIApp, scope: Dict[str, Any]) -> int:
+    status = 0
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(dict(scope), receive, send)
+    return status
+
+
+async def _seconds_per_request(
+    app: ASGIApp, scope: Dict[str, Any], requests: int
+) -> float:
+    # warm up caches, the config fetch, and the middleware stack
+    for _ in range(100):
+        assert await _request(app, scope) == 200
+
+    samples: List[float] = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(requests):
+            await _request(app, scope)
+        samples.append((time.perf_counter() - start) / requests)
+    return min(samples)
+
+
+async def _main(requests: int) -> Dict[str, Any]:
+    signing_key = SigningKey("session_signing_key_bench")
+    scope = _scope(signing_key.access_token(ttl_seconds=3600))
+
+    baseline = await _seconds_per_request(
+        _app(middleware=False, signing_key=signing_key), scope, requests
+    )
+    with_middleware = await _seconds_per_request(
+        _app(middleware=True, signing_key=signing_key), scope, requests
+    )
+    with_cache = await _seconds_per_request(
+        _app(middleware=True, signing_key=signing_key, access_token_cache_size=1024),
+        scope,
+        requests,
+    )
+    return {
+        "benchmark": "middleware_overhead",
+        "requests": requests,
+        "no_middleware_us": baseline * 1e6,
+        "require_auth_middleware_us": with_middleware * 1e6,
+        "overhead_us": (with_middleware - baseline) * 1e6,
+        "require_auth_middleware_cached_us": with_cache * 1e6,
+        "cached_overhead_us": (with_cache - baseline) * 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    report(asyncio.run(_main(args.requests)), args.output)
@@ -0,0 +1,126 @@
+"""
+Drives one SyncAccessTokenAuthenticator from many threads at once.
+
+Each thread verifies a share of a fixed pool of access tokens, over and over,
+for a fixed duration. The JWKS is refreshed every second, with a config API
+that takes 20ms to respond, so refreshes happen while threads are verifying.
+
+For each thread count, and with the access token cache on and off, it reports
+verification throughput, latency percentiles, and how many calls were made to
+the config API, which single-flight refreshes keep to about one per second.
+
+Run it on a free-threaded build of Python (e.g. python3.13t) too, to see how
+verification scales when threads truly run in parallel; the results say
+whether the GIL was enabled.
+
+Usage:
+    python -m benchmarks.sync_threads [--duration SECONDS] [--threads N]... [--output FILE]
+"""
+
+import argparse
+import sys
+import threading
+import time
+from typing import Any, Dict, List
+
+from tesseral_fastapi import SyncAccessTokenAuthenticator
+from tests._fixtures import PUBLISHABLE_KEY, ConfigAPIStub, SigningKey
+
+from ._harness import add_output_argument, report
+
+_ACCESS_TOKENS = 1000
+
+
+def _percentile(samples: List[float], p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def _run(
+    signing_key: SigningKey,
+    access_tokens: List[str],
+    threads: int,
+    duration_seconds: float,
+    access_token_cache_size: int,
+) -> Dict[str, Any]:
+    config_api = ConfigAPIStub(signing_key)
+    config_api.latency_seconds = 0.02
+    authenticator = SyncAccessTokenAuthenticator(
+        publishable_key=PUBLISHABLE_KEY,
+        http_client=config_api.sync_http_client(),
+        jwks_refresh_interval_seconds=1,
+        access_token_cache_size=access_token_cache_size,
+    )
+    authenticator.prewarm()
+
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+    start_barrier = threading.Barrier(threads + 1)
+    deadline = 0.0
+
+    def worker(i: int) -> None:
+        samples = latencies[i]
+        start_barrier.wait()
+        j = i
+        while time.perf_counter() < deadline:
+            request_start = time.perf_counter()
+            authenticator.verify_access_token(
+                access_token=access_tokens[j % len(access_tokens)]
+            )
+            samples.append(time.perf_counter() - request_start)
+            j += threads
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    start = time.perf_counter()
+    deadline = start + duration_seconds
+    start_barrier.wait()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    samples = [sample for thread_samples in latencies for sample in thread_samples]
+    return {
+        "verifications": len(samples),
+        "verifications_per_second": len(samples) / elapsed,
+        "latency_p50_us": _percentile(samples, 0.5) * 1e6,
+        "latency_p99_us": _percentile(samples, 0.99) * 1e6,
+        "latency_max_us": max(samples) * 1e6,
+        "config_api_calls": config_api.requests,
+    }
+
+
+def _main(duration_seconds: float, thread_counts: List[int]) -> Dict[str, Any]:
+    signing_key = SigningKey("session_signing_key_bench")
+    access_tokens = [
+        signing_key.access_token(ttl_seconds=3600 + i) for i in range(_ACCESS_TOKENS)
+    ]
+
+    results: Dict[str, Any] = {}
+    for cache_size, mode in [(0, "uncached"), (_ACCESS_TOKENS, "cached")]:
+        results[mode] = {
+            f"{threads}_threads": _run(
+                signing_key, access_tokens, threads, duration_seconds, cache_size
+            )
+            for threads in thread_counts
+        }
+    return {
+        "benchmark": "sync_threads",
+        "duration_seconds": duration_seconds,
+        "gil_enabled": getattr(sys, "_is_gil_enabled", lambda: True)(),
+        **results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=3)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        action="append",
+        help="A thread count to run with. May be repeated. Defaults to 1, 8, and 64.",
+    )
+    add_output_argument(parser)
+    args = parser.parse_args()
+    report(_main(args.duration, args.threads or [1, 8, 64]), args.output)
@@ -0,0 +1,97 @@
+"""
+Measures the per-token cost of credential classification and access token
+parsing, comparing the previous implementations with the current ones.
+
+Only parsing is measured; the signature check itself is excluded, since its
+cost does not change.
+
+Usage:
+    python -m benchmarks.token_parsing [--iterations N] [--output FILE]
+"""
+
+import argparse
+import base64
+import re
+from typing import Any, Callable, Dict
+
+from tesseral_fastapi._access_token_authenticator import (
+    _AccessTokenHeader,
+    _base64_url_decode,
+    _parse_access_token_header,
+)
+from tesseral_fastapi._credentials import classify_credential
+from tests._fixtures import SigningKey
+
+from ._harness import add_output_argument, report, seconds_per_call
+
+
+def _previous_classify_credential(value: str) -> str:
+    if re.match(r"^[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+$", value):
+        return "access_token"
+    if re.match(r"^[a-z0-9_]+$", value):
+        return "api_key"
+    return ""
+
+
+def _previous_base64_url_decode(s: str) -> bytes:
+    s += "=" * (4 - len(s) % 4)
+    return base64.urlsafe_b64decode(s)
+
+
+def _previous_parse(access_token: str) -> bytes:
+    raw_header, raw_claims, raw_signature = access_token.split(".")
+    header = _AccessTokenHeader.model_validate_json(
+        _previous_base64_url_decode(raw_header)
+    )
+    _previous_base64_url_decode(raw_signature)
+    assert header.kid
+    return (raw_header + "." + raw_claims).encode()
+
+
+def _parse(access_token: str) -> bytes:
+    raw_header, raw_claims, raw_signature = access_token.split(".")
+    header = _parse_access_token_header(raw_header)
+    _base64_url_decode(raw_signature)
+    assert header.kid
+    return access_token[: len(raw_header) + 1 + len(raw_claims)].encode()
+
+
+def _compare(
+    previous: Callable[[str], Any],
+    current: Callable[[str], Any],
+    value: str,
+    iterations: int,
+) -> Dict[str, float]:
+    previous_seconds = seconds_per_call(lambda: previous(value), iterations)
+    current_seconds = seconds_per_call(lambda: current(value), iterations)
+    return {
+        "previous_us": previous_seconds * 1e6,
+        "current_us": current_seconds * 1e6,
+        "saved_us": (previous_seconds - current_seconds) * 1e6,
+    }
+
+
+def _main(iterations: int) -> Dict[str, Any]:
+    access_token = SigningKey("session_signing_key_bench").access_token()
+    api_key = "api_key_" + "x" * 40
+    return {
+        "benchmark": "token_parsing",
+        "iterations": iterations,
+        "classify_access_token": _compare(
+            _previous_classify_credential, classify_credential, access_token, iterations
+        ),
+        "classify_api_key": _compare(
+            _previous_classify_credential, classify_credential, api_key, iterations
+        ),
+        "parse_access_token": _compare(
+            _previous_parse, _parse, access_token, iterations
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    report(_main(args.iterations), args.output)
@@ -0,0 +1,99 @@
+"""
+Compares access token verification on the event loop with verification
+offloaded to a thread pool, at high concurrency.
+
+For each mode it reports verification throughput, and how late a 1ms ticker
+running on the same event loop wakes up, which is what every other coroutine
+on the loop experiences while verifications are in progress.
+
+Usage:
+    python -m benchmarks.verification_offload [--tokens N] [--threads N] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from tesseral_fastapi._access_token_authenticator import AsyncAccessTokenAuthenticator
+from tests._fixtures import PUBLISHABLE_KEY, ConfigAPIStub, SigningKey
+
+from ._harness import add_output_argument, report
+
+_TICK_SECONDS = 0.001
+
+
+async def _ticker(lateness: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(_TICK_SECONDS)
+        lateness.append(time.perf_counter() - start - _TICK_SECONDS)
+
+
+def _percentile(samples: List[float], p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+async def _run(
+    signing_key: SigningKey, access_tokens: List[str], executor: Optional[Executor]
+) -> Dict[str, Any]:
+    authenticator = AsyncAccessTokenAuthenticator(
+        publishable_key=PUBLISHABLE_KEY,
+        http_client=ConfigAPIStub(signing_key).http_client(),
+        verification_executor=executor,
+    )
+    await authenticator.project_id()
+
+    lateness: List[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_ticker(lateness, stop))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            authenticator.authenticate_access_token(access_token=access_token)
+            for access_token in access_tokens
+        )
+    )
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    return {
+        "tokens_per_second": len(access_tokens) / elapsed,
+        "loop_lag_p50_ms": _percentile(lateness, 0.5) * 1e3,
+        "loop_lag_p99_ms": _percentile(lateness, 0.99) * 1e3,
+        "loop_lag_max_ms": max(lateness) * 1e3,
+    }
+
+
+async def _main(tokens: int, threads: int) -> Dict[str, Any]:
+    signing_key = SigningKey("session_signing_key_bench")
+    # distinct tokens, so that nothing can be served from a cache
+    access_tokens = [
+        signing_key.access_token(ttl_seconds=3600 + i) for i in range(tokens)
+    ]
+
+    on_loop = await _run(signing_key, access_tokens, None)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        offloaded = await _run(signing_key, access_tokens, executor)
+
+    return {
+        "benchmark": "verification_offload",
+        "tokens": tokens,
+        "threads": threads,
+        "on_event_loop": on_loop,
+        "offloaded": offloaded,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    add_output_argument(parser)
+    args = parser.parse_args()
+    report(asyncio.run(_main(args.tokens, args.threads)), args.output)
@@ -1,5 +1,28 @@
 from ._middleware import RequireAuthMiddleware, get_auth
+from ._access_token_authenticator import InvalidAccessTokenException
+from ._api_key_authenticator import AsyncApiKeyAuthenticator
 from ._auth import Auth
+from ._cache import CacheStats
+from ._circuit_breaker import CircuitBreaker, CircuitOpenError
+from ._dependencies import RequireAuth, require_permission
 from ._errors import NotAnAccessTokenError
+from ._sync_access_token_authenticator import SyncAccessTokenAuthenticator
+from ._observer import AuthObserver, Histogram, InMemoryAuthObserver
 
-__all__ = ["RequireAuthMiddleware", "get_auth", "Auth", "NotAnAccessTokenError"]
+__all__ = [
+    "RequireAuthMiddleware",
+    "get_auth",
+    "AsyncApiKeyAuthenticator",
+    "SyncAccessTokenAuthenticator",
+    "InvalidAccessTokenException",
+    "Auth",
+    "CacheStats",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "RequireAuth",
+    "require_permission",
+    "NotAnAccessTokenError",
+    "AuthObserver",
+    "Histogram",
+    "InMemoryAuthObserver",
+]
@@ -1,8 +1,25 @@
+import asyncio
 import base64
 import binascii
+import functools
+import hashlib
 import json
+import logging
+import threading
 import time
-from typing import Optional, List, Dict
+from concurrent.futures import Executor
+from typing import (
+    Any,
+    Callable,
+    Optional,
+    List,
+    Dict,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives.asymmetric.ec import (
@@ -13,24 +30,248 @@ from cryptography.hazmat.primitives.asymmetric.ec import (
 )
 from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
 from cryptography.hazmat.primitives.hashes import SHA256
-from httpx import AsyncClient
-from pydantic import BaseModel, ValidationError, Field
+from httpx import USE_CLIENT_DEFAULT, AsyncClient
+from pydantic import BaseModel, ConfigDict, ValidationError, Field
 from tesseral.core import parse_obj_as
 from tesseral.types.access_token_claims import AccessTokenClaims
 
+from ._cache import CacheStats, _LRUCache, _StripedLRUCache
+from ._circuit_breaker import CircuitBreaker, CircuitOpenError
+from ._config_file import (
+    _ConfigSnapshot,
+    _config_file_path,
+    _read_config_snapshot,
+    _try_lock_config_file,
+    _unlock_config_file,
+    _write_config_snapshot,
+)
+from ._observer import AuthObserver, _stage_timer
+
+_logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+# How many unknown key IDs to remember between on-demand JWKS refreshes.
+_UNKNOWN_KID_CACHE_SIZE = 1024
+
+# How long to wait for another process to share a config before fetching it
+# ourselves, and how often to check whether it has.
+_SHARED_CONFIG_WAIT_SECONDS = 5
+_SHARED_CONFIG_POLL_SECONDS = 0.05
+
+# How long a config loaded from a snapshot is served without waiting on a
+# refresh, even if it has expired.
+_CONFIG_SNAPSHOT_GRACE_SECONDS = 30
+
+# How many access tokens authenticate_access_tokens verifies per unit of work,
+# on the event loop or the verification executor.
+_BATCH_CHUNK_SIZE = 64
+
+# How long an access token that can never become valid is remembered, so that
+# replaying it is rejected without verifying it again.
+_REJECTED_ACCESS_TOKEN_TTL_SECONDS = 600
+
+# The least time between background refreshes, however short the refresh
+# intervals, so that the refresher never spins on the config API.
+_MIN_BACKGROUND_REFRESH_SECONDS = 1
+
 
 class InvalidAccessTokenException(Exception):
     pass
 
 
+class _ExpiredAccessTokenException(InvalidAccessTokenException):
+    # The token's exp if it has expired, or None if it is not yet valid.
+    exp: Optional[float]
+
+    def __init__(self, exp: Optional[float] = None):
+        super().__init__()
+        self.exp = exp
+
+
+class _InvalidSignatureException(InvalidAccessTokenException):
+    pass
+
+
+class _UnknownKeyIdException(InvalidAccessTokenException):
+    kid: str
+
+    def __init__(self, kid: str):
+        super().__init__()
+        self.kid = kid
+
+
+class _AccessTokenRejections:
+    """
+    Counts rejected access tokens by the stage of verification that rejected
+    them, and remembers the tokens that can never become valid, so that a
+    replayed one is rejected without being verified again.
+
+    Tokens rejected for an unknown kid, or for not being valid yet, are not
+    remembered, since they may still become valid.
+
+    It is safe to share between threads. Lookups only lock a stripe of the
+    cache, and the counters are only locked to count a rejection.
+    """
+
+    # Maps the hash of a rejected token to the exception it was rejected with,
+    # and when the rejection starts to hold.
+    _cache: Optional[
+        _StripedLRUCache[bytes, Tuple[Type[InvalidAccessTokenException], float]]
+    ]
+    _counts: Dict[str, int]
+    _counts_lock: threading.Lock
+
+    def __init__(self, cache_size: int):
+        self._cache = _StripedLRUCache(cache_size) if cache_size > 0 else None
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+
+    @property
+    def cache_enabled(self) -> bool:
+        return self._cache is not None
+
+    def check(
+        self,
+        cache_key: bytes,
+        now_unix_seconds: float,
+        observer: Optional[AuthObserver],
+    ) -> Optional[InvalidAccessTokenException]:
+        """
+        Returns the exception to reject a remembered token with, or None if the
+        token is not remembered.
+        """
+        if self._cache is None:
+            return None
+
+        entry = self._cache.get(cache_key, now_unix_seconds)
+        hit = entry is not None and now_unix_seconds > entry[1]
+        if observer is not None:
+            observer.on_cache_lookup("rejected_access_token", hit)
+        if not hit:
+            return None
+
+        self._count("rejected_cache")
+
+        assert entry is not None  # appease mypy
+        exception_type, exp = entry
+        if exception_type is _ExpiredAccessTokenException:
+            return _ExpiredAccessTokenException(exp)
+        return exception_type()
+
+    def record(
+        self,
+        cache_key: Optional[bytes],
+        e: InvalidAccessTokenException,
+        now_unix_seconds: float,
+    ) -> None:
+        stage = _rejection_stage(e)
+        self._count(stage)
+        if (
+            self._cache is None
+            or cache_key is None
+            or stage in ("unknown_kid", "not_yet_valid")
+        ):
+            return
+
+        # An expired token is only rejected after its exp, in case a caller
+        # passes an earlier now_unix_seconds later on.
+        valid_from = (
+            e.exp
+            if isinstance(e, _ExpiredAccessTokenException) and e.exp is not None
+            else float("-inf")
+        )
+        self._cache.put(
+            cache_key,
+            (type(e), valid_from),
+            now_unix_seconds + _REJECTED_ACCESS_TOKEN_TTL_SECONDS,
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def cache_stats(self) -> CacheStats:
+        if self._cache is None:
+            return CacheStats(hits=0, misses=0, evictions=0, size=0)
+        return self._cache.stats()
+
+    def _count(self, stage: str) -> None:
+        with self._counts_lock:
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+
+
+def _rejection_stage(e: InvalidAccessTokenException) -> str:
+    if isinstance(e, _UnknownKeyIdException):
+        return "unknown_kid"
+    if isinstance(e, _ExpiredAccessTokenException):
+        return "not_yet_valid" if e.exp is None else "expired"
+    if isinstance(e, _InvalidSignatureException):
+        return "signature"
+    return "malformed"
+
+
 class AsyncAccessTokenAuthenticator:
+    """
+    Verifies Tesseral access tokens against the JWKS of a project.
+
+    By default, verification runs on the event loop. If a verification_executor
+    is provided, the CPU-bound part of verification (signature verification and
+    claims parsing) runs on it instead, with at most verification_max_pending
+    verifications submitted at once; further callers wait for a free slot.
+    The config is replaced, never modified, so that verifications on executor
+    threads always see a JWKS and project ID that belong together.
+
+    If a shared_config_directory is provided, the processes on this host that
+    use the same directory share fetched configs through a file in it: one
+    process fetches the config while the others wait for it, instead of each
+    fetching its own. Processes fall back to fetching the config themselves if
+    the shared file cannot be used.
+
+    If a config_snapshot_path is provided, the last config fetched is saved
+    there, and a fresh process loads it instead of waiting on the config API,
+    if it is no more than jwks_max_staleness_seconds past expiry. The config is
+    then refreshed in the background.
+
+    Config fetches go through a circuit_breaker, so that while the config API
+    is down, requests fail fast (or are served stale keys) instead of each
+    sending a request of its own, and background refreshes back off
+    exponentially.
+
+    Verification rejects tokens as cheaply as it can: it checks a token's
+    structure, then its kid, then its exp and nbf, before its signature, so
+    that expired and garbled tokens cost no signature verification. Up to
+    rejected_access_token_cache_size tokens that can never become valid are
+    remembered for a while, so that replaying them costs a hash and a lookup.
+    Rejections are counted by stage; see access_token_rejection_stats.
+
+    If an observer is provided, it is told about config fetches, JWKS refreshes,
+    verification stage timings, and access token cache lookups.
+    """
+
     _publishable_key: str
     _config_api_hostname: str
     _jwks_refresh_interval_seconds: int
+    _jwks_soft_refresh_interval_seconds: float
+    _jwks_max_staleness_seconds: int
+    _jwks_unknown_kid_refresh_interval_seconds: Optional[int]
     _http_client: AsyncClient
-    _project_id: str
-    _jwks: Dict[str, EllipticCurvePublicKey]
-    _jwks_next_refresh_unix_seconds: float
+    # Replaced, never modified, so that it can be read without locks.
+    _config: "_ConfigState"
+    _jwks_next_unknown_kid_refresh_unix_seconds: float
+    _unknown_kids: _LRUCache[str, bool]
+    _access_token_cache: Optional[_LRUCache[bytes, "_VerifiedAccessToken"]]
+    _rejections: _AccessTokenRejections
+    _config_refresh: Optional["asyncio.Future[None]"]
+    _background_refresh: Optional["asyncio.Task[None]"]
+    _verification_executor: Optional[Executor]
+    _verification_slots: asyncio.Semaphore
+    _observer: Optional[AuthObserver]
+    _shared_config_directory: Optional[str]
+    _config_snapshot_path: Optional[str]
+    _config_snapshot_checked: bool
+    _config_api_timeout_seconds: Optional[float]
+    _circuit_breaker: CircuitBreaker
 
     def __init__(
         self,
@@ -38,44 +279,615 @@ class AsyncAccessTokenAuthenticator:
         publishable_key: str,
         config_api_hostname: str = "config.tesseral.com",
         jwks_refresh_interval_seconds: int = 3600,
+        jwks_soft_refresh_interval_seconds: Optional[int] = None,
+        jwks_max_staleness_seconds: int = 3600,
+        jwks_unknown_kid_refresh_interval_seconds: Optional[int] = 60,
         http_client: Optional[AsyncClient] = None,
+        access_token_cache_size: int = 0,
+        rejected_access_token_cache_size: int = 1024,
+        verification_executor: Optional[Executor] = None,
+        verification_max_pending: int = 256,
+        observer: Optional[AuthObserver] = None,
+        shared_config_directory: Optional[str] = None,
+        config_snapshot_path: Optional[str] = None,
+        config_api_timeout_seconds: Optional[float] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
     ):
         self._publishable_key = publishable_key
         self._config_api_hostname = config_api_hostname
         self._jwks_refresh_interval_seconds = jwks_refresh_interval_seconds
+        self._jwks_soft_refresh_interval_seconds = _soft_refresh_interval_seconds(
+            jwks_refresh_interval_seconds, jwks_soft_refresh_interval_seconds
+        )
+        self._jwks_max_staleness_seconds = jwks_max_staleness_seconds
+        self._jwks_unknown_kid_refresh_interval_seconds = (
+            jwks_unknown_kid_refresh_interval_seconds
+        )
         self._http_client = http_client or AsyncClient()
-        self._project_id = ""
-        self._jwks = {}
-        self._jwks_next_refresh_unix_seconds = 0
+        self._config = _NO_CONFIG
+        self._jwks_next_unknown_kid_refresh_unix_seconds = 0
+        self._unknown_kids = _LRUCache(_UNKNOWN_KID_CACHE_SIZE)
+        self._access_token_cache = (
+            _LRUCache(access_token_cache_size) if access_token_cache_size > 0 else None
+        )
+        self._rejections = _AccessTokenRejections(rejected_access_token_cache_size)
+        self._config_refresh = None
+        self._background_refresh = None
+        self._verification_executor = verification_executor
+        self._verification_slots = asyncio.Semaphore(verification_max_pending)
+        self._observer = observer
+        self._shared_config_directory = shared_config_directory
+        self._config_snapshot_path = config_snapshot_path
+        self._config_snapshot_checked = False
+        self._config_api_timeout_seconds = config_api_timeout_seconds
+        self._circuit_breaker = circuit_breaker or CircuitBreaker()
 
     async def project_id(self) -> str:
         await self._update_config()
-        return self._project_id
+        return self._config.project_id
 
     async def authenticate_access_token(
         self, *, access_token: str, now_unix_seconds: Optional[float] = None
     ) -> AccessTokenClaims:
+        verified = await self.verify_access_token(
+            access_token=access_token, now_unix_seconds=now_unix_seconds
+        )
+        return verified.claims()
+
+    async def verify_access_token(
+        self, *, access_token: str, now_unix_seconds: Optional[float] = None
+    ) -> "_VerifiedAccessToken":
+        """
+        Like authenticate_access_token, but only validates the claims needed to
+        check the token's validity period. The rest are validated on first call
+        to claims() on the result.
+        """
         await self._update_config()
-        return _authenticate_access_token(
-            jwks=self._jwks,
+        if now_unix_seconds is None:
+            now_unix_seconds = time.time()
+
+        cache_key = self._cache_key(access_token)
+        if cache_key is not None:
+            cached = self._cached_access_token(cache_key, now_unix_seconds)
+            if cached is not None:
+                return cached
+            rejection = self._rejections.check(
+                cache_key, now_unix_seconds, self._observer
+            )
+            if rejection is not None:
+                raise rejection
+
+        try:
+            verified = await self._verify_access_token(access_token, now_unix_seconds)
+        except InvalidAccessTokenException as e:
+            self._rejections.record(cache_key, e, now_unix_seconds)
+            raise
+        if self._access_token_cache is not None:
+            assert cache_key is not None  # appease mypy
+            self._access_token_cache.put(cache_key, verified, verified.exp)
+        return verified
+
+    async def authenticate_access_tokens(
+        self,
+        access_tokens: Sequence[str],
+        *,
+        now_unix_seconds: Optional[float] = None,
+    ) -> List[Union[AccessTokenClaims, InvalidAccessTokenException]]:
+        """
+        Authenticates a batch of access tokens, e.g. the several tokens a
+        gateway forwards with one request, or stored tokens re-verified by an
+        audit job.
+
+        Returns, for each token in order, its claims, or the
+        InvalidAccessTokenException that authenticate_access_token would have
+        raised for it.
+
+        The config is checked once for the whole batch, and each distinct token
+        is verified once. Tokens are grouped by kid, so that an unknown kid
+        triggers at most one refresh, and verified in chunks: on the
+        verification_executor, if one is set, with each chunk taking one of the
+        verification_max_pending slots; otherwise on the event loop, yielding
+        between chunks.
+
+        Raises:
+            Exception: If no config could be loaded.
+        """
+        await self._update_config()
+        if now_unix_seconds is None:
+            now_unix_seconds = time.time()
+
+        results: Dict[str, Union[_VerifiedAccessToken, InvalidAccessTokenException]]
+        results = {}
+        cache_keys: Dict[str, Optional[bytes]] = {}
+        kid_groups: Dict[str, List[str]] = {}
+        for access_token in dict.fromkeys(access_tokens):
+            cache_key = self._cache_key(access_token)
+            if cache_key is not None:
+                cached = self._cached_access_token(cache_key, now_unix_seconds)
+                if cached is not None:
+                    results[access_token] = cached
+                    continue
+                rejection = self._rejections.check(
+                    cache_key, now_unix_seconds, self._observer
+                )
+                if rejection is not None:
+                    results[access_token] = rejection
+                    continue
+            cache_keys[access_token] = cache_key
+
+            try:
+                kid = _kid(access_token)
+            except InvalidAccessTokenException as e:
+                results[access_token] = e
+                continue
+            kid_groups.setdefault(kid, []).append(access_token)
+
+        for kid in kid_groups:
+            if kid not in self._config.jwks:
+                await self._refresh_config_for_unknown_kid(kid)
+
+        chunks = [
+            group[i : i + _BATCH_CHUNK_SIZE]
+            for group in kid_groups.values()
+            for i in range(0, len(group), _BATCH_CHUNK_SIZE)
+        ]
+        verify = functools.partial(
+            _verify_access_tokens,
+            self._config.jwks,
+            now_unix_seconds=now_unix_seconds,
+            observer=self._observer,
+        )
+        if self._verification_executor is None:
+            for chunk in chunks:
+                results.update(verify(chunk))
+                # Let other coroutines run between chunks of a large batch.
+                await asyncio.sleep(0)
+        else:
+            for chunk_results in await asyncio.gather(
+                *(self._run_in_verification_executor(verify, chunk) for chunk in chunks)
+            ):
+                results.update(chunk_results)
+
+        for access_token, cache_key in cache_keys.items():
+            result = results[access_token]
+            if isinstance(result, InvalidAccessTokenException):
+                self._rejections.record(cache_key, result, now_unix_seconds)
+            elif self._access_token_cache is not None:
+                assert cache_key is not None  # appease mypy
+                self._access_token_cache.put(cache_key, result, result.exp)
+
+        return [
+            result
+            if isinstance(result, InvalidAccessTokenException)
+            else result.claims()
+            for result in (results[access_token] for access_token in access_tokens)
+        ]
+
+    def _cache_key(self, access_token: str) -> Optional[bytes]:
+        # Tokens are only hashed if there is a cache to look them up in.
+        if self._access_token_cache is None and not self._rejections.cache_enabled:
+            return None
+        return hashlib.sha256(access_token.encode()).digest()
+
+    def _cached_access_token(
+        self, cache_key: bytes, now_unix_seconds: float
+    ) -> Optional["_VerifiedAccessToken"]:
+        if self._access_token_cache is None:
+            return None
+        # Entries expire at the token's exp, and are dropped when their kid
+        # leaves the JWKS, so a hit is exactly as good as a fresh verification.
+        cached = self._access_token_cache.get(cache_key, now_unix_seconds)
+        hit = cached is not None and now_unix_seconds >= cached.nbf
+        if self._observer is not None:
+            self._observer.on_cache_lookup("access_token", hit)
+        return cached if hit else None
+
+    async def _verify_access_token(
+        self, access_token: str, now_unix_seconds: float
+    ) -> "_VerifiedAccessToken":
+        try:
+            return await self._run_verification(access_token, now_unix_seconds)
+        except _UnknownKeyIdException as e:
+            # The token may be signed by a key that was rotated in after our
+            # last refresh.
+            if not await self._refresh_config_for_unknown_kid(e.kid):
+                raise
+
+        return await self._run_verification(access_token, now_unix_seconds)
+
+    async def _run_verification(
+        self, access_token: str, now_unix_seconds: float
+    ) -> "_VerifiedAccessToken":
+        verify = functools.partial(
+            _verify_access_token,
+            jwks=self._config.jwks,
             access_token=access_token,
             now_unix_seconds=now_unix_seconds,
+            observer=self._observer,
         )
+        if self._verification_executor is None:
+            return verify()
+        return await self._run_in_verification_executor(verify)
+
+    async def _run_in_verification_executor(
+        self, f: Callable[..., _T], *args: Any
+    ) -> _T:
+        assert self._verification_executor is not None  # appease mypy
+        # Signature verification and claims parsing are CPU-bound; run them off
+        # the event loop, with at most verification_max_pending queued at once.
+        async with self._verification_slots:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._verification_executor, f, *args
+            )
+
+    async def _refresh_config_for_unknown_kid(self, kid: str) -> bool:
+        """
+        Refreshes the config in the hope of learning about kid. Returns whether
+        a refresh happened.
+
+        Refreshes are rate-limited, and kids that were seen while refreshes are
+        rate-limited are remembered until the next refresh is allowed, so that
+        tokens with made-up kids cannot make us hammer the config API.
+        """
+        if self._jwks_unknown_kid_refresh_interval_seconds is None:
+            return False
+
+        now = time.time()
+        if self._unknown_kids.get(kid, now) is not None:
+            return False
+
+        # Piggyback on a refresh that is already in flight, if any, even if we
+        # are otherwise rate-limited.
+        if self._config_refresh is None:
+            if now < self._jwks_next_unknown_kid_refresh_unix_seconds:
+                self._unknown_kids.put(
+                    kid, True, self._jwks_next_unknown_kid_refresh_unix_seconds
+                )
+                return False
+
+            self._jwks_next_unknown_kid_refresh_unix_seconds = (
+                now + self._jwks_unknown_kid_refresh_interval_seconds
+            )
+
+        if self._observer is not None:
+            self._observer.on_event("jwks_unknown_kid_refresh")
+        try:
+            await self._refresh_config()
+        except Exception:
+            return False
+
+        if kid not in self._config.jwks:
+            self._unknown_kids.put(
+                kid, True, now + self._jwks_unknown_kid_refresh_interval_seconds
+            )
+        return True
+
+    def access_token_cache_stats(self) -> CacheStats:
+        """
+        Returns hit, miss, and eviction counters for the verified access token
+        cache. All counters are zero if the cache is disabled.
+        """
+        if self._access_token_cache is None:
+            return CacheStats(hits=0, misses=0, evictions=0, size=0)
+        return self._access_token_cache.stats()
+
+    def access_token_rejection_stats(self) -> Dict[str, int]:
+        """
+        Returns how many access tokens were rejected at each stage of
+        verification, for stages that rejected any:
+
+            "rejected_cache": Remembered as rejected earlier.
+            "malformed": Not structured like an access token, or without a
+                valid exp and nbf.
+            "unknown_kid": Signed with a key not in the JWKS.
+            "expired": Past its exp.
+            "not_yet_valid": Before its nbf.
+            "signature": With a signature that does not verify.
+        """
+        return self._rejections.stats()
+
+    def rejected_access_token_cache_stats(self) -> CacheStats:
+        """
+        Returns hit, miss, and eviction counters for the rejected access token
+        cache. All counters are zero if the cache is disabled.
+        """
+        return self._rejections.cache_stats()
+
+    async def start_background_refresh(self) -> None:
+        """
+        Starts a task that refreshes the JWKS ahead of expiry, so that requests
+        never wait on the config API. RequireAuthMiddleware calls this from the
+        app's lifespan startup.
+        """
+        if self._background_refresh is None:
+            self._background_refresh = asyncio.create_task(self._refresh_forever())
+
+    async def stop_background_refresh(self) -> None:
+        """
+        Stops the task started by start_background_refresh, if any.
+        """
+        if self._background_refresh is None:
+            return
+
+        self._background_refresh.cancel()
+        try:
+            await self._background_refresh
+        except asyncio.CancelledError:
+            pass
+        self._background_refresh = None
+
+    async def _refresh_forever(self):
+        while True:
+            delay = self._config.soft_refresh_unix_seconds - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                await self._refresh_config()
+            except Exception:
+                await asyncio.sleep(
+                    self._circuit_breaker.retry_after_seconds()
+                    or self._circuit_breaker.backoff_seconds()
+                )
+            else:
+                await asyncio.sleep(_MIN_BACKGROUND_REFRESH_SECONDS)
+
+    async def prewarm(self) -> None:
+        """
+        Loads the config, so that the first request does not wait on it.
+        RequireAuthMiddleware calls this from the app's lifespan startup.
+
+        If a config_snapshot_path is set and holds a usable config, this loads
+        it without waiting on the config API, and refreshes it in the
+        background if it is due.
+
+        Raises:
+            Exception: If no config could be loaded.
+        """
+        await self._update_config()
 
     async def _update_config(self):
-        if time.time() < self._jwks_next_refresh_unix_seconds:
+        if not self._config_snapshot_checked:
+            self._load_config_snapshot()
+
+        config = self._config
+        now = time.time()
+        if now < config.soft_refresh_unix_seconds:
+            return
+
+        if now < config.next_refresh_unix_seconds:
+            # The keys are due for a refresh but still fresh; keep serving them
+            # while the refresh happens in the background.
+            self._start_config_refresh()
             return
 
-        response = await self._http_client.get(
-            f"https://{self._config_api_hostname}/v1/config/{self._publishable_key}"
+        try:
+            await self._refresh_config()
+        except Exception:
+            # Keep serving the keys we have if the config API is unavailable,
+            # but only for so long.
+            config = self._config
+            if config.project_id and time.time() < config.stale_unix_seconds:
+                if self._observer is not None:
+                    self._observer.on_event("jwks_stale_served")
+                return
+            raise
+
+    async def _refresh_config(self):
+        # The fetch is shielded so that a cancelled caller does not cancel it
+        # for everyone else waiting on it.
+        await asyncio.shield(self._start_config_refresh())
+
+    def _start_config_refresh(self) -> "asyncio.Future[None]":
+        # Concurrent callers share a single in-flight fetch, rather than each
+        # sending their own request to the config API.
+        if self._config_refresh is None:
+            self._config_refresh = asyncio.ensure_future(self._fetch_config())
+            self._config_refresh.add_done_callback(self._on_config_refresh_done)
+        return self._config_refresh
+
+    def _on_config_refresh_done(self, config_refresh: "asyncio.Future[None]") -> None:
+        self._config_refresh = None
+        if config_refresh.cancelled():
+            return
+
+        # Callers waiting on the fetch re-raise its exception themselves, but a
+        # background refresh may have no one waiting on it.
+        exception = config_refresh.exception()
+        # Refreshes failing fast on an open circuit were already logged when
+        # it opened.
+        if exception is not None and not isinstance(exception, CircuitOpenError):
+            _logger.warning("Failed to refresh Tesseral config", exc_info=exception)
+        if self._observer is not None:
+            self._observer.on_event(
+                "jwks_refresh" if exception is None else "jwks_refresh_failed"
+            )
+
+    async def _fetch_config(self):
+        if self._shared_config_directory is None:
+            snapshot = _ConfigSnapshot()
+            snapshot.publishable_key = self._publishable_key
+            snapshot.config_json = await self._fetch_config_json()
+            snapshot.fetched_unix_seconds = time.time()
+            config = _parse_config(snapshot.config_json)
+        else:
+            config, snapshot = await self._fetch_shared_config()
+
+        self._apply_config(
+            _config_state(
+                config,
+                snapshot.fetched_unix_seconds,
+                self._jwks_refresh_interval_seconds,
+                self._jwks_soft_refresh_interval_seconds,
+                self._jwks_max_staleness_seconds,
+            )
         )
-        response.raise_for_status()
-        config = _parse_config(response.text)
-        self._project_id = config.project_id
-        self._jwks = config.jwks
-        self._jwks_next_refresh_unix_seconds = (
-            time.time() + self._jwks_refresh_interval_seconds
+        if self._config_snapshot_path is not None:
+            try:
+                _write_config_snapshot(self._config_snapshot_path, snapshot)
+            except OSError:
+                _logger.warning(
+                    "Failed to save Tesseral config snapshot", exc_info=True
+                )
+
+    def _load_config_snapshot(self) -> None:
+        """
+        Loads the config saved to config_snapshot_path by an earlier process,
+        if it is not too stale to serve. Snapshots from the future, or that
+        another user could have written, are ignored by _read_config_snapshot.
+        """
+        self._config_snapshot_checked = True
+        if self._config_snapshot_path is None:
+            return
+
+        snapshot = _read_config_snapshot(
+            self._config_snapshot_path, self._publishable_key
+        )
+        if snapshot is None:
+            return
+        try:
+            config = _parse_config(snapshot.config_json)
+        except Exception:
+            _logger.warning("Ignoring corrupt Tesseral config snapshot", exc_info=True)
+            return
+
+        now = time.time()
+        stale_unix_seconds = (
+            snapshot.fetched_unix_seconds
+            + self._jwks_refresh_interval_seconds
+            + self._jwks_max_staleness_seconds
+        )
+        if now >= stale_unix_seconds:
+            return
+
+        state = _config_state(
+            config,
+            snapshot.fetched_unix_seconds,
+            self._jwks_refresh_interval_seconds,
+            self._jwks_soft_refresh_interval_seconds,
+            self._jwks_max_staleness_seconds,
+        )
+        # Serve an expired snapshot for a little while regardless, so that the
+        # requests arriving at a fresh process do not wait on its refresh.
+        state = state.replace(
+            next_refresh_unix_seconds=min(
+                max(
+                    state.next_refresh_unix_seconds,
+                    now + _CONFIG_SNAPSHOT_GRACE_SECONDS,
+                ),
+                state.stale_unix_seconds,
+            )
         )
+        self._apply_config(state)
+        if self._observer is not None:
+            self._observer.on_event("config_snapshot_loaded")
+
+    async def _fetch_config_json(self) -> str:
+        try:
+            self._circuit_breaker.before_call()
+        except CircuitOpenError:
+            if self._observer is not None:
+                self._observer.on_event("config_api_circuit_open")
+            raise
+
+        timer = _stage_timer(self._observer)
+        try:
+            response = await self._http_client.get(
+                f"https://{self._config_api_hostname}/v1/config/{self._publishable_key}",
+                timeout=(
+                    USE_CLIENT_DEFAULT
+                    if self._config_api_timeout_seconds is None
+                    else self._config_api_timeout_seconds
+                ),
+            )
+            if timer is not None:
+                timer.lap("config_fetch")
+            response.raise_for_status()
+        except Exception:
+            self._circuit_breaker.record_failure()
+            raise
+        self._circuit_breaker.record_success()
+        return response.text
+
+    async def _fetch_shared_config(self) -> Tuple["_Config", _ConfigSnapshot]:
+        """
+        Returns a config shared with the other processes on this host, and
+        the snapshot it was parsed from.
+
+        If no process has fetched a config newer than ours that is still fresh,
+        the process that takes the snapshot's lock fetches one and shares it,
+        while the others wait for it. If the shared snapshot cannot be used,
+        this falls back to fetching the config directly.
+        """
+        assert self._shared_config_directory is not None  # appease mypy
+        path = _config_file_path(self._shared_config_directory, self._publishable_key)
+        deadline = time.monotonic() + _SHARED_CONFIG_WAIT_SECONDS
+        lock = None
+        while True:
+            shared = self._shared_config(path)
+            if shared is not None:
+                return shared
+
+            try:
+                lock = _try_lock_config_file(path)
+            except OSError:
+                _logger.warning("Failed to lock shared Tesseral config", exc_info=True)
+                break
+            if lock is not None or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(_SHARED_CONFIG_POLL_SECONDS)
+
+        try:
+            # Another process may have shared a snapshot between our last look
+            # and taking the lock.
+            if lock is not None:
+                shared = self._shared_config(path)
+                if shared is not None:
+                    return shared
+
+            snapshot = _ConfigSnapshot()
+            snapshot.publishable_key = self._publishable_key
+            snapshot.config_json = await self._fetch_config_json()
+            snapshot.fetched_unix_seconds = time.time()
+            # Only share configs that parse.
+            config = _parse_config(snapshot.config_json)
+            try:
+                _write_config_snapshot(path, snapshot)
+            except OSError:
+                _logger.warning("Failed to share Tesseral config", exc_info=True)
+            return config, snapshot
+        finally:
+            if lock is not None:
+                _unlock_config_file(lock)
+
+    def _shared_config(self, path: str) -> Optional[Tuple["_Config", _ConfigSnapshot]]:
+        # A snapshot is only worth using if it is newer than the config we
+        # already have, and not yet due for a refresh itself.
+        snapshot = _read_config_snapshot(path, self._publishable_key)
+        if (
+            snapshot is None
+            or snapshot.fetched_unix_seconds <= self._config.fetched_unix_seconds
+            or time.time()
+            >= snapshot.fetched_unix_seconds + self._jwks_soft_refresh_interval_seconds
+        ):
+            return None
+
+        try:
+            config = _parse_config(snapshot.config_json)
+        except Exception:
+            return None
+        if self._observer is not None:
+            self._observer.on_event("shared_config_hit")
+        return config, snapshot
+
+    def _apply_config(self, state: "_ConfigState") -> None:
+        self._config = state
+        if self._access_token_cache is not None:
+            self._access_token_cache.discard_where(
+                lambda verified: verified.kid not in state.jwks
+            )
+        for kid in state.jwks:
+            self._unknown_kids.discard(kid)
 
 
 def _authenticate_access_token(
@@ -83,57 +895,182 @@ def _authenticate_access_token(
     access_token: str,
     now_unix_seconds: Optional[float] = None,
 ) -> AccessTokenClaims:
+    return _verify_access_token(
+        jwks=jwks, access_token=access_token, now_unix_seconds=now_unix_seconds
+    ).claims()
+
+
+class _VerifiedAccessToken:
+    kid: str
+    exp: float
+    nbf: float
+    # The decoded claims, which are only validated by claims().
+    raw_claims: Dict[str, Any]
+    _claims: Optional[AccessTokenClaims] = None
+
+    def claims(self) -> AccessTokenClaims:
+        """
+        Raises:
+            InvalidAccessTokenException: If the claims are malformed.
+        """
+        if self._claims is None:
+            self._claims = _parse_access_token_claims(self.raw_claims)
+        return self._claims
+
+
+def _parse_access_token_claims(raw_claims: Dict[str, Any]) -> AccessTokenClaims:
+    # A token signed by a valid key may still carry malformed claims; it is as
+    # invalid as any other.
+    try:
+        return parse_obj_as(type_=AccessTokenClaims, object_=raw_claims)
+    except ValidationError:
+        raise InvalidAccessTokenException()
+
+
+def _verify_access_token(
+    jwks: Dict[str, EllipticCurvePublicKey],
+    access_token: str,
+    now_unix_seconds: Optional[float] = None,
+    observer: Optional[AuthObserver] = None,
+) -> _VerifiedAccessToken:
+    # The cheap checks run first, so that tokens that are garbled, signed with
+    # an unknown key, or expired are rejected without verifying a signature.
+    timer = _stage_timer(observer)
     parts = access_token.split(".")
     if len(parts) != 3:
         raise InvalidAccessTokenException()
 
     raw_header, raw_claims, raw_signature = parts
     try:
-        parsed_header = _AccessTokenHeader.model_validate_json(
-            _base64_url_decode(raw_header)
-        )
+        parsed_header = _parse_access_token_header(raw_header)
         parsed_signature = _base64_url_decode(raw_signature)
-    except binascii.Error:
+    except ValueError:
+        # binascii.Error and ValidationError are both ValueErrors, as is what
+        # base64 raises for non-ASCII input.
         raise InvalidAccessTokenException()
-    except ValidationError:
+    if len(parsed_signature) != 64:
         raise InvalidAccessTokenException()
 
     try:
         public_key = jwks[parsed_header.kid]
     except KeyError:
+        raise _UnknownKeyIdException(parsed_header.kid)
+    if timer is not None:
+        timer.lap("jwt_decode")
+
+    try:
+        claims_json = json.loads(_base64_url_decode(raw_claims))
+    except binascii.Error:
+        raise InvalidAccessTokenException()
+    except ValueError:
         raise InvalidAccessTokenException()
 
-    if len(parsed_signature) != 64:
+    # Only exp and nbf are validated here; the claims as a whole are validated
+    # when they are first needed. They are checked before the signature, which
+    # is safe because until it is verified, they are only used to reject.
+    if not isinstance(claims_json, dict):
+        raise InvalidAccessTokenException()
+    exp: Any = claims_json.get("exp")
+    nbf: Any = claims_json.get("nbf")
+    if not _is_unix_seconds(exp) or not _is_unix_seconds(nbf):
         raise InvalidAccessTokenException()
 
+    if now_unix_seconds is None:
+        now_unix_seconds = time.time()
+
+    if timer is not None:
+        timer.lap("claims_parse")
+    if now_unix_seconds < nbf:
+        raise _ExpiredAccessTokenException()
+    if now_unix_seconds > exp:
+        raise _ExpiredAccessTokenException(exp)
+
     r = int.from_bytes(parsed_signature[:32], byteorder="big")
     s = int.from_bytes(parsed_signature[32:], byteorder="big")
     signature = encode_dss_signature(r, s)
     try:
-        public_key.verify(
-            signature, (raw_header + "." + raw_claims).encode(), ECDSA(SHA256())
-        )
+        # The signing input is everything before the last ".", so slice it out
+        # of the token rather than joining the parts back together.
+        signing_input = access_token[: len(raw_header) + 1 + len(raw_claims)]
+        public_key.verify(signature, signing_input.encode(), ECDSA(SHA256()))
     except InvalidSignature:
-        raise InvalidAccessTokenException()
+        raise _InvalidSignatureException()
+    if timer is not None:
+        timer.lap("signature_verify")
 
+    verified = _VerifiedAccessToken()
+    verified.kid = parsed_header.kid
+    verified.exp = exp
+    verified.nbf = nbf
+    verified.raw_claims = claims_json
+    return verified
+
+
+def _verify_access_tokens(
+    jwks: Dict[str, EllipticCurvePublicKey],
+    access_tokens: List[str],
+    now_unix_seconds: float,
+    observer: Optional[AuthObserver] = None,
+) -> Dict[str, Union[_VerifiedAccessToken, InvalidAccessTokenException]]:
+    results: Dict[str, Union[_VerifiedAccessToken, InvalidAccessTokenException]]
+    results = {}
+    for access_token in access_tokens:
+        try:
+            verified = _verify_access_token(
+                jwks=jwks,
+                access_token=access_token,
+                now_unix_seconds=now_unix_seconds,
+                observer=observer,
+            )
+            # Validate the claims here too, rather than on the event loop.
+            verified.claims()
+        except InvalidAccessTokenException as e:
+            results[access_token] = e
+        else:
+            results[access_token] = verified
+    return results
+
+
+def _kid(access_token: str) -> str:
+    raw_header = access_token[: access_token.find(".")]
     try:
-        claims_json = json.loads(_base64_url_decode(raw_claims))
-        parsed_claims = parse_obj_as(type_=AccessTokenClaims, object_=claims_json)
-    except binascii.Error:
-        raise InvalidAccessTokenException()
-    except ValidationError:
+        return _parse_access_token_header(raw_header).kid
+    except ValueError:
         raise InvalidAccessTokenException()
 
-    if now_unix_seconds is None:
-        now_unix_seconds = time.time()
 
-    # type assertions to appease mypy
-    assert parsed_claims.nbf, InvalidAccessTokenException()
-    assert parsed_claims.exp, InvalidAccessTokenException()
-    if now_unix_seconds < parsed_claims.nbf or now_unix_seconds > parsed_claims.exp:
-        raise InvalidAccessTokenException()
+def _soft_refresh_interval_seconds(
+    jwks_refresh_interval_seconds: float,
+    jwks_soft_refresh_interval_seconds: Optional[float],
+) -> float:
+    """
+    Returns the soft refresh interval to use for the given arguments.
 
-    return parsed_claims
+    Raises:
+        RuntimeError: If either interval is not positive, which would have the
+            config refreshed over and over.
+    """
+    if jwks_refresh_interval_seconds <= 0 or (
+        jwks_soft_refresh_interval_seconds is not None
+        and jwks_soft_refresh_interval_seconds <= 0
+    ):
+        raise RuntimeError(
+            "jwks_refresh_interval_seconds and jwks_soft_refresh_interval_seconds must be positive."
+        )
+    if jwks_soft_refresh_interval_seconds is None:
+        return 0.8 * jwks_refresh_interval_seconds
+    return min(jwks_soft_refresh_interval_seconds, jwks_refresh_interval_seconds)
+
+
+def _is_unix_seconds(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+# A project signs all of its access tokens with a handful of keys, so only a
+# few distinct headers are ever seen.
+@functools.lru_cache(maxsize=256)
+def _parse_access_token_header(raw_header: str) -> "_AccessTokenHeader":
+    return _AccessTokenHeader.model_validate_json(_base64_url_decode(raw_header))
 
 
 class _Config:
@@ -141,6 +1078,88 @@ class _Config:
     jwks: Dict[str, EllipticCurvePublicKey]
 
 
+class _ConfigState:
+    """
+    The config an authenticator serves, and when it is due for a refresh.
+
+    Authenticators never modify one once it is published, but publish a new one
+    with a single assignment. A reader on any thread, even on free-threaded
+    builds of Python, therefore sees a project ID, JWKS, and refresh schedule
+    that belong together.
+    """
+
+    __slots__ = (
+        "project_id",
+        "jwks",
+        "fetched_unix_seconds",
+        "soft_refresh_unix_seconds",
+        "next_refresh_unix_seconds",
+        "stale_unix_seconds",
+    )
+
+    project_id: str
+    jwks: Dict[str, EllipticCurvePublicKey]
+    fetched_unix_seconds: float
+    # When to refresh the JWKS in the background, while still serving it.
+    soft_refresh_unix_seconds: float
+    # When to stop serving the JWKS without waiting on a refresh.
+    next_refresh_unix_seconds: float
+    # When to stop serving the JWKS, even if it cannot be refreshed.
+    stale_unix_seconds: float
+
+    def __init__(
+        self,
+        *,
+        project_id: str,
+        jwks: Dict[str, EllipticCurvePublicKey],
+        fetched_unix_seconds: float,
+        soft_refresh_unix_seconds: float,
+        next_refresh_unix_seconds: float,
+        stale_unix_seconds: float,
+    ):
+        self.project_id = project_id
+        self.jwks = jwks
+        self.fetched_unix_seconds = fetched_unix_seconds
+        self.soft_refresh_unix_seconds = soft_refresh_unix_seconds
+        self.next_refresh_unix_seconds = next_refresh_unix_seconds
+        self.stale_unix_seconds = stale_unix_seconds
+
+    def replace(self, **changes: Any) -> "_ConfigState":
+        """Returns a copy of this state, with some of its fields changed."""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return _ConfigState(**fields)
+
+
+# The state of an authenticator that has not loaded a config yet.
+_NO_CONFIG = _ConfigState(
+    project_id="",
+    jwks={},
+    fetched_unix_seconds=0,
+    soft_refresh_unix_seconds=0,
+    next_refresh_unix_seconds=0,
+    stale_unix_seconds=0,
+)
+
+
+def _config_state(
+    config: _Config,
+    fetched_unix_seconds: float,
+    refresh_interval_seconds: float,
+    soft_refresh_interval_seconds: float,
+    max_staleness_seconds: float,
+) -> _ConfigState:
+    next_refresh_unix_seconds = fetched_unix_seconds + refresh_interval_seconds
+    return _ConfigState(
+        project_id=config.project_id,
+        jwks=config.jwks,
+        fetched_unix_seconds=fetched_unix_seconds,
+        soft_refresh_unix_seconds=fetched_unix_seconds + soft_refresh_interval_seconds,
+        next_refresh_unix_seconds=next_refresh_unix_seconds,
+        stale_unix_seconds=next_refresh_unix_seconds + max_staleness_seconds,
+    )
+
+
 def _parse_config(config_json: str) -> _Config:
     config_parsed = _ConfigResponse.model_validate_json(config_json)
     jwks = {}
@@ -162,11 +1181,13 @@ def _parse_config(config_json: str) -> _Config:
 
 
 def _base64_url_decode(s: str) -> bytes:
-    s += "=" * (4 - len(s) % 4)
+    s += "=" * (-len(s) % 4)
     return base64.urlsafe_b64decode(s)
 
 
 class _AccessTokenHeader(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     alg: str
     kid: str
 
@@ -0,0 +1,218 @@
+import asyncio
+import functools
+import hashlib
+import time
+from typing import Dict, Optional
+
+from tesseral import AsyncTesseral, AuthenticateApiKeyResponse, BadRequestError
+
+from ._cache import CacheStats, _LRUCache
+from ._circuit_breaker import CircuitBreaker, CircuitOpenError
+from ._observer import AuthObserver, _stage_timer
+
+
+class InvalidApiKeyException(Exception):
+    pass
+
+
+class AsyncApiKeyAuthenticator:
+    """
+    Authenticates API keys against the Tesseral backend, optionally caching
+    results in memory.
+
+    Cache entries are keyed by a SHA-256 digest of the API key secret token;
+    the raw secret token is never stored.
+
+    Concurrent authentications of the same API key share a single call to the
+    backend, whether or not caching is enabled.
+
+    Backend calls go through a circuit breaker: once the backend keeps failing,
+    authentications fail fast with CircuitOpenError, rather than each waiting
+    on a backend call of its own.
+
+    Args:
+        tesseral_client: The AsyncTesseral client used to authenticate API keys.
+        api_key_cache_size: The maximum number of API key authentication results
+            to cache. Defaults to 0, which disables the cache.
+        api_key_cache_ttl_seconds: How long a successful authentication is
+            cached, in seconds. Defaults to 60.
+        api_key_negative_cache_ttl_seconds: How long a rejected API key is
+            cached, in seconds. Defaults to 5.
+        observer: Optional AuthObserver to tell about backend call timings,
+            coalesced authentications, and cache lookups.
+        circuit_breaker: Optional CircuitBreaker for backend calls. Defaults
+            to a CircuitBreaker with default settings.
+    """
+
+    _tesseral_client: AsyncTesseral
+    _api_key_cache_ttl_seconds: float
+    _api_key_negative_cache_ttl_seconds: float
+    _api_key_cache: Optional[_LRUCache[bytes, "_ApiKeyResult"]]
+    _in_flight: Dict[bytes, "asyncio.Future[_ApiKeyResult]"]
+    # Bumped whenever cached results are invalidated, so that a backend call
+    # that was in flight at the time does not cache its now outdated result.
+    _api_key_cache_generation: int
+    _coalesced_api_key_authentications: int
+    _observer: Optional[AuthObserver]
+    _circuit_breaker: CircuitBreaker
+
+    def __init__(
+        self,
+        *,
+        tesseral_client: AsyncTesseral,
+        api_key_cache_size: int = 0,
+        api_key_cache_ttl_seconds: float = 60,
+        api_key_negative_cache_ttl_seconds: float = 5,
+        observer: Optional[AuthObserver] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        self._tesseral_client = tesseral_client
+        self._api_key_cache_ttl_seconds = api_key_cache_ttl_seconds
+        self._api_key_negative_cache_ttl_seconds = api_key_negative_cache_ttl_seconds
+        self._api_key_cache = (
+            _LRUCache(api_key_cache_size) if api_key_cache_size > 0 else None
+        )
+        self._in_flight = {}
+        self._api_key_cache_generation = 0
+        self._coalesced_api_key_authentications = 0
+        self._observer = observer
+        self._circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    async def authenticate_api_key(
+        self, *, secret_token: str
+    ) -> AuthenticateApiKeyResponse:
+        """
+        Authenticates an API key secret token.
+
+        Raises:
+            InvalidApiKeyException: If the API key is not valid.
+            CircuitOpenError: If the backend has been failing, and is not being
+                called for now.
+        """
+        cache_key = _cache_key(secret_token)
+        if self._api_key_cache is not None:
+            cached = self._api_key_cache.get(cache_key, time.time())
+            if self._observer is not None:
+                self._observer.on_cache_lookup("api_key", cached is not None)
+            if cached is not None:
+                return cached.unwrap()
+
+        # Share the result, or error, of an in-flight call for the same API key.
+        # The call is shielded so that a cancelled caller does not cancel it for
+        # everyone else waiting on it.
+        in_flight = self._in_flight.get(cache_key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(
+                self._authenticate_api_key(cache_key, secret_token)
+            )
+            in_flight.add_done_callback(
+                functools.partial(self._on_api_key_authentication_done, cache_key)
+            )
+            self._in_flight[cache_key] = in_flight
+        else:
+            self._coalesced_api_key_authentications += 1
+            if self._observer is not None:
+                self._observer.on_event("api_key_coalesced")
+        return (await asyncio.shield(in_flight)).unwrap()
+
+    def invalidate_api_key(self, *, secret_token: str) -> None:
+        """
+        Removes any cached result for an API key, for instance after revoking it.
+        Authentications that start afterwards call the backend again, rather
+        than waiting on a call that was already in flight.
+        """
+        cache_key = _cache_key(secret_token)
+        self._api_key_cache_generation += 1
+        self._in_flight.pop(cache_key, None)
+        if self._api_key_cache is not None:
+            self._api_key_cache.discard(cache_key)
+
+    def clear_api_key_cache(self) -> None:
+        """
+        Removes all cached API key authentication results.
+        """
+        self._api_key_cache_generation += 1
+        self._in_flight.clear()
+        if self._api_key_cache is not None:
+            self._api_key_cache.clear()
+
+    def api_key_cache_stats(self) -> CacheStats:
+        """
+        Returns hit, miss, and eviction counters for the API key cache. All
+        counters are zero if the cache is disabled.
+        """
+        if self._api_key_cache is None:
+            return CacheStats(hits=0, misses=0, evictions=0, size=0)
+        return self._api_key_cache.stats()
+
+    def coalesced_api_key_authentications(self) -> int:
+        """
+        Returns how many authentications waited on an in-flight backend call for
+        the same API key, rather than making their own.
+        """
+        return self._coalesced_api_key_authentications
+
+    async def _authenticate_api_key(
+        self, cache_key: bytes, secret_token: str
+    ) -> "_ApiKeyResult":
+        generation = self._api_key_cache_generation
+        try:
+            self._circuit_breaker.before_call()
+        except CircuitOpenError:
+            if self._observer is not None:
+                self._observer.on_event("api_key_backend_circuit_open")
+            raise
+
+        result = _ApiKeyResult()
+        timer = _stage_timer(self._observer)
+        try:
+            result.response = await self._tesseral_client.api_keys.authenticate_api_key(
+                secret_token=secret_token
+            )
+        except BadRequestError:
+            # The backend is fine; the API key is not.
+            result.response = None
+        except Exception:
+            self._circuit_breaker.record_failure()
+            raise
+        finally:
+            if timer is not None:
+                timer.lap("api_key_backend")
+        self._circuit_breaker.record_success()
+
+        if (
+            self._api_key_cache is not None
+            and self._api_key_cache_generation == generation
+        ):
+            if result.response is None:
+                ttl_seconds = self._api_key_negative_cache_ttl_seconds
+            else:
+                ttl_seconds = self._api_key_cache_ttl_seconds
+            self._api_key_cache.put(cache_key, result, time.time() + ttl_seconds)
+        return result
+
+    def _on_api_key_authentication_done(
+        self, cache_key: bytes, in_flight: "asyncio.Future[_ApiKeyResult]"
+    ) -> None:
+        # The entry is gone, or belongs to a newer call, if the API key was
+        # invalidated while this call was in flight.
+        if self._in_flight.get(cache_key) is in_flight:
+            del self._in_flight[cache_key]
+        # Mark the exception as retrieved, so asyncio does not warn about it
+        # when every caller waiting on it was cancelled.
+        if not in_flight.cancelled():
+            in_flight.exception()
+
+
+class _ApiKeyResult:
+    # None if the API key was rejected.
+    response: Optional[AuthenticateApiKeyResponse]
+
+    def unwrap(self) -> AuthenticateApiKeyResponse:
+        if self.response is None:
+            raise InvalidApiKeyException()
+        return self.response
+
+
+def _cache_key(secret_token: str) -> bytes:
+    return hashlib.sha256(secret_token.encode()).digest()
@@ -1,7 +1,8 @@
-from typing import Optional
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional
 
 from tesseral import AccessTokenClaims, AuthenticateApiKeyResponse
 
+from tesseral_fastapi._access_token_authenticator import _parse_access_token_claims
 from tesseral_fastapi._errors import NotAnAccessTokenError
 
 
@@ -16,10 +17,35 @@ class Auth:
     and should be acquired using Depends(get_auth) in FastAPI route handlers.
     """
 
+    __slots__ = (
+        "_access_token",
+        "_access_token_raw_claims",
+        "_access_token_claims",
+        "_api_key_secret_token",
+        "_authenticate_api_key_response",
+        "_actions",
+        "_action_prefixes",
+    )
+
     _access_token: Optional[str]
+    # The verified, but not yet validated, claims of the access token. The
+    # AccessTokenClaims model is only built if access_token_claims() is called.
+    _access_token_raw_claims: Optional[Dict[str, Any]]
     _access_token_claims: Optional[AccessTokenClaims]
     _api_key_secret_token: Optional[str]
     _authenticate_api_key_response: Optional[AuthenticateApiKeyResponse]
+    # Indexes of the requester's actions, built on first use.
+    _actions: Optional[FrozenSet[str]]
+    _action_prefixes: Optional[FrozenSet[str]]
+
+    def __init__(self):
+        self._access_token = None
+        self._access_token_raw_claims = None
+        self._access_token_claims = None
+        self._api_key_secret_token = None
+        self._authenticate_api_key_response = None
+        self._actions = None
+        self._action_prefixes = None
 
     def credentials_type(self) -> str:
         """
@@ -43,6 +69,8 @@ class Auth:
         """
         if self._access_token_claims:
             return self._access_token_claims.organization.id
+        if self._access_token_raw_claims:
+            return self._access_token_raw_claims["organization"]["id"]
         if self._authenticate_api_key_response:
             assert self._authenticate_api_key_response.organization_id  # appease mypy
             return self._authenticate_api_key_response.organization_id
@@ -58,9 +86,15 @@ class Auth:
         Raises:
             NotAnAccessTokenError: If the request was authenticated with an API key
                 instead of an access token.
+            InvalidAccessTokenException: If the access token's claims are malformed.
         """
         if self._access_token_claims:
             return self._access_token_claims
+        if self._access_token_raw_claims:
+            self._access_token_claims = _parse_access_token_claims(
+                self._access_token_raw_claims
+            )
+            return self._access_token_claims
         if self._authenticate_api_key_response:
             raise NotAnAccessTokenError()
         raise RuntimeError("Unreachable")
@@ -83,16 +117,68 @@ class Auth:
         Returns true if the requester has permission to carry out the given action.
         Returns false otherwise.
 
+        An action ending in ".*", such as "acme.widgets.*", matches any action
+        under that prefix, such as "acme.widgets.edit".
+
         Args:
             action: An action name, such as "acme.widgets.edit".
 
         Returns:
             bool: True if the requester has the specified permission, False otherwise.
         """
+        if action.endswith(".*"):
+            return action[:-2] in self._action_prefix_index()
+        return action in self._action_index()
+
+    def has_any_permission(self, actions: Iterable[str]) -> bool:
+        """
+        Returns true if the requester has permission to carry out at least one
+        of the given actions. Returns false otherwise.
+
+        Args:
+            actions: Action names, as accepted by has_permission.
+
+        Returns:
+            bool: True if the requester has any of the specified permissions, False otherwise.
+        """
+        return any(self.has_permission(action) for action in actions)
+
+    def has_all_permissions(self, actions: Iterable[str]) -> bool:
+        """
+        Returns true if the requester has permission to carry out every one of
+        the given actions. Returns false otherwise.
+
+        Args:
+            actions: Action names, as accepted by has_permission.
+
+        Returns:
+            bool: True if the requester has all of the specified permissions, False otherwise.
+        """
+        return all(self.has_permission(action) for action in actions)
+
+    def _action_index(self) -> FrozenSet[str]:
+        if self._actions is None:
+            self._actions = frozenset(self._raw_actions() or ())
+        return self._actions
+
+    def _action_prefix_index(self) -> FrozenSet[str]:
+        # Every proper dotted prefix of every action, e.g. "acme" and
+        # "acme.widgets" for "acme.widgets.edit".
+        if self._action_prefixes is None:
+            prefixes = set()
+            for action in self._action_index():
+                i = action.rfind(".")
+                while i > 0:
+                    prefixes.add(action[:i])
+                    i = action.rfind(".", 0, i)
+            self._action_prefixes = frozenset(prefixes)
+        return self._action_prefixes
+
+    def _raw_actions(self) -> Optional[List[str]]:
         if self._access_token_claims:
-            actions = self._access_token_claims.actions
-            return bool(actions and action in actions)
+            return self._access_token_claims.actions
+        if self._access_token_raw_claims:
+            return self._access_token_raw_claims.get("actions")
         if self._authenticate_api_key_response:
-            actions = self._authenticate_api_key_response.actions
-            return bool(actions and action in actions)
+            return self._authenticate_api_key_response.actions
         raise RuntimeError("Unreachable")
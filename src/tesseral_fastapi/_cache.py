@@ -0,0 +1,170 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+_K = TypeVar("_K")
+_V = TypeVar("_V")
+
+# How many stripes a _StripedLRUCache has, at most.
+_CACHE_STRIPES = 16
+
+
+class CacheStats:
+    """
+    A point-in-time snapshot of a cache's counters.
+
+    Attributes:
+        hits: The number of lookups that returned a cached value.
+        misses: The number of lookups that found no usable value.
+        evictions: The number of entries dropped to stay within the size limit.
+        size: The number of entries currently cached.
+    """
+
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+    def __init__(self, *, hits: int, misses: int, evictions: int, size: int):
+        self.hits = hits
+        self.misses = misses
+        self.evictions = evictions
+        self.size = size
+
+    def __repr__(self) -> str:
+        return f"CacheStats(hits={self.hits}, misses={self.misses}, evictions={self.evictions}, size={self.size})"
+
+
+class _LRUCache(Generic[_K, _V]):
+    """A size-bounded LRU cache whose entries each carry an expiry time."""
+
+    _max_size: int
+    _entries: "OrderedDict[_K, Tuple[_V, float]]"
+    _hits: int
+    _misses: int
+    _evictions: int
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: _K, now_unix_seconds: float) -> Optional[_V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+
+        value, expires_unix_seconds = entry
+        if now_unix_seconds >= expires_unix_seconds:
+            del self._entries[key]
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return value
+
+    def put(self, key: _K, value: _V, expires_unix_seconds: float) -> None:
+        self._entries[key] = (value, expires_unix_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def discard(self, key: _K) -> None:
+        self._entries.pop(key, None)
+
+    def evict_oldest(self) -> None:
+        if self._entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def discard_where(self, predicate: Callable[[_V], bool]) -> None:
+        for key in [k for k, (v, _) in self._entries.items() if predicate(v)]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            size=len(self._entries),
+        )
+
+
+class _StripedLRUCache(Generic[_K, _V]):
+    """
+    An _LRUCache that is safe to share between threads, split into stripes
+    that each have their own lock, so that threads using different keys rarely
+    wait on one another, even on free-threaded builds of Python.
+
+    Keys are spread over the stripes by hash. The stripes share max_size, so
+    that a cache big enough for every key holds them all, however they hash;
+    once it is full, a put evicts the least recently used entry of its own
+    stripe. The total size is checked without locks, so threads putting at
+    once may briefly take the cache a few entries past max_size.
+    """
+
+    _max_size: int
+    _stripes: List[_LRUCache[_K, _V]]
+    _locks: List[threading.Lock]
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        stripes = max(1, min(_CACHE_STRIPES, max_size))
+        self._stripes = [_LRUCache(max_size) for _ in range(stripes)]
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def get(self, key: _K, now_unix_seconds: float) -> Optional[_V]:
+        i = hash(key) % len(self._stripes)
+        with self._locks[i]:
+            return self._stripes[i].get(key, now_unix_seconds)
+
+    def put(self, key: _K, value: _V, expires_unix_seconds: float) -> None:
+        i = hash(key) % len(self._stripes)
+        with self._locks[i]:
+            self._stripes[i].put(key, value, expires_unix_seconds)
+
+        if sum(len(stripe) for stripe in self._stripes) <= self._max_size:
+            return
+        # Should this stripe hold nothing but the new entry, evict from the
+        # biggest one instead.
+        if len(self._stripes[i]) <= 1:
+            i = max(range(len(self._stripes)), key=lambda j: len(self._stripes[j]))
+        with self._locks[i]:
+            self._stripes[i].evict_oldest()
+
+    def discard(self, key: _K) -> None:
+        i = hash(key) % len(self._stripes)
+        with self._locks[i]:
+            self._stripes[i].discard(key)
+
+    def discard_where(self, predicate: Callable[[_V], bool]) -> None:
+        for stripe, lock in zip(self._stripes, self._locks):
+            with lock:
+                stripe.discard_where(predicate)
+
+    def clear(self) -> None:
+        for stripe, lock in zip(self._stripes, self._locks):
+            with lock:
+                stripe.clear()
+
+    def stats(self) -> CacheStats:
+        hits = misses = evictions = size = 0
+        for stripe, lock in zip(self._stripes, self._locks):
+            with lock:
+                stats = stripe.stats()
+            hits += stats.hits
+            misses += stats.misses
+            evictions += stats.evictions
+            size += stats.size
+        return CacheStats(hits=hits, misses=misses, evictions=evictions, size=size)
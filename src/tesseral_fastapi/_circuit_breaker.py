@@ -0,0 +1,138 @@
+import random
+import threading
+import time
+from typing import Optional
+
+
+class CircuitOpenError(Exception):
+    """
+    Exception raised instead of calling an upstream whose circuit breaker is
+    open.
+
+    Attributes:
+        retry_after_seconds: How long until the upstream will be tried again.
+    """
+
+    retry_after_seconds: float
+
+    def __init__(self, retry_after_seconds: float):
+        super().__init__(
+            f"Upstream circuit is open; retrying in {retry_after_seconds:.1f}s"
+        )
+        self.retry_after_seconds = retry_after_seconds
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an upstream that keeps failing, so that an outage is not
+    amplified by a fresh upstream call for every request.
+
+    The circuit starts closed, and calls go through. After failure_threshold
+    consecutive failures it opens, and calls fail fast with CircuitOpenError
+    for a backoff. Once the backoff has passed, the circuit is half-open: one
+    call goes through as a probe. If it succeeds, the circuit closes; if it
+    fails, the circuit opens again, with a backoff twice as long as the last.
+
+    Backoffs run from min_backoff_seconds up to max_backoff_seconds, and are
+    jittered down by up to half, so that the processes behind a load balancer
+    do not all probe a recovering upstream at once.
+
+    It is safe to share between threads.
+
+    Args:
+        failure_threshold: How many consecutive failures open the circuit. Defaults to 5.
+        min_backoff_seconds: How long the circuit stays open the first time it opens. Defaults to 1.
+        max_backoff_seconds: The longest the circuit stays open. Defaults to 30.
+    """
+
+    _failure_threshold: int
+    _min_backoff_seconds: float
+    _max_backoff_seconds: float
+    _consecutive_failures: int
+    # Whether the circuit is open or half-open.
+    _open: bool
+    # When the next probe may go through, if the circuit is open.
+    _retry_monotonic_seconds: float
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        *,
+        failure_threshold: int = 5,
+        min_backoff_seconds: float = 1,
+        max_backoff_seconds: float = 30,
+    ):
+        self._failure_threshold = failure_threshold
+        self._min_backoff_seconds = min_backoff_seconds
+        self._max_backoff_seconds = max_backoff_seconds
+        self._consecutive_failures = 0
+        self._open = False
+        self._retry_monotonic_seconds = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """One of "closed", "open", and "half_open"."""
+        if not self._open:
+            return "closed"
+        if time.monotonic() < self._retry_monotonic_seconds:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> None:
+        """
+        Call before calling the upstream, and then call exactly one of
+        record_success and record_failure.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, and the upstream must not
+                be called.
+        """
+        if not self._open:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if now < self._retry_monotonic_seconds:
+                raise CircuitOpenError(self._retry_monotonic_seconds - now)
+            # Let this call through as the probe. Should it never report back,
+            # e.g. because it was cancelled, another probe goes through after
+            # another backoff.
+            self._retry_monotonic_seconds = now + self.backoff_seconds()
+
+    def record_success(self) -> None:
+        if self._open or self._consecutive_failures:
+            with self._lock:
+                self._open = False
+                self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._open or self._consecutive_failures >= self._failure_threshold:
+                self._open = True
+                self._retry_monotonic_seconds = (
+                    time.monotonic() + self.backoff_seconds()
+                )
+
+    def backoff_seconds(self) -> float:
+        """
+        Returns a jittered backoff that doubles with each consecutive failure,
+        for retrying the upstream.
+        """
+        exponent = max(0, self._consecutive_failures - self._failure_threshold)
+        backoff = min(
+            self._max_backoff_seconds,
+            self._min_backoff_seconds * 2 ** min(exponent, 32),
+        )
+        return backoff * random.uniform(0.5, 1)
+
+    def retry_after_seconds(self) -> Optional[float]:
+        """
+        Returns how long until the upstream may be called again, or None if it
+        may be called now.
+        """
+        if not self._open:
+            return None
+        remaining = self._retry_monotonic_seconds - time.monotonic()
+        return remaining if remaining > 0 else None
@@ -0,0 +1,138 @@
+import json
+import os
+import stat
+import tempfile
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+# Bumped whenever the snapshot format changes, so that workers running
+# different versions of this package do not misread each other's snapshots.
+_FORMAT_VERSION = 1
+
+# How far in the future a snapshot's fetch time may be, to allow for clock
+# differences between workers. Anything later was not written by a worker.
+_MAX_CLOCK_SKEW_SECONDS = 60
+
+
+class _ConfigSnapshot:
+    """A config API response, as fetched by some worker on this host."""
+
+    publishable_key: str
+    fetched_unix_seconds: float
+    config_json: str
+
+
+def _config_file_path(directory: str, publishable_key: str) -> str:
+    return os.path.join(directory, f"tesseral-config-{publishable_key}.json")
+
+
+def _read_config_snapshot(path: str, publishable_key: str) -> Optional[_ConfigSnapshot]:
+    """
+    Returns the snapshot at path, or None if there is none, or if it cannot be
+    read or is not a valid snapshot for publishable_key.
+
+    Snapshots are only trusted if they are owned by this process's user and are
+    not writable by anyone else, so that another user on the host cannot plant
+    a config with their own signing keys.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+        with os.fdopen(fd, "rb") as f:
+            if not _is_trusted_file(os.fstat(f.fileno())):
+                return None
+            data = json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(data, dict) or data.get("version") != _FORMAT_VERSION:
+        return None
+
+    fetched_unix_seconds = data.get("fetchedUnixSeconds")
+    config_json = data.get("config")
+    if (
+        data.get("publishableKey") != publishable_key
+        or not isinstance(fetched_unix_seconds, (int, float))
+        or fetched_unix_seconds > time.time() + _MAX_CLOCK_SKEW_SECONDS
+        or not isinstance(config_json, str)
+    ):
+        return None
+
+    snapshot = _ConfigSnapshot()
+    snapshot.publishable_key = publishable_key
+    snapshot.fetched_unix_seconds = fetched_unix_seconds
+    snapshot.config_json = config_json
+    return snapshot
+
+
+def _is_trusted_file(st: os.stat_result) -> bool:
+    if not stat.S_ISREG(st.st_mode) or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    geteuid = getattr(os, "geteuid", None)  # not available on Windows
+    return geteuid is None or st.st_uid == geteuid()
+
+
+def _write_config_snapshot(path: str, snapshot: _ConfigSnapshot) -> None:
+    """
+    Atomically replaces the snapshot at path, so that readers see either the
+    old snapshot or the new one, never a partial write.
+
+    Raises:
+        OSError: If the snapshot could not be written.
+    """
+    data = json.dumps(
+        {
+            "version": _FORMAT_VERSION,
+            "publishableKey": snapshot.publishable_key,
+            "fetchedUnixSeconds": snapshot.fetched_unix_seconds,
+            "config": snapshot.config_json,
+        }
+    ).encode()
+
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix=".tesseral-config-", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _try_lock_config_file(path: str) -> Optional[int]:
+    """
+    Tries to take an exclusive lock on the lock file for the snapshot at path,
+    without waiting. Returns a file descriptor to pass to _unlock_config_file,
+    or None if another process holds the lock.
+
+    Raises:
+        OSError: If locking is not possible, e.g. because the directory is not
+            writable or the platform does not support it.
+    """
+    if fcntl is None:
+        raise OSError("file locking is not supported on this platform")
+
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _unlock_config_file(fd: int) -> None:
+    # Closing the file descriptor releases the lock.
+    os.close(fd)
@@ -1,9 +1,33 @@
 import re
+from typing import Optional
+
+_JWT_PATTERN = r"[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+"
+_API_KEY_PATTERN = r"[a-z0-9_]+"
+
+_JWT_RE = re.compile(_JWT_PATTERN)
+_API_KEY_RE = re.compile(_API_KEY_PATTERN)
+
+# The two formats are mutually exclusive (API keys never contain "."), so a
+# single pass over the credential tells them apart.
+_CREDENTIAL_RE = re.compile(
+    f"(?P<access_token>{_JWT_PATTERN})|(?P<api_key>{_API_KEY_PATTERN})"
+)
 
 
 def is_jwt_format(value: str) -> bool:
-    return bool(re.match(r"^[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+$", value))
+    return _JWT_RE.fullmatch(value) is not None
 
 
 def is_api_key_format(value: str) -> bool:
-    return bool(re.match(r"^[a-z0-9_]+$", value))
+    return _API_KEY_RE.fullmatch(value) is not None
+
+
+def classify_credential(value: str) -> Optional[str]:
+    """
+    Returns "access_token" if value is JWT-formatted, "api_key" if it is
+    API-key-formatted, and None otherwise.
+    """
+    match = _CREDENTIAL_RE.fullmatch(value)
+    if match is None:
+        return None
+    return match.lastgroup
@@ -0,0 +1,100 @@
+from typing import Any, Callable
+
+from fastapi import Depends, HTTPException, WebSocketException
+from starlette.requests import HTTPConnection
+
+from ._auth import Auth
+from ._middleware import get_auth
+from ._request_authenticator import _RequestAuthenticator
+from ._websocket import _POLICY_VIOLATION
+
+
+class RequireAuth:
+    """
+    A FastAPI dependency that authenticates requests, for apps that require
+    authentication only on some routes, instead of using RequireAuthMiddleware
+    on every route.
+
+    Unauthenticated requests receive a 401 Unauthorized error, and
+    unauthenticated WebSocket connections are closed with code 1008. Unlike
+    with RequireAuthMiddleware, WebSocket connections are not closed when
+    their access token expires. The dependency evaluates to the request's Auth
+    instance, which get_auth and require_permission dependencies that come
+    after it also see:
+
+        require_auth = RequireAuth(publishable_key="publishable_key_...")
+
+        @app.get("/widgets")
+        async def list_widgets(auth: Auth = Depends(require_auth)): ...
+
+        @app.delete("/widgets/{id}", dependencies=[Depends(require_auth), Depends(require_permission("acme.widgets.delete"))])
+        async def delete_widget(id: str): ...
+
+    Create one instance per app, and share it between routes. The config is
+    loaded on the first authenticated request; to load it at startup and keep
+    it refreshed in the background, await startup() and shutdown() from your
+    app's lifespan.
+
+    Args:
+        **kwargs: The same keyword arguments as RequireAuthMiddleware, except app, server_timing, and the public_* and
+            websocket_* arguments.
+
+    Raises:
+        RuntimeError: If not exactly one of publishable_key and publishable_keys is provided, if api_keys_enabled is
+            True but neither tesseral_client, api_key_authenticator, nor TESSERAL_BACKEND_API_KEY is provided, or if
+            jwks_refresh_interval_seconds or jwks_soft_refresh_interval_seconds is not positive.
+    """
+
+    authenticator: _RequestAuthenticator
+
+    def __init__(self, **kwargs: Any):
+        self.authenticator = _RequestAuthenticator(**kwargs)
+
+    async def __call__(self, connection: HTTPConnection) -> Auth:
+        auth = await self.authenticator.authenticate_request(
+            connection.scope["headers"]
+        )
+        if auth is None:
+            if connection.scope["type"] == "websocket":
+                raise WebSocketException(code=_POLICY_VIOLATION)
+            raise HTTPException(status_code=401, detail="Unauthorized")
+
+        connection.scope.setdefault("state", {})["_tesseral_auth"] = auth
+        return auth
+
+    async def startup(self) -> None:
+        """Loads the config, unless prewarm_on_startup is False, and starts refreshing it in the background."""
+        await self.authenticator.startup()
+
+    async def shutdown(self) -> None:
+        """Stops refreshing the config, and closes the HTTP client if RequireAuth created it."""
+        await self.authenticator.shutdown()
+
+
+def require_permission(*actions: str) -> Callable[..., Auth]:
+    """
+    Returns a FastAPI dependency that rejects requests lacking any of the given
+    permissions with a 403 Forbidden error, before the route handler runs.
+
+    The dependency evaluates to the request's Auth instance, so it can be used
+    either in a route's dependencies or in place of Depends(get_auth):
+
+        @app.delete("/widgets/{id}", dependencies=[Depends(require_permission("acme.widgets.delete"))])
+        async def delete_widget(id: str): ...
+
+        @app.post("/widgets")
+        async def create_widget(auth: Auth = Depends(require_permission("acme.widgets.create"))): ...
+
+    Args:
+        *actions: Action names, as accepted by Auth.has_permission. The requester must have all of them.
+
+    Returns:
+        A dependency that returns the request's Auth instance.
+    """
+
+    def dependency(auth: Auth = Depends(get_auth)) -> Auth:
+        if not auth.has_all_permissions(actions):
+            raise HTTPException(status_code=403, detail="Forbidden")
+        return auth
+
+    return dependency
@@ -1,21 +1,28 @@
-from os import environ
-from typing import Optional
+import time
+from concurrent.futures import Executor
+from typing import Iterable, Optional
 
 from httpx import AsyncClient
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response, JSONResponse
-from tesseral import AsyncTesseral, BadRequestError
-
-from ._access_token_authenticator import (
-    AsyncAccessTokenAuthenticator,
-    InvalidAccessTokenException,
-)
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from starlette.websockets import WebSocketClose
+from tesseral import AsyncTesseral
+
+from ._api_key_authenticator import AsyncApiKeyAuthenticator
 from ._auth import Auth
-from ._credentials import is_jwt_format, is_api_key_format
+from ._observer import AuthObserver
+from ._public_paths import _PublicPathMatcher
+from ._request_authenticator import _RequestAuthenticator
+from ._websocket import (
+    _POLICY_VIOLATION,
+    _WebSocketExpiry,
+    _websocket_credential,
+    _with_accepted_subprotocol,
+)
 
 
-class RequireAuthMiddleware(BaseHTTPMiddleware):
+class RequireAuthMiddleware:
     """
     FastAPI/Starlette middleware that authenticates requests.
 
@@ -24,113 +31,293 @@ class RequireAuthMiddleware(BaseHTTPMiddleware):
     Authenticated requests carry authentication data, which you can extract by
     having your handler take an argument annotated with Depends(get_auth).
     Requests will be required to be authenticated even if you do not extract an
-    Auth instance in your handler.
+    Auth instance in your handler, unless they match public_paths,
+    public_path_prefixes, or public_methods. To require authentication only on
+    some routes instead, use the RequireAuth dependency.
+
+    WebSocket connections are authenticated once, at the handshake, and are
+    closed with code 1008 if they are not authenticated, or when the access
+    token they were authenticated with expires.
+
+    This is a pure ASGI middleware. Scopes other than HTTP, WebSocket, and
+    lifespan are passed through to the wrapped application unchanged. On
+    lifespan startup, the middleware loads the config and starts refreshing the
+    JWKS in the background, and stops on lifespan shutdown.
 
     Args:
         app: The FastAPI/Starlette application to wrap with this middleware.
         publishable_key: The Tesseral publishable key for your project.
+        publishable_keys: The Tesseral publishable keys of several projects, to accept access tokens from any of them,
+            instead of publishable_key. Each project has its own JWKS and refresh schedule, access tokens are routed
+            to their project by key ID, and access token cookies are accepted for every project.
         config_api_hostname: The hostname of the Tesseral config API. Defaults to "config.tesseral.com".
         jwks_refresh_interval_seconds: How often to refresh the JWKS cache, in seconds. Defaults to 3600 (1 hour).
-        http_client: Optional custom httpx.AsyncClient to use for requests. If not provided, a new client will be created.
+        jwks_soft_refresh_interval_seconds: How long after a fetch the JWKS starts being refreshed in the background,
+            while the current keys keep being served. Defaults to 80% of jwks_refresh_interval_seconds.
+        jwks_max_staleness_seconds: How long past jwks_refresh_interval_seconds the current keys may still be used
+            if the config API cannot be reached. Defaults to 3600 (1 hour).
+        jwks_unknown_kid_refresh_interval_seconds: When an access token is signed by a key that is not in the JWKS
+            cache, the JWKS is refreshed immediately, at most once per this many seconds. Defaults to 60. Set to None
+            to only refresh on schedule.
+        http_client: Optional custom httpx.AsyncClient to use for requests to the config API, and to the Tesseral backend
+            if tesseral_client is not provided. If not provided, the middleware creates one from the http_* arguments,
+            and closes it on lifespan shutdown.
         api_keys_enabled: Whether to enable API key authentication. Defaults to False.
         tesseral_client: Optional AsyncTesseral client to use for API key authentication. If not provided and
             api_keys_enabled is True, a new client will be created using the TESSERAL_BACKEND_API_KEY environment variable.
+        access_token_cache_size: The maximum number of verified access tokens to cache in memory. Cached tokens skip
+            signature verification until they expire. Defaults to 0, which disables the cache.
+        rejected_access_token_cache_size: The maximum number of rejected access tokens that can never become valid to
+            remember in memory, so that replaying them skips verification. Defaults to 1024. Set to 0 to disable.
+        verification_executor: Optional concurrent.futures.Executor to run access token signature verification and
+            claims parsing on, instead of on the event loop. Defaults to None.
+        verification_max_pending: The maximum number of access token verifications submitted to
+            verification_executor at once. Defaults to 256.
+        api_key_cache_size: The maximum number of API key authentication results to cache in memory. Defaults to 0,
+            which disables the cache.
+        api_key_cache_ttl_seconds: How long a successful API key authentication is cached, in seconds. Defaults to 60.
+        api_key_negative_cache_ttl_seconds: How long a rejected API key is cached, in seconds. Defaults to 5.
+        api_key_authenticator: Optional AsyncApiKeyAuthenticator to use for API key authentication. Provide one if you
+            need to invalidate cached API keys, e.g. after revoking them. If provided, tesseral_client and the
+            api_key_cache_* arguments are ignored.
+        observer: Optional AuthObserver to report timings, outcomes, JWKS refreshes, and cache lookups to. Defaults to
+            None, which adds no overhead. It is not given to an api_key_authenticator you provide; pass it to that
+            authenticator's constructor instead.
+        server_timing: Whether to add a Server-Timing header to responses, with the time spent authenticating the
+            request as "tesseral-auth". Defaults to False.
+        shared_config_directory: Optional private (0700) directory, owned by the user the app runs as, through which
+            worker processes on the same host share fetched configs, so that one worker fetches the config and the
+            others reuse it. Shared files that are not owned by that user, or that others can write to, are ignored.
+            Workers fall back to fetching the config themselves if the shared file is unavailable, untrusted, or
+            corrupt. Defaults to None, which disables sharing.
+        config_snapshot_path: Optional file to save the last fetched config to. A new process loads the config from it,
+            if it is no more than jwks_max_staleness_seconds past expiry, and serves requests with it while refreshing
+            it in the background, instead of waiting on the config API. With several publishable_keys, each project's
+            config is saved to this path with "." and its publishable key appended. Defaults to None.
+        prewarm_on_startup: Whether to load the config on lifespan startup, before the app serves requests. If the
+            config cannot be loaded, a warning is logged and startup continues. Defaults to True.
+        http_max_connections: The maximum number of concurrent connections the middleware's HTTP client opens.
+            Defaults to 100. Ignored if http_client is provided.
+        http_max_keepalive_connections: The maximum number of idle connections the middleware's HTTP client keeps
+            alive. Defaults to 20. Ignored if http_client is provided.
+        http_keepalive_expiry_seconds: How long an idle connection is kept alive, in seconds. Defaults to 5. Ignored if
+            http_client is provided.
+        http_timeout_seconds: The timeout for requests to the config API and the Tesseral backend, in seconds.
+            Defaults to 10. Ignored for the Tesseral backend if tesseral_client is provided.
+        http2: Whether the middleware's HTTP client uses HTTP/2. Requires the http2 extra, i.e.
+            pip install tesseral-fastapi[http2]. Defaults to False. Ignored if http_client is provided.
+        public_paths: Request paths, such as "/healthz", that skip authentication entirely. Handlers for them cannot
+            use get_auth. Defaults to none.
+        public_path_prefixes: Path prefixes, such as "/public", whose requests skip authentication entirely. A prefix
+            matches whole path segments, so "/public" matches "/public/a" but not "/publicity". Defaults to none.
+        public_methods: HTTP methods, such as "OPTIONS" for CORS preflight requests, that skip authentication entirely.
+            Defaults to none.
+        websocket_access_token_subprotocol_prefix: Optional prefix, such as "tesseral-access-token.", of a WebSocket
+            subprotocol that carries a credential after the prefix, for clients such as browsers that cannot set
+            headers on WebSocket handshakes. The subprotocol is hidden from the app. If it is the only subprotocol the
+            client offers, the handshake is accepted with it, as browsers require. Defaults to None.
+        websocket_access_token_query_param: Optional name of a query parameter that carries a credential on WebSocket
+            handshakes. Query strings often end up in logs, so prefer websocket_access_token_subprotocol_prefix.
+            Defaults to None.
+        circuit_breaker_failure_threshold: How many consecutive failures of the config API, or of the Tesseral
+            backend, make the middleware stop calling it for a while. Requests that would need it then fail fast,
+            or are served stale keys, instead of each waiting on a call of their own. Defaults to 5.
+        circuit_breaker_min_backoff_seconds: How long the middleware first stops calling a failing upstream for. The
+            backoff doubles, with jitter, each time a probe call fails. Defaults to 1.
+        circuit_breaker_max_backoff_seconds: The longest the middleware stops calling a failing upstream for.
+            Defaults to 30.
 
     Raises:
-        RuntimeError: If api_keys_enabled is True but neither tesseral_client nor TESSERAL_BACKEND_API_KEY is provided.
+        RuntimeError: If not exactly one of publishable_key and publishable_keys is provided, if api_keys_enabled is
+            True but neither tesseral_client, api_key_authenticator, nor TESSERAL_BACKEND_API_KEY is provided, or if
+            jwks_refresh_interval_seconds or jwks_soft_refresh_interval_seconds is not positive.
     """
 
     def __init__(
         self,
-        app,
+        app: ASGIApp,
         *,
-        publishable_key,
+        publishable_key=None,
+        publishable_keys: Optional[Iterable[str]] = None,
         config_api_hostname="config.tesseral.com",
         jwks_refresh_interval_seconds: int = 3600,
+        jwks_soft_refresh_interval_seconds: Optional[int] = None,
+        jwks_max_staleness_seconds: int = 3600,
+        jwks_unknown_kid_refresh_interval_seconds: Optional[int] = 60,
         http_client: Optional[AsyncClient] = None,
         api_keys_enabled: bool = False,
         tesseral_client: Optional[AsyncTesseral] = None,
+        access_token_cache_size: int = 0,
+        rejected_access_token_cache_size: int = 1024,
+        verification_executor: Optional[Executor] = None,
+        verification_max_pending: int = 256,
+        api_key_cache_size: int = 0,
+        api_key_cache_ttl_seconds: float = 60,
+        api_key_negative_cache_ttl_seconds: float = 5,
+        api_key_authenticator: Optional[AsyncApiKeyAuthenticator] = None,
+        observer: Optional[AuthObserver] = None,
+        server_timing: bool = False,
+        shared_config_directory: Optional[str] = None,
+        config_snapshot_path: Optional[str] = None,
+        prewarm_on_startup: bool = True,
+        http_max_connections: int = 100,
+        http_max_keepalive_connections: int = 20,
+        http_keepalive_expiry_seconds: float = 5,
+        http_timeout_seconds: float = 10,
+        http2: bool = False,
+        public_paths: Iterable[str] = (),
+        public_path_prefixes: Iterable[str] = (),
+        public_methods: Iterable[str] = (),
+        websocket_access_token_subprotocol_prefix: Optional[str] = None,
+        websocket_access_token_query_param: Optional[str] = None,
+        circuit_breaker_failure_threshold: int = 5,
+        circuit_breaker_min_backoff_seconds: float = 1,
+        circuit_breaker_max_backoff_seconds: float = 30,
     ):
-        if (
-            api_keys_enabled
-            and not tesseral_client
-            and "TESSERAL_BACKEND_API_KEY" not in environ
-        ):
-            raise RuntimeError(
-                "If you set api_keys_enabled to true, then you must either provide a tesseral_client or you must set a TESSERAL_BACKEND_API_KEY environment variable."
-            )
-
-        super().__init__(app)
-        self.publishable_key = publishable_key
-        self.config_api_hostname = config_api_hostname
-        self.jwks_refresh_interval_seconds = jwks_refresh_interval_seconds
-        self.http_client = http_client or AsyncClient()
-        self.api_keys_enabled = api_keys_enabled
-        self.tesseral_client = tesseral_client or AsyncTesseral()
-
-        self.access_token_authenticator = AsyncAccessTokenAuthenticator(
+        self.app = app
+        self.server_timing = server_timing
+        self.websocket_access_token_subprotocol_prefix = (
+            websocket_access_token_subprotocol_prefix
+        )
+        self.websocket_access_token_query_param = websocket_access_token_query_param
+        self.public_paths = _PublicPathMatcher(
+            paths=public_paths, prefixes=public_path_prefixes, methods=public_methods
+        )
+        self.authenticator = _RequestAuthenticator(
             publishable_key=publishable_key,
+            publishable_keys=publishable_keys,
             config_api_hostname=config_api_hostname,
             jwks_refresh_interval_seconds=jwks_refresh_interval_seconds,
+            jwks_soft_refresh_interval_seconds=jwks_soft_refresh_interval_seconds,
+            jwks_max_staleness_seconds=jwks_max_staleness_seconds,
+            jwks_unknown_kid_refresh_interval_seconds=jwks_unknown_kid_refresh_interval_seconds,
             http_client=http_client,
+            api_keys_enabled=api_keys_enabled,
+            tesseral_client=tesseral_client,
+            access_token_cache_size=access_token_cache_size,
+            rejected_access_token_cache_size=rejected_access_token_cache_size,
+            verification_executor=verification_executor,
+            verification_max_pending=verification_max_pending,
+            api_key_cache_size=api_key_cache_size,
+            api_key_cache_ttl_seconds=api_key_cache_ttl_seconds,
+            api_key_negative_cache_ttl_seconds=api_key_negative_cache_ttl_seconds,
+            api_key_authenticator=api_key_authenticator,
+            observer=observer,
+            shared_config_directory=shared_config_directory,
+            config_snapshot_path=config_snapshot_path,
+            prewarm_on_startup=prewarm_on_startup,
+            http_max_connections=http_max_connections,
+            http_max_keepalive_connections=http_max_keepalive_connections,
+            http_keepalive_expiry_seconds=http_keepalive_expiry_seconds,
+            http_timeout_seconds=http_timeout_seconds,
+            http2=http2,
+            circuit_breaker_failure_threshold=circuit_breaker_failure_threshold,
+            circuit_breaker_min_backoff_seconds=circuit_breaker_min_backoff_seconds,
+            circuit_breaker_max_backoff_seconds=circuit_breaker_max_backoff_seconds,
         )
 
-    async def dispatch(self, request: Request, call_next) -> Response:
-        credential = _credential(
-            request, await self.access_token_authenticator.project_id()
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.app(scope, self._lifespan_receive(receive), send)
+            return
+        if scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.public_paths.matches(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter() if self.server_timing else 0
+        auth = await self.authenticator.authenticate_request(scope["headers"])
+
+        if self.server_timing:
+            send = _with_server_timing(send, time.perf_counter() - start)
+        if auth is None:
+            response = JSONResponse({"error": "Unauthorized"}, status_code=401)
+            await response(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["_tesseral_auth"] = auth
+        await self.app(scope, receive, send)
+
+    async def _websocket(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # The handshake is a GET request.
+        if self.public_paths.matches("GET", scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        subprotocols = scope.get("subprotocols", [])
+        scope, credential = _websocket_credential(
+            scope,
+            self.websocket_access_token_subprotocol_prefix,
+            self.websocket_access_token_query_param,
+        )
+        if subprotocols and not scope.get("subprotocols"):
+            # The client offered only the subprotocol carrying its credential.
+            send = _with_accepted_subprotocol(send, subprotocols[0])
+        auth = await self.authenticator.authenticate_request(
+            scope["headers"], fallback_credential=credential
         )
-        if is_jwt_format(credential):
-            try:
-                access_token_claims = (
-                    await self.access_token_authenticator.authenticate_access_token(
-                        access_token=credential
-                    )
-                )
-            except InvalidAccessTokenException:
-                return JSONResponse({"error": "Unauthorized"}, status_code=401)
-            except Exception as e:
-                raise e
-
-            auth = Auth()
-            auth._access_token = credential
-            auth._access_token_claims = access_token_claims
-            auth._api_key_secret_token = None
-            auth._authenticate_api_key_response = None
-            request.state._tesseral_auth = auth
-            return await call_next(request)
-        elif self.api_keys_enabled and is_api_key_format(credential):
-            try:
-                authenticate_api_key_response = (
-                    await self.tesseral_client.api_keys.authenticate_api_key(
-                        secret_token=credential
-                    )
-                )
-            except BadRequestError:
-                return JSONResponse({"error": "Unauthorized"}, status_code=401)
-            except Exception as e:
-                raise e
-
-            auth = Auth()
-            auth._access_token = None
-            auth._access_token_claims = None
-            auth._api_key_secret_token = credential
-            auth._authenticate_api_key_response = authenticate_api_key_response
-            request.state._tesseral_auth = auth
-            return await call_next(request)
-
-        return JSONResponse({"error": "Unauthorized"}, status_code=401)
-
-
-def get_auth(request: Request) -> Auth:
+        if auth is None:
+            await WebSocketClose(code=_POLICY_VIOLATION)(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["_tesseral_auth"] = auth
+        if auth._access_token_raw_claims is None:
+            # API keys do not expire mid-connection.
+            await self.app(scope, receive, send)
+            return
+
+        expiry = _WebSocketExpiry(send, auth._access_token_raw_claims["exp"])
+        try:
+            await self.app(scope, receive, expiry.send)
+        finally:
+            await expiry.stop()
+
+    def _lifespan_receive(self, receive: Receive) -> Receive:
+        async def wrapped_receive() -> Message:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.authenticator.startup()
+            elif message["type"] == "lifespan.shutdown":
+                await self.authenticator.shutdown()
+            return message
+
+        return wrapped_receive
+
+
+def _with_server_timing(send: Send, auth_seconds: float) -> Send:
+    server_timing = f"tesseral-auth;dur={auth_seconds * 1000:.3f}".encode()
+
+    async def wrapped_send(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            message = {
+                **message,
+                "headers": [
+                    *message.get("headers", ()),
+                    (b"server-timing", server_timing),
+                ],
+            }
+        await send(message)
+
+    return wrapped_send
+
+
+def get_auth(request: HTTPConnection) -> Auth:
     """
     Retrieves the Auth instance from the request.
 
     This function is intended to be used with FastAPI's Depends to inject
-    an Auth instance into route handlers. The Auth instance is created by
-    RequireAuthMiddleware.
+    an Auth instance into route handlers, including WebSocket handlers. The
+    Auth instance is created by RequireAuthMiddleware, or by a RequireAuth
+    dependency that ran earlier.
 
     Args:
-        request: The FastAPI/Starlette request object.
+        request: The FastAPI/Starlette request or WebSocket object.
 
     Returns:
         Auth: The Auth instance containing authentication information.
@@ -140,22 +327,7 @@ def get_auth(request: Request) -> Auth:
     """
     try:
         return request.state._tesseral_auth
-    except KeyError:
+    except AttributeError:
         raise RuntimeError(
             "Called tesseral_fastapi.get_auth() outside of an authenticated request. Did you forget to use RequireAuthMiddleware?"
         )
-
-
-_PREFIX_BEARER = "Bearer "
-
-
-def _credential(request: Request, project_id: str) -> str:
-    auth_header = request.headers.get("authorization")
-    if auth_header and auth_header.startswith(_PREFIX_BEARER):
-        return auth_header[len(_PREFIX_BEARER) :]
-
-    cookie_name = f"tesseral_{project_id}_access_token"
-    if cookie_name in request.cookies:
-        return request.cookies[cookie_name]
-
-    return ""
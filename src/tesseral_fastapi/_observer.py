@@ -0,0 +1,179 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class AuthObserver:
+    """
+    Receives metrics and tracing events from RequireAuthMiddleware and the
+    authenticators it uses.
+
+    Subclass this and override the methods you are interested in; the default
+    implementations do nothing. Methods may be called from verification
+    executor threads, and must not block.
+
+    Timed stages:
+        "config_fetch": Fetching the config, including the JWKS, from the config API.
+        "jwt_decode": Splitting an access token and decoding its header and signature.
+        "signature_verify": Verifying an access token's signature.
+        "claims_parse": Decoding an access token's claims and checking exp and nbf.
+        "api_key_backend": Authenticating an API key against the Tesseral backend.
+
+    Outcomes:
+        "success", "missing_credentials", "invalid_token", "unknown_kid", "expired",
+        "invalid_api_key", and "backend_error" (the config API or Tesseral backend could not be reached).
+
+    Events:
+        "jwks_refresh", "jwks_refresh_failed", "jwks_stale_served", "jwks_unknown_kid_refresh",
+        "shared_config_hit" (a config fetched by another process was used), "config_snapshot_loaded" (a config saved
+        by an earlier process was loaded), "api_key_coalesced" (an API key authentication waited on an identical
+        in-flight one), and "config_api_circuit_open" and "api_key_backend_circuit_open" (a call to a failing upstream
+        was skipped).
+
+    Caches:
+        "access_token", "rejected_access_token", and "api_key".
+    """
+
+    def on_timing(self, stage: str, seconds: float) -> None:
+        """Called with the duration of a stage of authentication."""
+
+    def on_outcome(self, outcome: str) -> None:
+        """Called with the outcome of authenticating a request."""
+
+    def on_event(self, event: str) -> None:
+        """Called when something notable, such as a JWKS refresh, happens."""
+
+    def on_cache_lookup(self, cache: str, hit: bool) -> None:
+        """Called on every lookup in an enabled cache."""
+
+
+# Upper bounds of histogram buckets, in seconds: 10us to 10s.
+_DEFAULT_BUCKETS = (
+    0.00001,
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram of durations, in seconds.
+
+    bucket_counts[i] counts durations no greater than bucket_bounds[i], and
+    greater than bucket_bounds[i - 1]. The last count is for durations greater
+    than every bound.
+    """
+
+    bucket_bounds: Tuple[float, ...]
+    bucket_counts: List[int]
+    count: int
+    sum_seconds: float
+
+    def __init__(self, bucket_bounds: Tuple[float, ...] = _DEFAULT_BUCKETS):
+        self.bucket_bounds = bucket_bounds
+        self.bucket_counts = [0] * (len(bucket_bounds) + 1)
+        self.count = 0
+        self.sum_seconds = 0
+
+    def observe(self, seconds: float) -> None:
+        self.bucket_counts[bisect.bisect_left(self.bucket_bounds, seconds)] += 1
+        self.count += 1
+        self.sum_seconds += seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns an upper bound on the q-quantile, e.g. 0.99 for p99, as the
+        bound of the bucket it falls in. Returns infinity if it falls past the
+        last bucket, and 0 if nothing was observed.
+        """
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bucket_bounds, self.bucket_counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class InMemoryAuthObserver(AuthObserver):
+    """
+    An AuthObserver that keeps a histogram per timed stage, and counters for
+    outcomes, events, and cache hits and misses, in memory.
+
+    Useful in tests, and as a reference for exporting to a metrics system.
+    """
+
+    histograms: Dict[str, Histogram]
+    outcomes: Dict[str, int]
+    events: Dict[str, int]
+    cache_hits: Dict[str, int]
+    cache_misses: Dict[str, int]
+    _lock: threading.Lock
+
+    def __init__(self):
+        self.histograms = {}
+        self.outcomes = {}
+        self.events = {}
+        self.cache_hits = {}
+        self.cache_misses = {}
+        self._lock = threading.Lock()
+
+    def on_timing(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def on_outcome(self, outcome: str) -> None:
+        with self._lock:
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def on_event(self, event: str) -> None:
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + 1
+
+    def on_cache_lookup(self, cache: str, hit: bool) -> None:
+        counters = self.cache_hits if hit else self.cache_misses
+        with self._lock:
+            counters[cache] = counters.get(cache, 0) + 1
+
+
+class _StageTimer:
+    """Times consecutive stages of work, reporting each to an observer."""
+
+    _observer: AuthObserver
+    _start: float
+
+    def __init__(self, observer: AuthObserver):
+        self._observer = observer
+        self._start = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self._observer.on_timing(stage, now - self._start)
+        self._start = now
+
+
+def _stage_timer(observer: Optional[AuthObserver]) -> Optional[_StageTimer]:
+    if observer is None:
+        return None
+    return _StageTimer(observer)
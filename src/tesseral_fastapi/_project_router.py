@@ -0,0 +1,103 @@
+from typing import Dict, List, Optional
+
+from cryptography.hazmat.primitives.asymmetric.ec import EllipticCurvePublicKey
+
+from ._access_token_authenticator import (
+    AsyncAccessTokenAuthenticator,
+    InvalidAccessTokenException,
+    _UnknownKeyIdException,
+    _VerifiedAccessToken,
+    _kid,
+)
+
+
+class _ProjectRouter:
+    """
+    Verifies access tokens for several projects, each with its own
+    AsyncAccessTokenAuthenticator, and so its own JWKS and refresh schedule.
+
+    Tokens are routed to their project with a single lookup of their kid in an
+    index of every project's JWKS, rather than being tried against each
+    project in turn. The index is rebuilt whenever a project's JWKS changes.
+    """
+
+    authenticators: List[AsyncAccessTokenAuthenticator]
+    _kid_index: Dict[str, AsyncAccessTokenAuthenticator]
+    # The JWKS each authenticator had when _kid_index was built.
+    _indexed_jwks: List[Optional[Dict[str, EllipticCurvePublicKey]]]
+
+    def __init__(self, authenticators: List[AsyncAccessTokenAuthenticator]):
+        self.authenticators = authenticators
+        self._kid_index = {}
+        self._indexed_jwks = [None] * len(authenticators)
+
+    async def project_ids(self) -> List[str]:
+        """
+        Returns the IDs of the projects whose config could be loaded.
+
+        Raises:
+            Exception: If no project's config could be loaded.
+        """
+        if len(self.authenticators) == 1:
+            return [await self.authenticators[0].project_id()]
+
+        # One project's config API outage should not take down the others.
+        project_ids = []
+        error: Optional[Exception] = None
+        for authenticator in self.authenticators:
+            try:
+                project_ids.append(await authenticator.project_id())
+            except Exception as e:
+                error = error or e
+        if not project_ids and error is not None:
+            raise error
+        return project_ids
+
+    async def verify_access_token(self, *, access_token: str) -> _VerifiedAccessToken:
+        if len(self.authenticators) == 1:
+            return await self.authenticators[0].verify_access_token(
+                access_token=access_token
+            )
+
+        kid = _kid(access_token)
+        authenticator = self._index().get(kid)
+        if authenticator is not None:
+            return await authenticator.verify_access_token(access_token=access_token)
+
+        # The kid may belong to a key rotated into any of the projects since
+        # its last refresh. Each project rate-limits its own refreshes, and, as
+        # in project_ids, one project's config API outage is skipped over.
+        error: Optional[Exception] = None
+        checked = False
+        for authenticator in self.authenticators:
+            try:
+                return await authenticator.verify_access_token(
+                    access_token=access_token
+                )
+            except _UnknownKeyIdException:
+                checked = True
+            except InvalidAccessTokenException:
+                raise
+            except Exception as e:
+                error = error or e
+        if not checked and error is not None:
+            raise error
+        raise _UnknownKeyIdException(kid)
+
+    def _index(self) -> Dict[str, AsyncAccessTokenAuthenticator]:
+        for authenticator, jwks in zip(self.authenticators, self._indexed_jwks):
+            if authenticator._config.jwks is not jwks:
+                break
+        else:
+            return self._kid_index
+
+        kid_index: Dict[str, AsyncAccessTokenAuthenticator] = {}
+        # Should two projects share a kid, the first one listed wins.
+        for authenticator in reversed(self.authenticators):
+            for kid in authenticator._config.jwks:
+                kid_index[kid] = authenticator
+        self._kid_index = kid_index
+        self._indexed_jwks = [
+            authenticator._config.jwks for authenticator in self.authenticators
+        ]
+        return kid_index
@@ -0,0 +1,73 @@
+from typing import Dict, Iterable, List
+
+
+class _PrefixNode:
+    children: Dict[str, "_PrefixNode"]
+    # Whether a public prefix ends at this node.
+    terminal: bool
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = False
+
+
+class _PublicPathMatcher:
+    """
+    Decides whether a request skips authentication, from its method and path.
+
+    Paths match exactly. Prefixes match whole path segments, so that "/public"
+    matches "/public" and "/public/a", but not "/publicity". Methods are
+    case-insensitive.
+
+    Exact paths and methods are looked up in sets, and prefixes in a trie of
+    path segments, so that a check costs about the same however many public
+    paths there are.
+    """
+
+    _methods: frozenset
+    _paths: frozenset
+    _prefixes: _PrefixNode
+    _has_prefixes: bool
+
+    def __init__(
+        self,
+        *,
+        paths: Iterable[str] = (),
+        prefixes: Iterable[str] = (),
+        methods: Iterable[str] = (),
+    ):
+        self._methods = frozenset(method.upper() for method in methods)
+        self._paths = frozenset(paths)
+        self._prefixes = _PrefixNode()
+        self._has_prefixes = False
+        for prefix in prefixes:
+            node = self._prefixes
+            for segment in _segments(prefix):
+                node = node.children.setdefault(segment, _PrefixNode())
+            node.terminal = True
+            self._has_prefixes = True
+
+    def matches(self, method: str, path: str) -> bool:
+        if method in self._methods or path in self._paths:
+            return True
+        if not self._has_prefixes:
+            return False
+
+        node = self._prefixes
+        if node.terminal:
+            return True
+        for segment in _segments(path):
+            child = node.children.get(segment)
+            if child is None:
+                return False
+            if child.terminal:
+                return True
+            node = child
+        return False
+
+
+def _segments(path: str) -> List[str]:
+    path = path.strip("/")
+    if not path:
+        return []
+    return path.split("/")
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from os import environ
+from typing import Iterable, List, Optional, Tuple
+
+from httpx import AsyncClient, Limits, Timeout
+from tesseral import AsyncTesseral
+
+from ._access_token_authenticator import (
+    AsyncAccessTokenAuthenticator,
+    InvalidAccessTokenException,
+    _ExpiredAccessTokenException,
+    _UnknownKeyIdException,
+)
+from ._api_key_authenticator import AsyncApiKeyAuthenticator, InvalidApiKeyException
+from ._auth import Auth
+from ._circuit_breaker import CircuitBreaker
+from ._credentials import classify_credential
+from ._observer import AuthObserver
+from ._project_router import _ProjectRouter
+
+_logger = logging.getLogger(__name__)
+
+
+class _RequestAuthenticator:
+    """
+    Authenticates requests from their headers, and manages the config refresh
+    and HTTP client that doing so needs.
+
+    This is the core shared by RequireAuthMiddleware and the RequireAuth
+    dependency; see RequireAuthMiddleware for its arguments.
+    """
+
+    def __init__(
+        self,
+        *,
+        publishable_key=None,
+        publishable_keys: Optional[Iterable[str]] = None,
+        config_api_hostname="config.tesseral.com",
+        jwks_refresh_interval_seconds: int = 3600,
+        jwks_soft_refresh_interval_seconds: Optional[int] = None,
+        jwks_max_staleness_seconds: int = 3600,
+        jwks_unknown_kid_refresh_interval_seconds: Optional[int] = 60,
+        http_client: Optional[AsyncClient] = None,
+        api_keys_enabled: bool = False,
+        tesseral_client: Optional[AsyncTesseral] = None,
+        access_token_cache_size: int = 0,
+        rejected_access_token_cache_size: int = 1024,
+        verification_executor: Optional[Executor] = None,
+        verification_max_pending: int = 256,
+        api_key_cache_size: int = 0,
+        api_key_cache_ttl_seconds: float = 60,
+        api_key_negative_cache_ttl_seconds: float = 5,
+        api_key_authenticator: Optional[AsyncApiKeyAuthenticator] = None,
+        observer: Optional[AuthObserver] = None,
+        shared_config_directory: Optional[str] = None,
+        config_snapshot_path: Optional[str] = None,
+        prewarm_on_startup: bool = True,
+        http_max_connections: int = 100,
+        http_max_keepalive_connections: int = 20,
+        http_keepalive_expiry_seconds: float = 5,
+        http_timeout_seconds: float = 10,
+        http2: bool = False,
+        circuit_breaker_failure_threshold: int = 5,
+        circuit_breaker_min_backoff_seconds: float = 1,
+        circuit_breaker_max_backoff_seconds: float = 30,
+    ):
+        if (publishable_key is None) == (publishable_keys is None):
+            raise RuntimeError(
+                "You must provide exactly one of publishable_key and publishable_keys."
+            )
+        if publishable_keys is None:
+            publishable_keys = [publishable_key]
+        else:
+            publishable_keys = list(publishable_keys)
+            if not publishable_keys:
+                raise RuntimeError("publishable_keys must not be empty.")
+
+        if (
+            api_keys_enabled
+            and not tesseral_client
+            and not api_key_authenticator
+            and "TESSERAL_BACKEND_API_KEY" not in environ
+        ):
+            raise RuntimeError(
+                "If you set api_keys_enabled to true, then you must either provide a tesseral_client or you must set a TESSERAL_BACKEND_API_KEY environment variable."
+            )
+
+        self.publishable_keys = publishable_keys
+        self.config_api_hostname = config_api_hostname
+        self.jwks_refresh_interval_seconds = jwks_refresh_interval_seconds
+        # The config API and the Tesseral backend share one connection pool.
+        # We only close the client if we created it.
+        self.owns_http_client = http_client is None
+        self.http_client = http_client or AsyncClient(
+            limits=Limits(
+                max_connections=http_max_connections,
+                max_keepalive_connections=http_max_keepalive_connections,
+                keepalive_expiry=http_keepalive_expiry_seconds,
+            ),
+            timeout=Timeout(http_timeout_seconds),
+            http2=http2,
+        )
+        self.api_keys_enabled = api_keys_enabled
+        self.tesseral_client = tesseral_client or AsyncTesseral(
+            httpx_client=self.http_client, timeout=http_timeout_seconds
+        )
+        self.observer = observer
+
+        def circuit_breaker() -> CircuitBreaker:
+            return CircuitBreaker(
+                failure_threshold=circuit_breaker_failure_threshold,
+                min_backoff_seconds=circuit_breaker_min_backoff_seconds,
+                max_backoff_seconds=circuit_breaker_max_backoff_seconds,
+            )
+
+        self.prewarm_on_startup = prewarm_on_startup
+
+        # Each project gets its own authenticator, and so its own JWKS and
+        # refresh schedule.
+        self.access_token_authenticators = [
+            AsyncAccessTokenAuthenticator(
+                publishable_key=key,
+                config_api_hostname=config_api_hostname,
+                jwks_refresh_interval_seconds=jwks_refresh_interval_seconds,
+                jwks_soft_refresh_interval_seconds=jwks_soft_refresh_interval_seconds,
+                jwks_max_staleness_seconds=jwks_max_staleness_seconds,
+                jwks_unknown_kid_refresh_interval_seconds=jwks_unknown_kid_refresh_interval_seconds,
+                http_client=self.http_client,
+                access_token_cache_size=access_token_cache_size,
+                rejected_access_token_cache_size=rejected_access_token_cache_size,
+                verification_executor=verification_executor,
+                verification_max_pending=verification_max_pending,
+                observer=observer,
+                shared_config_directory=shared_config_directory,
+                config_snapshot_path=_config_snapshot_path(
+                    config_snapshot_path, key, len(publishable_keys)
+                ),
+                config_api_timeout_seconds=http_timeout_seconds,
+                circuit_breaker=circuit_breaker(),
+            )
+            for key in publishable_keys
+        ]
+        self.projects = _ProjectRouter(self.access_token_authenticators)
+        self.api_key_authenticator = api_key_authenticator or AsyncApiKeyAuthenticator(
+            tesseral_client=self.tesseral_client,
+            api_key_cache_size=api_key_cache_size,
+            api_key_cache_ttl_seconds=api_key_cache_ttl_seconds,
+            api_key_negative_cache_ttl_seconds=api_key_negative_cache_ttl_seconds,
+            observer=observer,
+            circuit_breaker=circuit_breaker(),
+        )
+
+    async def startup(self) -> None:
+        if self.prewarm_on_startup:
+            await asyncio.gather(
+                *(
+                    _prewarm(authenticator)
+                    for authenticator in self.access_token_authenticators
+                )
+            )
+        for authenticator in self.access_token_authenticators:
+            await authenticator.start_background_refresh()
+
+    async def shutdown(self) -> None:
+        for authenticator in self.access_token_authenticators:
+            await authenticator.stop_background_refresh()
+        if self.owns_http_client:
+            await self.http_client.aclose()
+
+    async def authenticate_request(
+        self, headers: Iterable[Tuple[bytes, bytes]], *, fallback_credential: str = ""
+    ) -> Optional[Auth]:
+        """
+        Returns the Auth for a request with the given raw headers, or None if
+        the request is not authenticated. fallback_credential is used if the
+        headers carry no credential.
+
+        Raises:
+            Exception: If the config API or the Tesseral backend could not be
+                reached.
+        """
+        try:
+            credential = (
+                _credential(headers, await self.projects.project_ids())
+                or fallback_credential
+            )
+            return await self._authenticate(credential)
+        except Exception:
+            self._report_outcome("backend_error")
+            raise
+
+    async def _authenticate(self, credential: str) -> Optional[Auth]:
+        credential_type = classify_credential(credential)
+        if credential_type == "access_token":
+            try:
+                verified = await self.projects.verify_access_token(
+                    access_token=credential
+                )
+            except InvalidAccessTokenException as e:
+                self._report_outcome(_invalid_access_token_outcome(e))
+                return None
+
+            self._report_outcome("success")
+            auth = Auth()
+            auth._access_token = credential
+            auth._access_token_raw_claims = verified.raw_claims
+            return auth
+        elif credential_type == "api_key" and self.api_keys_enabled:
+            try:
+                authenticate_api_key_response = (
+                    await self.api_key_authenticator.authenticate_api_key(
+                        secret_token=credential
+                    )
+                )
+            except InvalidApiKeyException:
+                self._report_outcome("invalid_api_key")
+                return None
+
+            self._report_outcome("success")
+            auth = Auth()
+            auth._api_key_secret_token = credential
+            auth._authenticate_api_key_response = authenticate_api_key_response
+            return auth
+
+        self._report_outcome("invalid_token" if credential else "missing_credentials")
+        return None
+
+    def _report_outcome(self, outcome: str) -> None:
+        if self.observer is not None:
+            self.observer.on_outcome(outcome)
+
+
+async def _prewarm(authenticator: AsyncAccessTokenAuthenticator) -> None:
+    # Do not fail startup because the config API is unreachable; requests
+    # will try again.
+    try:
+        await authenticator.prewarm()
+    except Exception:
+        _logger.warning("Failed to prewarm Tesseral config", exc_info=True)
+
+
+def _config_snapshot_path(
+    path: Optional[str], publishable_key: str, projects: int
+) -> Optional[str]:
+    # Each project needs a snapshot of its own.
+    if path is None or projects == 1:
+        return path
+    return f"{path}.{publishable_key}"
+
+
+def _invalid_access_token_outcome(e: InvalidAccessTokenException) -> str:
+    if isinstance(e, _UnknownKeyIdException):
+        return "unknown_kid"
+    if isinstance(e, _ExpiredAccessTokenException):
+        return "expired"
+    return "invalid_token"
+
+
+_PREFIX_BEARER = "Bearer "
+
+
+def _credential(headers: Iterable[Tuple[bytes, bytes]], project_ids: List[str]) -> str:
+    cookie_names = [
+        f"tesseral_{project_id}_access_token".encode() for project_id in project_ids
+    ]
+    cookie_value = None
+    for name, value in headers:
+        if name == b"authorization":
+            auth_header = value.decode("latin-1")
+            if auth_header.startswith(_PREFIX_BEARER):
+                return auth_header[len(_PREFIX_BEARER) :]
+        elif name == b"cookie" and cookie_value is None:
+            # If there are cookies for several projects, the first project
+            # listed wins.
+            for cookie_name in cookie_names:
+                cookie_value = _cookie_value(value, cookie_name)
+                if cookie_value is not None:
+                    break
+
+    if cookie_value is not None:
+        return cookie_value.decode("latin-1")
+
+    return ""
+
+
+def _cookie_value(cookie_header: bytes, cookie_name: bytes) -> Optional[bytes]:
+    # Finds a single cookie without parsing the whole header. A match only
+    # counts if it starts a "name=value" pair, so that e.g. "xtesseral_..."
+    # does not match.
+    start = 0
+    while True:
+        i = cookie_header.find(cookie_name, start)
+        if i == -1:
+            return None
+
+        j = i + len(cookie_name)
+        at_pair_start = i == 0 or cookie_header[i - 1] in b"; "
+        if at_pair_start and cookie_header[j : j + 1] == b"=":
+            end = cookie_header.find(b";", j)
+            if end == -1:
+                end = len(cookie_header)
+            value = cookie_header[j + 1 : end].strip()
+            # Strip quotes, as Starlette's cookie parser does.
+            if len(value) >= 2 and value[:1] == value[-1:] == b'"':
+                value = value[1:-1]
+            return value
+
+        start = j
@@ -0,0 +1,405 @@
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from httpx import USE_CLIENT_DEFAULT, Client
+from tesseral.types.access_token_claims import AccessTokenClaims
+
+from ._access_token_authenticator import (
+    _MIN_BACKGROUND_REFRESH_SECONDS,
+    _UNKNOWN_KID_CACHE_SIZE,
+    InvalidAccessTokenException,
+    _NO_CONFIG,
+    _AccessTokenRejections,
+    _ConfigState,
+    _UnknownKeyIdException,
+    _VerifiedAccessToken,
+    _config_state,
+    _parse_config,
+    _soft_refresh_interval_seconds,
+    _verify_access_token,
+)
+from ._cache import CacheStats, _LRUCache, _StripedLRUCache
+from ._circuit_breaker import CircuitBreaker, CircuitOpenError
+from ._observer import AuthObserver, _stage_timer
+
+_logger = logging.getLogger(__name__)
+
+
+class SyncAccessTokenAuthenticator:
+    """
+    Verifies Tesseral access tokens against the JWKS of a project, without an
+    event loop, e.g. from WSGI apps, thread pools, and batch jobs.
+
+    It shares its config parsing and verification with
+    AsyncAccessTokenAuthenticator, and takes the same arguments, except those
+    that only make sense on an event loop.
+
+    One instance can be shared by any number of threads, including on
+    free-threaded builds of Python. Verification reads the config from an
+    immutable snapshot, and takes no locks; cache lookups only lock one of
+    several stripes of the cache. When the JWKS is due for a refresh, one thread
+    fetches it in the background while the current keys keep being served.
+    Once the keys expire, threads that need them wait for a single fetch,
+    rather than each sending their own request to the config API.
+
+    Rejected tokens are counted and remembered as in
+    AsyncAccessTokenAuthenticator; see access_token_rejection_stats.
+
+    Raises InvalidAccessTokenException for tokens that are not valid.
+    """
+
+    _publishable_key: str
+    _config_api_hostname: str
+    _jwks_refresh_interval_seconds: int
+    _jwks_soft_refresh_interval_seconds: float
+    _jwks_max_staleness_seconds: int
+    _jwks_unknown_kid_refresh_interval_seconds: Optional[int]
+    _http_client: Client
+    # Replaced, never modified, so that it can be read without locks.
+    _config: _ConfigState
+    _jwks_next_unknown_kid_refresh_unix_seconds: float
+    _unknown_kids: _LRUCache[str, bool]
+    _unknown_kids_lock: threading.Lock
+    _access_token_cache: Optional[_StripedLRUCache[bytes, _VerifiedAccessToken]]
+    _rejections: _AccessTokenRejections
+    _observer: Optional[AuthObserver]
+    # Held for the duration of each config fetch.
+    _refresh_lock: threading.Lock
+    # Incremented as each config fetch finishes, so that threads that waited
+    # on a fetch can tell that it happened, and share its outcome.
+    _refresh_generation: int
+    _refresh_error: Optional[Exception]
+    _config_api_timeout_seconds: Optional[float]
+    _circuit_breaker: CircuitBreaker
+
+    def __init__(
+        self,
+        *,
+        publishable_key: str,
+        config_api_hostname: str = "config.tesseral.com",
+        jwks_refresh_interval_seconds: int = 3600,
+        jwks_soft_refresh_interval_seconds: Optional[int] = None,
+        jwks_max_staleness_seconds: int = 3600,
+        jwks_unknown_kid_refresh_interval_seconds: Optional[int] = 60,
+        http_client: Optional[Client] = None,
+        access_token_cache_size: int = 0,
+        rejected_access_token_cache_size: int = 1024,
+        observer: Optional[AuthObserver] = None,
+        config_api_timeout_seconds: Optional[float] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        self._publishable_key = publishable_key
+        self._config_api_hostname = config_api_hostname
+        self._jwks_refresh_interval_seconds = jwks_refresh_interval_seconds
+        self._jwks_soft_refresh_interval_seconds = _soft_refresh_interval_seconds(
+            jwks_refresh_interval_seconds, jwks_soft_refresh_interval_seconds
+        )
+        self._jwks_max_staleness_seconds = jwks_max_staleness_seconds
+        self._jwks_unknown_kid_refresh_interval_seconds = (
+            jwks_unknown_kid_refresh_interval_seconds
+        )
+        self._http_client = http_client or Client()
+        self._config = _NO_CONFIG
+        self._jwks_next_unknown_kid_refresh_unix_seconds = 0
+        self._unknown_kids = _LRUCache(_UNKNOWN_KID_CACHE_SIZE)
+        self._unknown_kids_lock = threading.Lock()
+        self._access_token_cache = (
+            _StripedLRUCache(access_token_cache_size)
+            if access_token_cache_size > 0
+            else None
+        )
+        self._rejections = _AccessTokenRejections(rejected_access_token_cache_size)
+        self._observer = observer
+        self._refresh_lock = threading.Lock()
+        self._refresh_generation = 0
+        self._refresh_error = None
+        self._config_api_timeout_seconds = config_api_timeout_seconds
+        self._circuit_breaker = circuit_breaker or CircuitBreaker()
+
+    def project_id(self) -> str:
+        self._update_config()
+        return self._config.project_id
+
+    def authenticate_access_token(
+        self, *, access_token: str, now_unix_seconds: Optional[float] = None
+    ) -> AccessTokenClaims:
+        verified = self.verify_access_token(
+            access_token=access_token, now_unix_seconds=now_unix_seconds
+        )
+        return verified.claims()
+
+    def verify_access_token(
+        self, *, access_token: str, now_unix_seconds: Optional[float] = None
+    ) -> _VerifiedAccessToken:
+        """
+        Like authenticate_access_token, but only validates the claims needed to
+        check the token's validity period. The rest are validated on first call
+        to claims() on the result.
+        """
+        self._update_config()
+        if now_unix_seconds is None:
+            now_unix_seconds = time.time()
+
+        cache_key = None
+        if self._access_token_cache is not None or self._rejections.cache_enabled:
+            cache_key = hashlib.sha256(access_token.encode()).digest()
+
+        if self._access_token_cache is not None:
+            assert cache_key is not None  # appease mypy
+            cached = self._access_token_cache.get(cache_key, now_unix_seconds)
+            hit = cached is not None and now_unix_seconds >= cached.nbf
+            if self._observer is not None:
+                self._observer.on_cache_lookup("access_token", hit)
+            if hit:
+                assert cached is not None  # appease mypy
+                return cached
+
+        if cache_key is not None:
+            rejection = self._rejections.check(
+                cache_key, now_unix_seconds, self._observer
+            )
+            if rejection is not None:
+                raise rejection
+
+        try:
+            verified = self._verify_access_token(access_token, now_unix_seconds)
+        except InvalidAccessTokenException as e:
+            self._rejections.record(cache_key, e, now_unix_seconds)
+            raise
+        if self._access_token_cache is not None:
+            assert cache_key is not None  # appease mypy
+            self._access_token_cache.put(cache_key, verified, verified.exp)
+        return verified
+
+    def _verify_access_token(
+        self, access_token: str, now_unix_seconds: float
+    ) -> _VerifiedAccessToken:
+        config = self._config
+        try:
+            return _verify_access_token(
+                jwks=config.jwks,
+                access_token=access_token,
+                now_unix_seconds=now_unix_seconds,
+                observer=self._observer,
+            )
+        except _UnknownKeyIdException as e:
+            # The token may be signed by a key that was rotated in after our
+            # last refresh.
+            if not self._refresh_config_for_unknown_kid(e.kid, config):
+                raise
+
+        return _verify_access_token(
+            jwks=self._config.jwks,
+            access_token=access_token,
+            now_unix_seconds=now_unix_seconds,
+            observer=self._observer,
+        )
+
+    def _refresh_config_for_unknown_kid(self, kid: str, config: _ConfigState) -> bool:
+        """
+        Refreshes config, which kid was not found in, in the hope of learning
+        about kid. Returns whether a refresh happened. Rate-limited as in
+        AsyncAccessTokenAuthenticator.
+        """
+        if self._jwks_unknown_kid_refresh_interval_seconds is None:
+            return False
+
+        now = time.time()
+        with self._unknown_kids_lock:
+            if self._unknown_kids.get(kid, now) is not None:
+                return False
+
+            # Piggyback on a refresh that is already in flight, if any, even if
+            # we are otherwise rate-limited.
+            if not self._refresh_lock.locked():
+                if now < self._jwks_next_unknown_kid_refresh_unix_seconds:
+                    self._unknown_kids.put(
+                        kid, True, self._jwks_next_unknown_kid_refresh_unix_seconds
+                    )
+                    return False
+
+                self._jwks_next_unknown_kid_refresh_unix_seconds = (
+                    now + self._jwks_unknown_kid_refresh_interval_seconds
+                )
+
+        if self._observer is not None:
+            self._observer.on_event("jwks_unknown_kid_refresh")
+        try:
+            self._refresh_config(config)
+        except Exception:
+            return False
+
+        if kid not in self._config.jwks:
+            with self._unknown_kids_lock:
+                self._unknown_kids.put(
+                    kid, True, now + self._jwks_unknown_kid_refresh_interval_seconds
+                )
+        return True
+
+    def access_token_cache_stats(self) -> CacheStats:
+        """
+        Returns hit, miss, and eviction counters for the verified access token
+        cache. All counters are zero if the cache is disabled.
+        """
+        if self._access_token_cache is None:
+            return CacheStats(hits=0, misses=0, evictions=0, size=0)
+        return self._access_token_cache.stats()
+
+    def access_token_rejection_stats(self) -> Dict[str, int]:
+        """
+        Returns how many access tokens were rejected at each stage of
+        verification, as in AsyncAccessTokenAuthenticator.
+        """
+        return self._rejections.stats()
+
+    def rejected_access_token_cache_stats(self) -> CacheStats:
+        """
+        Returns hit, miss, and eviction counters for the rejected access token
+        cache. All counters are zero if the cache is disabled.
+        """
+        return self._rejections.cache_stats()
+
+    def prewarm(self) -> None:
+        """
+        Loads the config, so that the first verification does not wait on it.
+
+        Raises:
+            Exception: If no config could be loaded.
+        """
+        self._update_config()
+
+    def _update_config(self) -> None:
+        config = self._config
+        now = time.time()
+        if now < config.soft_refresh_unix_seconds:
+            return
+
+        if now < config.next_refresh_unix_seconds:
+            # The keys are due for a refresh but still fresh; keep serving them
+            # while the refresh happens in the background.
+            self._start_background_refresh()
+            return
+
+        try:
+            self._refresh_config(config)
+        except Exception:
+            # Keep serving the keys we have if the config API is unavailable,
+            # but only for so long.
+            config = self._config
+            if config.project_id and time.time() < config.stale_unix_seconds:
+                if self._observer is not None:
+                    self._observer.on_event("jwks_stale_served")
+                return
+            raise
+
+    def _refresh_config(self, config: Optional[_ConfigState] = None) -> None:
+        """
+        Fetches the config, unless another thread already replaced config, the
+        one the caller found wanting, since the caller read it.
+        """
+        generation = self._refresh_generation
+        with self._refresh_lock:
+            if self._refresh_generation != generation:
+                # Another thread fetched the config while we waited for the
+                # lock; share its outcome rather than fetching it again.
+                if self._refresh_error is not None:
+                    raise self._refresh_error
+                return
+            if config is not None and self._config is not config:
+                # Another thread fetched the config after we read it, but
+                # before we read the generation.
+                return
+            self._fetch_config()
+
+    def _start_background_refresh(self) -> None:
+        # However short the soft refresh interval, refresh at most so often,
+        # rather than on every verification.
+        if (
+            time.time()
+            < self._config.fetched_unix_seconds + _MIN_BACKGROUND_REFRESH_SECONDS
+        ):
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # a fetch is already in flight
+
+        # The lock is handed over to the thread, which releases it when done.
+        try:
+            threading.Thread(
+                target=self._background_refresh,
+                name="tesseral-config-refresh",
+                daemon=True,
+            ).start()
+        except BaseException:
+            self._refresh_lock.release()
+            raise
+
+    def _background_refresh(self) -> None:
+        try:
+            if time.time() >= self._config.soft_refresh_unix_seconds:
+                self._fetch_config()
+        except Exception:
+            pass  # logged by _fetch_config
+        finally:
+            self._refresh_lock.release()
+
+    def _fetch_config(self) -> None:
+        # Must be called with _refresh_lock held.
+        try:
+            config = _parse_config(self._fetch_config_json())
+        except Exception as e:
+            self._refresh_error = e
+            self._refresh_generation += 1
+            if not isinstance(e, CircuitOpenError):
+                _logger.warning("Failed to refresh Tesseral config", exc_info=True)
+            if self._observer is not None:
+                self._observer.on_event("jwks_refresh_failed")
+            raise
+
+        self._config = _config_state(
+            config,
+            time.time(),
+            self._jwks_refresh_interval_seconds,
+            self._jwks_soft_refresh_interval_seconds,
+            self._jwks_max_staleness_seconds,
+        )
+        self._refresh_error = None
+        self._refresh_generation += 1
+        if self._access_token_cache is not None:
+            self._access_token_cache.discard_where(
+                lambda verified: verified.kid not in config.jwks
+            )
+        with self._unknown_kids_lock:
+            for kid in config.jwks:
+                self._unknown_kids.discard(kid)
+        if self._observer is not None:
+            self._observer.on_event("jwks_refresh")
+
+    def _fetch_config_json(self) -> str:
+        try:
+            self._circuit_breaker.before_call()
+        except CircuitOpenError:
+            if self._observer is not None:
+                self._observer.on_event("config_api_circuit_open")
+            raise
+
+        timer = _stage_timer(self._observer)
+        try:
+            response = self._http_client.get(
+                f"https://{self._config_api_hostname}/v1/config/{self._publishable_key}",
+                timeout=(
+                    USE_CLIENT_DEFAULT
+                    if self._config_api_timeout_seconds is None
+                    else self._config_api_timeout_seconds
+                ),
+            )
+            if timer is not None:
+                timer.lap("config_fetch")
+            response.raise_for_status()
+        except Exception:
+            self._circuit_breaker.record_failure()
+            raise
+        self._circuit_breaker.record_success()
+        return response.text
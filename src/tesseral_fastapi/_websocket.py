@@ -0,0 +1,116 @@
+import asyncio
+import time
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl
+
+from starlette.types import Message, Scope, Send
+
+# The close code for connections that fail to authenticate, or whose access
+# token expires: 1008 is "policy violation".
+_POLICY_VIOLATION = 1008
+
+
+def _websocket_credential(
+    scope: Scope, subprotocol_prefix: Optional[str], query_param: Optional[str]
+) -> Tuple[Scope, str]:
+    """
+    Returns the credential a WebSocket handshake carries in a subprotocol or a
+    query parameter, or "" if it carries none, and the scope to pass on.
+
+    Browsers cannot set headers on WebSocket handshakes, so clients there pass
+    credentials this way instead. The subprotocol carrying a credential is
+    removed from the scope, so that the app cannot accept it by mistake and
+    echo the credential back.
+    """
+    if subprotocol_prefix is not None:
+        subprotocols = scope.get("subprotocols", [])
+        for i, subprotocol in enumerate(subprotocols):
+            if subprotocol.startswith(subprotocol_prefix):
+                scope = {
+                    **scope,
+                    "subprotocols": [*subprotocols[:i], *subprotocols[i + 1 :]],
+                }
+                return scope, subprotocol[len(subprotocol_prefix) :]
+
+    if query_param is not None:
+        for name, value in parse_qsl(scope["query_string"].decode("latin-1")):
+            if name == query_param:
+                return scope, value
+
+    return scope, ""
+
+
+def _with_accepted_subprotocol(send: Send, subprotocol: str) -> Send:
+    """
+    Returns send, changed so that the app accepting the WebSocket handshake
+    without a subprotocol accepts it with subprotocol instead.
+
+    Browsers fail handshakes that offered subprotocols if the response selects
+    none of them. When a client offers only the subprotocol carrying its
+    credential, which the app never sees, it is selected on the app's behalf.
+    This echoes the credential back, but only to the client that sent it.
+    """
+
+    async def wrapped_send(message: Message) -> None:
+        if message["type"] == "websocket.accept" and not message.get("subprotocol"):
+            message = {**message, "subprotocol": subprotocol}
+        await send(message)
+
+    return wrapped_send
+
+
+class _WebSocketExpiry:
+    """
+    Closes a WebSocket connection when the access token it was authenticated
+    with expires.
+
+    The close is scheduled once, at the handshake, so messages on the
+    connection cost nothing extra to authenticate. Once the connection is
+    closed, the app learns of it from the websocket.disconnect message its
+    next receive returns, and anything it sends in the meantime is dropped.
+    """
+
+    _send: Send
+    _closed: bool
+    _timer: asyncio.TimerHandle
+    _close: Optional["asyncio.Task[None]"]
+
+    def __init__(self, send: Send, exp_unix_seconds: float):
+        loop = asyncio.get_running_loop()
+        self._send = send
+        self._closed = False
+        self._close = None
+        delay = max(0.0, exp_unix_seconds - time.time())
+        self._timer = loop.call_at(loop.time() + delay, self._expire)
+
+    async def send(self, message: Message) -> None:
+        if self._closed:
+            return
+        if message["type"] == "websocket.close":
+            self._closed = True
+            self._timer.cancel()
+        await self._send(message)
+
+    async def stop(self) -> None:
+        """Cancels the scheduled close, or waits for it if it has started."""
+        self._timer.cancel()
+        if self._close is not None:
+            await self._close
+
+    def _expire(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._close = asyncio.ensure_future(self._send_close())
+
+    async def _send_close(self) -> None:
+        try:
+            await self._send(
+                {
+                    "type": "websocket.close",
+                    "code": _POLICY_VIOLATION,
+                    "reason": "Access token expired",
+                }
+            )
+        except Exception:
+            pass  # the client is already gone
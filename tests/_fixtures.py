@@ -0,0 +1,201 @@
+import asyncio
+import base64
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from cryptography.hazmat.primitives.asymmetric.ec import (
+    ECDSA,
+    SECP256R1,
+    EllipticCurvePrivateKey,
+    generate_private_key,
+)
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+from cryptography.hazmat.primitives.hashes import SHA256
+from httpx import AsyncClient, Client, MockTransport, Request, Response
+from tesseral import AsyncTesseral
+
+PROJECT_ID = "project_54vwf0clhh0caqe20eujxgpeq"
+PUBLISHABLE_KEY = "publishable_key_en43cawcravxk7t2murwiz192"
+
+
+class SigningKey:
+    """A locally generated P-256 key that can sign Tesseral-style access tokens."""
+
+    kid: str
+    private_key: EllipticCurvePrivateKey
+
+    def __init__(self, kid: str):
+        self.kid = kid
+        self.private_key = generate_private_key(SECP256R1())
+
+    def json_web_key(self) -> Dict[str, str]:
+        public_numbers = self.private_key.public_key().public_numbers()
+        return {
+            "kid": self.kid,
+            "kty": "EC",
+            "crv": "P-256",
+            "x": _base64_url_encode(public_numbers.x.to_bytes(32, byteorder="big")),
+            "y": _base64_url_encode(public_numbers.y.to_bytes(32, byteorder="big")),
+        }
+
+    def access_token(
+        self,
+        *,
+        now_unix_seconds: Optional[float] = None,
+        ttl_seconds: int = 300,
+        actions: Optional[List[str]] = None,
+        **extra_claims: Any,
+    ) -> str:
+        if now_unix_seconds is None:
+            now_unix_seconds = time.time()
+
+        header = {"kid": self.kid, "alg": "ES256"}
+        claims: Dict[str, Any] = {
+            "iss": f"https://{PROJECT_ID.replace('_', '-')}.tesseral.app",
+            "sub": "user_97urqoip5q7kef87wpotvzzxz",
+            "aud": f"https://{PROJECT_ID.replace('_', '-')}.tesseral.app",
+            "exp": int(now_unix_seconds) + ttl_seconds,
+            "nbf": int(now_unix_seconds),
+            "iat": int(now_unix_seconds),
+            "organization": {
+                "id": "org_7908mz2ul9usdhy0gdd3tiean",
+                "displayName": "Test Organization",
+            },
+            "user": {
+                "id": "user_97urqoip5q7kef87wpotvzzxz",
+                "email": "root@app.tesseral.example.com",
+            },
+            "session": {"id": "session_03di0nkjlmr6hwqd4z0899o2r"},
+        }
+        if actions is not None:
+            claims["actions"] = actions
+        claims.update(extra_claims)
+
+        signing_input = (
+            _base64_url_encode(json.dumps(header).encode())
+            + "."
+            + _base64_url_encode(json.dumps(claims).encode())
+        )
+        r, s = decode_dss_signature(
+            self.private_key.sign(signing_input.encode(), ECDSA(SHA256()))
+        )
+        signature = r.to_bytes(32, byteorder="big") + s.to_bytes(32, byteorder="big")
+        return signing_input + "." + _base64_url_encode(signature)
+
+
+def config_json(*keys: SigningKey, project_id: str = PROJECT_ID) -> str:
+    return json.dumps(
+        {
+            "projectId": project_id,
+            "vaultDomain": "auth.console.tesseral.example.com",
+            "keys": [key.json_web_key() for key in keys],
+        }
+    )
+
+
+class ConfigAPIStub:
+    """
+    An in-process stand-in for the Tesseral config API.
+
+    Tests can swap keys, add latency, or make it fail, and inspect how many
+    requests it received.
+    """
+
+    keys: List[SigningKey]
+    project_id: str
+    status_code: int
+    latency_seconds: float
+    requests: int
+
+    def __init__(self, *keys: SigningKey, project_id: str = PROJECT_ID):
+        self.keys = list(keys)
+        self.project_id = project_id
+        self.status_code = 200
+        self.latency_seconds = 0
+        self.requests = 0
+
+    def http_client(self) -> AsyncClient:
+        return AsyncClient(transport=MockTransport(self.handler))
+
+    def sync_http_client(self) -> Client:
+        return Client(transport=MockTransport(self.sync_handler))
+
+    async def handler(self, request: Request) -> Response:
+        assert request.url.path.startswith("/v1/config/")
+        self.requests += 1
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._response()
+
+    def sync_handler(self, request: Request) -> Response:
+        assert request.url.path.startswith("/v1/config/")
+        self.requests += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._response()
+
+    def _response(self) -> Response:
+        if self.status_code != 200:
+            return Response(self.status_code, text="unavailable")
+        return Response(200, text=config_json(*self.keys, project_id=self.project_id))
+
+
+def multi_project_http_client(config_apis: Dict[str, ConfigAPIStub]) -> AsyncClient:
+    """
+    Returns a client that routes config API requests to a stub per
+    publishable key.
+    """
+
+    async def handler(request: Request) -> Response:
+        publishable_key = request.url.path.rsplit("/", 1)[1]
+        return await config_apis[publishable_key].handler(request)
+
+    return AsyncClient(transport=MockTransport(handler))
+
+
+class BackendAPIStub:
+    """
+    An in-process stand-in for the Tesseral backend API's API key
+    authentication endpoint.
+    """
+
+    api_keys: Dict[str, Dict[str, Any]]
+    status_code: Optional[int]
+    latency_seconds: float
+    requests: int
+
+    def __init__(self, api_keys: Dict[str, Dict[str, Any]]):
+        self.api_keys = api_keys
+        self.status_code = None
+        self.latency_seconds = 0
+        self.requests = 0
+
+    def tesseral_client(self) -> AsyncTesseral:
+        return AsyncTesseral(
+            backend_api_key="test_backend_api_key",
+            httpx_client=AsyncClient(transport=MockTransport(self.handler)),
+        )
+
+    async def handler(self, request: Request) -> Response:
+        assert request.url.path == "/v1/api-keys/authenticate"
+        self.requests += 1
+        # The API key is looked up before the latency, as if the response were
+        # slow to arrive, so tests can revoke it while the response is on its way.
+        response = self.response(request)
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return response
+
+    def response(self, request: Request) -> Response:
+        if self.status_code is not None:
+            return Response(self.status_code, json={"message": "unavailable"})
+
+        secret_token = json.loads(request.content)["secretToken"]
+        if secret_token not in self.api_keys:
+            return Response(400, json={"message": "unauthenticated_api_key"})
+        return Response(200, json=self.api_keys[secret_token])
+
+
+def _base64_url_encode(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).rstrip(b"=").decode()
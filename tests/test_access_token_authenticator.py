@@ -1,14 +1,41 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
 import pytest
+from httpx import HTTPStatusError
 from tesseral import AccessTokenClaims
 from tesseral.core import parse_obj_as
 
+from tesseral_fastapi import InMemoryAuthObserver
 from tesseral_fastapi._access_token_authenticator import (
+    AsyncAccessTokenAuthenticator,
+    _ExpiredAccessTokenException,
+    _verify_access_token,
     _parse_config,
     _authenticate_access_token,
     InvalidAccessTokenException,
 )
+from tesseral_fastapi._config_file import (
+    _ConfigSnapshot,
+    _config_file_path,
+    _read_config_snapshot,
+    _try_lock_config_file,
+    _unlock_config_file,
+    _write_config_snapshot,
+)
+from tests._fixtures import (
+    PROJECT_ID,
+    PUBLISHABLE_KEY,
+    ConfigAPIStub,
+    SigningKey,
+    config_json,
+)
 
 access_token_test_cases = [
     {
@@ -145,5 +172,715 @@ class TestAccessTokenAuthenticator(unittest.TestCase):
                     )
 
 
+class TestAsyncAccessTokenAuthenticator(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.signing_key = SigningKey("session_signing_key_1")
+        self.config_api = ConfigAPIStub(self.signing_key)
+
+    def authenticator(self, **kwargs) -> AsyncAccessTokenAuthenticator:
+        return AsyncAccessTokenAuthenticator(
+            publishable_key=PUBLISHABLE_KEY,
+            http_client=self.config_api.http_client(),
+            **kwargs,
+        )
+
+    async def test_access_token_cache_disabled_by_default(self):
+        authenticator = self.authenticator()
+        access_token = self.signing_key.access_token()
+        await authenticator.authenticate_access_token(access_token=access_token)
+        await authenticator.authenticate_access_token(access_token=access_token)
+
+        stats = authenticator.access_token_cache_stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (0, 0, 0))
+
+    async def test_access_token_cache_hit(self):
+        authenticator = self.authenticator(access_token_cache_size=10)
+        access_token = self.signing_key.access_token()
+        first = await authenticator.authenticate_access_token(access_token=access_token)
+        second = await authenticator.authenticate_access_token(
+            access_token=access_token
+        )
+
+        self.assertEqual(first, second)
+        stats = authenticator.access_token_cache_stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 1, 1))
+
+    async def test_access_token_cache_respects_exp(self):
+        authenticator = self.authenticator(access_token_cache_size=10)
+        access_token = self.signing_key.access_token(
+            now_unix_seconds=1000, ttl_seconds=300
+        )
+        await authenticator.authenticate_access_token(
+            access_token=access_token, now_unix_seconds=1100
+        )
+
+        with pytest.raises(InvalidAccessTokenException):
+            await authenticator.authenticate_access_token(
+                access_token=access_token, now_unix_seconds=1301
+            )
+        with pytest.raises(InvalidAccessTokenException):
+            await authenticator.authenticate_access_token(
+                access_token=access_token, now_unix_seconds=999
+            )
+
+    async def test_access_token_cache_lru_eviction(self):
+        authenticator = self.authenticator(access_token_cache_size=2)
+        for i in range(3):
+            await authenticator.authenticate_access_token(
+                access_token=self.signing_key.access_token(now_unix_seconds=1000 + i),
+                now_unix_seconds=1100,
+            )
+
+        stats = authenticator.access_token_cache_stats()
+        self.assertEqual((stats.evictions, stats.size), (1, 2))
+
+    async def test_access_token_cache_drops_removed_kid(self):
+        authenticator = self.authenticator(access_token_cache_size=10)
+        access_token = self.signing_key.access_token()
+        await authenticator.authenticate_access_token(access_token=access_token)
+
+        # rotate the key out of the JWKS and force a refresh
+        self.config_api.keys = [SigningKey("session_signing_key_2")]
+        _expire_config(authenticator)
+
+        with pytest.raises(InvalidAccessTokenException):
+            await authenticator.authenticate_access_token(access_token=access_token)
+        self.assertEqual(authenticator.access_token_cache_stats().size, 0)
+
+    async def test_concurrent_config_fetches_are_coalesced(self):
+        self.config_api.latency_seconds = 0.05
+        authenticator = self.authenticator()
+        access_tokens = [self.signing_key.access_token() for _ in range(50)]
+
+        await asyncio.gather(
+            *(
+                authenticator.authenticate_access_token(access_token=access_token)
+                for access_token in access_tokens
+            )
+        )
+        self.assertEqual(self.config_api.requests, 1)
+
+    async def test_concurrent_config_fetch_failure(self):
+        self.config_api.latency_seconds = 0.05
+        self.config_api.status_code = 503
+        authenticator = self.authenticator()
+        access_token = self.signing_key.access_token()
+
+        results = await asyncio.gather(
+            *(
+                authenticator.authenticate_access_token(access_token=access_token)
+                for _ in range(10)
+            ),
+            return_exceptions=True,
+        )
+        self.assertTrue(all(isinstance(result, Exception) for result in results))
+        self.assertEqual(self.config_api.requests, 1)
+
+        # the next caller after a failure tries again
+        self.config_api.status_code = 200
+        await authenticator.authenticate_access_token(access_token=access_token)
+        self.assertEqual(self.config_api.requests, 2)
+
+    async def test_soft_expired_config_is_refreshed_in_background(self):
+        authenticator = self.authenticator()
+        access_token = self.signing_key.access_token()
+        await authenticator.authenticate_access_token(access_token=access_token)
+
+        # past the soft TTL, the current keys are served without waiting on the
+        # (slow) config API
+        self.config_api.latency_seconds = 10
+        authenticator._config = authenticator._config.replace(
+            soft_refresh_unix_seconds=0
+        )
+        await asyncio.wait_for(
+            authenticator.authenticate_access_token(access_token=access_token),
+            timeout=1,
+        )
+        await asyncio.sleep(0)
+        self.assertEqual(self.config_api.requests, 2)
+
+    async def test_stale_config_is_served_while_config_api_is_down(self):
+        authenticator = self.authenticator(jwks_max_staleness_seconds=600)
+        access_token = self.signing_key.access_token()
+        await authenticator.authenticate_access_token(access_token=access_token)
+
+        self.config_api.status_code = 503
+        _expire_config(authenticator)
+        authenticator._config = authenticator._config.replace(
+            stale_unix_seconds=time.time() + 60
+        )
+        await authenticator.authenticate_access_token(access_token=access_token)
+
+        # past the max staleness, config API errors surface again
+        authenticator._config = authenticator._config.replace(stale_unix_seconds=0)
+        with pytest.raises(HTTPStatusError):
+            await authenticator.authenticate_access_token(access_token=access_token)
+
+    async def test_background_refresh(self):
+        authenticator = self.authenticator()
+        await authenticator.start_background_refresh()
+        for _ in range(100):
+            if self.config_api.requests:
+                break
+            await asyncio.sleep(0.01)
+        await authenticator.stop_background_refresh()
+
+        self.assertEqual(self.config_api.requests, 1)
+        self.assertEqual(await authenticator.project_id(), PROJECT_ID)
+        self.assertEqual(self.config_api.requests, 1)
+
+    async def test_refresh_intervals_must_be_positive(self):
+        for kwargs in [
+            {"jwks_refresh_interval_seconds": 0},
+            {"jwks_soft_refresh_interval_seconds": 0},
+            {"jwks_refresh_interval_seconds": -1},
+        ]:
+            with pytest.raises(RuntimeError):
+                self.authenticator(**kwargs)
+
+    async def test_background_refresh_does_not_spin(self):
+        authenticator = self.authenticator(jwks_refresh_interval_seconds=0.001)
+        await authenticator.start_background_refresh()
+        await asyncio.sleep(0.3)
+        await authenticator.stop_background_refresh()
+
+        self.assertEqual(self.config_api.requests, 1)
+
+    async def test_unknown_kid_triggers_refresh(self):
+        authenticator = self.authenticator()
+        await authenticator.authenticate_access_token(
+            access_token=self.signing_key.access_token()
+        )
+
+        # a new key is rotated in before our next scheduled refresh
+        new_signing_key = SigningKey("session_signing_key_2")
+        self.config_api.keys.append(new_signing_key)
+        await authenticator.authenticate_access_token(
+            access_token=new_signing_key.access_token()
+        )
+        self.assertEqual(self.config_api.requests, 2)
+
+    async def test_unknown_kid_refresh_is_rate_limited(self):
+        authenticator = self.authenticator(jwks_unknown_kid_refresh_interval_seconds=60)
+        await authenticator.project_id()
+
+        for i in range(10):
+            with pytest.raises(InvalidAccessTokenException):
+                await authenticator.authenticate_access_token(
+                    access_token=SigningKey(f"bogus_{i % 2}").access_token()
+                )
+        self.assertEqual(self.config_api.requests, 2)
+
+        # once the cooldown is over, refreshes are allowed again
+        authenticator._jwks_next_unknown_kid_refresh_unix_seconds = 0
+        authenticator._unknown_kids.clear()
+        with pytest.raises(InvalidAccessTokenException):
+            await authenticator.authenticate_access_token(
+                access_token=SigningKey("bogus_0").access_token()
+            )
+        self.assertEqual(self.config_api.requests, 3)
+
+    async def test_concurrent_unknown_kids_share_one_refresh(self):
+        authenticator = self.authenticator()
+        await authenticator.project_id()
+
+        new_signing_key = SigningKey("session_signing_key_2")
+        self.config_api.keys.append(new_signing_key)
+        self.config_api.latency_seconds = 0.05
+        await asyncio.gather(
+            *(
+                authenticator.authenticate_access_token(
+                    access_token=new_signing_key.access_token()
+                )
+                for _ in range(10)
+            )
+        )
+        self.assertEqual(self.config_api.requests, 2)
+
+    async def test_unknown_kid_refresh_disabled(self):
+        authenticator = self.authenticator(
+            jwks_unknown_kid_refresh_interval_seconds=None
+        )
+        await authenticator.project_id()
+
+        with pytest.raises(InvalidAccessTokenException):
+            await authenticator.authenticate_access_token(
+                access_token=SigningKey("bogus").access_token()
+            )
+        self.assertEqual(self.config_api.requests, 1)
+
+    async def test_verification_executor(self):
+        verification_threads = set()
+
+        class RecordingExecutor(ThreadPoolExecutor):
+            def submit(self, fn, /, *args, **kwargs):
+                def record():
+                    verification_threads.add(threading.get_ident())
+                    return fn(*args, **kwargs)
+
+                return super().submit(record)
+
+        with RecordingExecutor(max_workers=2) as executor:
+            authenticator = self.authenticator(
+                verification_executor=executor, verification_max_pending=4
+            )
+            results = await asyncio.gather(
+                *(
+                    authenticator.authenticate_access_token(
+                        access_token=self.signing_key.access_token()
+                    )
+                    for _ in range(10)
+                )
+            )
+            self.assertEqual(len(results), 10)
+
+            with pytest.raises(InvalidAccessTokenException):
+                await authenticator.authenticate_access_token(
+                    access_token=SigningKey("session_signing_key_1").access_token()
+                )
+
+        self.assertTrue(verification_threads)
+        self.assertNotIn(threading.get_ident(), verification_threads)
+
+    async def test_verify_access_token_defers_claims_validation(self):
+        authenticator = self.authenticator()
+        verified = await authenticator.verify_access_token(
+            access_token=self.signing_key.access_token(
+                now_unix_seconds=1000, ttl_seconds=300, actions=["a.b.c"]
+            ),
+            now_unix_seconds=1100,
+        )
+
+        self.assertEqual((verified.nbf, verified.exp), (1000, 1300))
+        self.assertEqual(verified.raw_claims["actions"], ["a.b.c"])
+        self.assertIsNone(verified._claims)
+        claims = verified.claims()
+        self.assertEqual(claims.actions, ["a.b.c"])
+        self.assertIs(verified.claims(), claims)
+
+    async def test_verify_access_token_rejects_invalid_exp_and_nbf(self):
+        authenticator = self.authenticator()
+        for claims in [{"exp": "never"}, {"nbf": None}, {"exp": True}]:
+            with pytest.raises(InvalidAccessTokenException):
+                await authenticator.verify_access_token(
+                    access_token=self.signing_key.access_token(**claims)
+                )
+
+    async def test_authenticate_access_tokens(self):
+        authenticator = self.authenticator()
+        valid = self.signing_key.access_token()
+        other_valid = self.signing_key.access_token(ttl_seconds=600)
+        expired = self.signing_key.access_token(now_unix_seconds=1000)
+        forged = SigningKey("session_signing_key_1").access_token()
+        access_tokens = [valid, expired, "not.a.token", valid, forged, other_valid]
+
+        results = await authenticator.authenticate_access_tokens(access_tokens)
+
+        self.assertEqual(len(results), len(access_tokens))
+        for access_token, result in zip(access_tokens, results):
+            if access_token in (valid, other_valid):
+                self.assertEqual(
+                    result,
+                    await authenticator.authenticate_access_token(
+                        access_token=access_token
+                    ),
+                )
+            else:
+                self.assertIsInstance(result, InvalidAccessTokenException)
+        self.assertIs(results[0], results[3])
+        self.assertEqual(self.config_api.requests, 1)
+
+    async def test_authenticate_access_tokens_non_ascii(self):
+        authenticator = self.authenticator(access_token_cache_size=10)
+        valid = self.signing_key.access_token()
+        header, claims, _ = valid.split(".")
+        access_tokens = ["é.a.b", f"{header}.{claims}.é", f"{header}.é.b", valid]
+
+        results = await authenticator.authenticate_access_tokens(access_tokens)
+
+        for result in results[:3]:
+            self.assertIsInstance(result, InvalidAccessTokenException)
+        self.assertIsInstance(results[3], AccessTokenClaims)
+        self.assertEqual(
+            authenticator.access_token_rejection_stats().get("malformed"), 3
+        )
+        for access_token in access_tokens[:3]:
+            with pytest.raises(InvalidAccessTokenException):
+                await authenticator.authenticate_access_token(access_token=access_token)
+        self.assertEqual(authenticator.rejected_access_token_cache_stats().hits, 3)
+
+    async def test_malformed_claims(self):
+        authenticator = self.authenticator()
+        # signed by a valid key, but with claims that do not validate
+        access_token = self.signing_key.access_token(organization="org_123")
+        verified = await authenticator.verify_access_token(access_token=access_token)
+        with pytest.raises(InvalidAccessTokenException):
+            verified.claims()
+        with pytest.raises(InvalidAccessTokenException):
+            await authenticator.authenticate_access_token(access_token=access_token)
+
+        results = await authenticator.authenticate_access_tokens([access_token])
+        self.assertIsInstance(results[0], InvalidAccessTokenException)
+
+    async def test_authenticate_access_tokens_empty(self):
+        authenticator = self.authenticator()
+        self.assertEqual(await authenticator.authenticate_access_tokens([]), [])
+
+    async def test_authenticate_access_tokens_config_api_down(self):
+        self.config_api.status_code = 500
+        authenticator = self.authenticator()
+        with pytest.raises(HTTPStatusError):
+            await authenticator.authenticate_access_tokens(
+                [self.signing_key.access_token()]
+            )
+
+    async def test_authenticate_access_tokens_unknown_kid_refreshes_once(self):
+        authenticator = self.authenticator()
+        await authenticator.project_id()
+
+        new_signing_key = SigningKey("session_signing_key_2")
+        self.config_api.keys.append(new_signing_key)
+        results = await authenticator.authenticate_access_tokens(
+            [new_signing_key.access_token(ttl_seconds=300 + i) for i in range(10)]
+            + [SigningKey("bogus").access_token()]
+        )
+
+        self.assertTrue(
+            all(isinstance(result, AccessTokenClaims) for result in results[:10])
+        )
+        self.assertIsInstance(results[10], InvalidAccessTokenException)
+        self.assertEqual(self.config_api.requests, 2)
+
+    async def test_authenticate_access_tokens_cache(self):
+        authenticator = self.authenticator(access_token_cache_size=10)
+        cached = self.signing_key.access_token()
+        await authenticator.authenticate_access_token(access_token=cached)
+        uncached = self.signing_key.access_token(ttl_seconds=600)
+
+        await authenticator.authenticate_access_tokens([cached, uncached, uncached])
+
+        stats = authenticator.access_token_cache_stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 2, 2))
+
+    async def test_authenticate_access_tokens_verification_executor(self):
+        verification_threads = set()
+        submissions = 0
+
+        class RecordingExecutor(ThreadPoolExecutor):
+            def submit(self, fn, /, *args, **kwargs):
+                nonlocal submissions
+                submissions += 1
+
+                def record():
+                    verification_threads.add(threading.get_ident())
+                    return fn(*args, **kwargs)
+
+                return super().submit(record)
+
+        access_tokens = [
+            self.signing_key.access_token(ttl_seconds=300 + i) for i in range(100)
+        ]
+        with RecordingExecutor(max_workers=2) as executor:
+            authenticator = self.authenticator(
+                verification_executor=executor, verification_max_pending=1
+            )
+            results = await authenticator.authenticate_access_tokens(access_tokens)
+
+        # in order
+        self.assertEqual(
+            [result.exp - results[0].exp for result in results],
+            list(range(100)),
+        )
+        # 100 tokens are verified in two chunks
+        self.assertEqual(submissions, 2)
+        self.assertNotIn(threading.get_ident(), verification_threads)
+
+    async def test_expired_access_token_skips_signature_verification(self):
+        observer = InMemoryAuthObserver()
+        config = _parse_config(config_json(self.signing_key))
+        forged = SigningKey("session_signing_key_1")
+
+        with pytest.raises(_ExpiredAccessTokenException):
+            _verify_access_token(
+                jwks=config.jwks,
+                access_token=forged.access_token(now_unix_seconds=1000),
+                observer=observer,
+            )
+        self.assertNotIn("signature_verify", observer.histograms)
+
+    async def test_access_token_rejection_stats(self):
+        authenticator = self.authenticator(
+            jwks_unknown_kid_refresh_interval_seconds=None
+        )
+        await authenticator.project_id()
+        forged = SigningKey("session_signing_key_1")
+        for access_token in [
+            "a.b.c",
+            SigningKey("bogus").access_token(),
+            self.signing_key.access_token(now_unix_seconds=1000),
+            self.signing_key.access_token(now_unix_seconds=time.time() + 60),
+            forged.access_token(),
+            forged.access_token(ttl_seconds=600),
+        ]:
+            with pytest.raises(InvalidAccessTokenException):
+                await authenticator.authenticate_access_token(access_token=access_token)
+
+        self.assertEqual(
+            authenticator.access_token_rejection_stats(),
+            {
+                "malformed": 1,
+                "unknown_kid": 1,
+                "expired": 1,
+                "not_yet_valid": 1,
+                "signature": 2,
+            },
+        )
+
+    async def test_rejected_access_token_cache(self):
+        authenticator = self.authenticator()
+        forged = SigningKey("session_signing_key_1").access_token()
+        not_yet_valid = self.signing_key.access_token(now_unix_seconds=time.time() + 60)
+        for _ in range(3):
+            for access_token in [forged, not_yet_valid]:
+                with pytest.raises(InvalidAccessTokenException):
+                    await authenticator.authenticate_access_token(
+                        access_token=access_token
+                    )
+
+        self.assertEqual(
+            authenticator.access_token_rejection_stats(),
+            {"signature": 1, "rejected_cache": 2, "not_yet_valid": 3},
+        )
+        stats = authenticator.rejected_access_token_cache_stats()
+        self.assertEqual((stats.hits, stats.size), (2, 1))
+
+    async def test_rejected_access_token_cache_remembers_expiry(self):
+        authenticator = self.authenticator()
+        access_token = self.signing_key.access_token(
+            now_unix_seconds=1000, ttl_seconds=300
+        )
+        for now_unix_seconds in [1301, 1302]:
+            with pytest.raises(_ExpiredAccessTokenException):
+                await authenticator.authenticate_access_token(
+                    access_token=access_token, now_unix_seconds=now_unix_seconds
+                )
+        self.assertEqual(authenticator.rejected_access_token_cache_stats().hits, 1)
+
+        # the rejection does not hold before the token's exp
+        claims = await authenticator.authenticate_access_token(
+            access_token=access_token, now_unix_seconds=1100
+        )
+        self.assertEqual(claims.exp, 1300)
+
+    async def test_rejected_access_token_cache_disabled(self):
+        authenticator = self.authenticator(rejected_access_token_cache_size=0)
+        forged = SigningKey("session_signing_key_1").access_token()
+        for _ in range(2):
+            with pytest.raises(InvalidAccessTokenException):
+                await authenticator.authenticate_access_token(access_token=forged)
+
+        self.assertEqual(authenticator.access_token_rejection_stats(), {"signature": 2})
+        self.assertEqual(authenticator.rejected_access_token_cache_stats().size, 0)
+
+    async def test_authenticate_access_tokens_rejected_access_token_cache(self):
+        authenticator = self.authenticator()
+        forged = SigningKey("session_signing_key_1").access_token()
+        await authenticator.authenticate_access_tokens([forged, "a.b.c"])
+        results = await authenticator.authenticate_access_tokens([forged, "a.b.c"])
+
+        self.assertTrue(
+            all(isinstance(result, InvalidAccessTokenException) for result in results)
+        )
+        self.assertEqual(
+            authenticator.access_token_rejection_stats(),
+            {"signature": 1, "malformed": 1, "rejected_cache": 2},
+        )
+
+    async def test_shared_config(self):
+        with tempfile.TemporaryDirectory() as directory:
+            leader = self.authenticator(shared_config_directory=directory)
+            await leader.project_id()
+
+            other_config_api = ConfigAPIStub(self.signing_key)
+            follower = AsyncAccessTokenAuthenticator(
+                publishable_key=PUBLISHABLE_KEY,
+                http_client=other_config_api.http_client(),
+                shared_config_directory=directory,
+            )
+            await follower.authenticate_access_token(
+                access_token=self.signing_key.access_token()
+            )
+
+            self.assertEqual(self.config_api.requests, 1)
+            self.assertEqual(other_config_api.requests, 0)
+            self.assertEqual(
+                follower._config.soft_refresh_unix_seconds,
+                leader._config.soft_refresh_unix_seconds,
+            )
+
+    async def test_shared_config_concurrent_fetch(self):
+        self.config_api.latency_seconds = 0.1
+        with tempfile.TemporaryDirectory() as directory:
+            authenticators = [
+                self.authenticator(shared_config_directory=directory) for _ in range(5)
+            ]
+            await asyncio.gather(
+                *(authenticator.project_id() for authenticator in authenticators)
+            )
+
+        self.assertEqual(self.config_api.requests, 1)
+
+    async def test_shared_config_falls_back_to_fetch(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = _config_file_path(directory, PUBLISHABLE_KEY)
+            with open(path, "w") as f:
+                f.write("corrupt")
+
+            authenticator = self.authenticator(shared_config_directory=directory)
+            self.assertEqual(await authenticator.project_id(), PROJECT_ID)
+            self.assertEqual(self.config_api.requests, 1)
+
+            # the corrupt snapshot was replaced
+            other = self.authenticator(shared_config_directory=directory)
+            await other.project_id()
+            self.assertEqual(self.config_api.requests, 1)
+
+        authenticator = self.authenticator(shared_config_directory=directory)
+        self.assertEqual(await authenticator.project_id(), PROJECT_ID)
+        self.assertEqual(self.config_api.requests, 2)
+
+    async def test_shared_config_lock_held(self):
+        with tempfile.TemporaryDirectory() as directory:
+            lock = _try_lock_config_file(_config_file_path(directory, PUBLISHABLE_KEY))
+            assert lock is not None
+            try:
+                with mock.patch(
+                    "tesseral_fastapi._access_token_authenticator._SHARED_CONFIG_WAIT_SECONDS",
+                    0.1,
+                ):
+                    authenticator = self.authenticator(
+                        shared_config_directory=directory
+                    )
+                    self.assertEqual(await authenticator.project_id(), PROJECT_ID)
+            finally:
+                _unlock_config_file(lock)
+
+        self.assertEqual(self.config_api.requests, 1)
+
+    async def test_shared_config_unknown_kid(self):
+        with tempfile.TemporaryDirectory() as directory:
+            authenticator = self.authenticator(shared_config_directory=directory)
+            await authenticator.project_id()
+
+            # a snapshot no newer than our own config does not help us learn
+            # about new keys
+            new_signing_key = SigningKey("session_signing_key_2")
+            self.config_api.keys.append(new_signing_key)
+            await authenticator.authenticate_access_token(
+                access_token=new_signing_key.access_token()
+            )
+            self.assertEqual(self.config_api.requests, 2)
+
+    async def test_prewarm(self):
+        authenticator = self.authenticator()
+        await authenticator.prewarm()
+        self.assertEqual(self.config_api.requests, 1)
+
+        await authenticator.authenticate_access_token(
+            access_token=self.signing_key.access_token()
+        )
+        self.assertEqual(self.config_api.requests, 1)
+
+    async def test_config_snapshot(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            await self.authenticator(config_snapshot_path=path).prewarm()
+            self.assertEqual(self.config_api.requests, 1)
+
+            # a new process starts while the config API is down
+            self.config_api.status_code = 503
+            authenticator = self.authenticator(config_snapshot_path=path)
+            await authenticator.prewarm()
+            await authenticator.authenticate_access_token(
+                access_token=self.signing_key.access_token()
+            )
+            self.assertEqual(self.config_api.requests, 1)
+
+    async def test_expired_config_snapshot_refreshes_in_background(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            _write_config_snapshot(
+                path, _snapshot(self.signing_key, time.time() - 3700)
+            )
+            self.config_api.latency_seconds = 0.1
+
+            authenticator = self.authenticator(config_snapshot_path=path)
+            start = time.monotonic()
+            await authenticator.authenticate_access_token(
+                access_token=self.signing_key.access_token()
+            )
+            self.assertLess(time.monotonic() - start, 0.1)
+
+            assert authenticator._config_refresh is not None
+            await authenticator._config_refresh
+            self.assertEqual(self.config_api.requests, 1)
+            self.assertGreater(
+                authenticator._config.soft_refresh_unix_seconds, time.time()
+            )
+            # the refreshed config is saved
+            snapshot = _read_config_snapshot(path, PUBLISHABLE_KEY)
+            assert snapshot is not None
+            self.assertGreater(snapshot.fetched_unix_seconds, time.time() - 10)
+
+    async def test_too_stale_config_snapshot_is_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            _write_config_snapshot(
+                path, _snapshot(self.signing_key, time.time() - 7300)
+            )
+            self.config_api.status_code = 503
+
+            with pytest.raises(HTTPStatusError):
+                await self.authenticator(config_snapshot_path=path).prewarm()
+
+    async def test_future_config_snapshot_is_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            # a future fetch time would otherwise put off refreshing, and so
+            # dropping revoked keys, indefinitely
+            _write_config_snapshot(path, _snapshot(self.signing_key, 1e12))
+
+            authenticator = self.authenticator(config_snapshot_path=path)
+            await authenticator.prewarm()
+            self.assertEqual(self.config_api.requests, 1)
+            self.assertLess(
+                authenticator._config.soft_refresh_unix_seconds, time.time() + 3700
+            )
+
+    async def test_untrusted_config_snapshot_is_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            _write_config_snapshot(path, _snapshot(self.signing_key, time.time()))
+            os.chmod(path, 0o666)
+            self.config_api.status_code = 503
+
+            with pytest.raises(HTTPStatusError):
+                await self.authenticator(config_snapshot_path=path).prewarm()
+
+
+def _snapshot(signing_key: SigningKey, fetched_unix_seconds: float) -> _ConfigSnapshot:
+    snapshot = _ConfigSnapshot()
+    snapshot.publishable_key = PUBLISHABLE_KEY
+    snapshot.fetched_unix_seconds = fetched_unix_seconds
+    snapshot.config_json = config_json(signing_key)
+    return snapshot
+
+
+def _expire_config(authenticator: AsyncAccessTokenAuthenticator) -> None:
+    authenticator._config = authenticator._config.replace(
+        soft_refresh_unix_seconds=0, next_refresh_unix_seconds=0
+    )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,168 @@
+import asyncio
+import unittest
+
+import pytest
+
+from tesseral_fastapi._api_key_authenticator import (
+    AsyncApiKeyAuthenticator,
+    InvalidApiKeyException,
+)
+from tests._fixtures import BackendAPIStub
+
+API_KEY = "api_key_123"
+
+
+class TestAsyncApiKeyAuthenticator(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend_api = BackendAPIStub(
+            {API_KEY: {"apiKeyId": "api_key_id_123", "organizationId": "org_123"}}
+        )
+
+    def authenticator(self, **kwargs) -> AsyncApiKeyAuthenticator:
+        return AsyncApiKeyAuthenticator(
+            tesseral_client=self.backend_api.tesseral_client(), **kwargs
+        )
+
+    async def test_cache_disabled_by_default(self):
+        authenticator = self.authenticator()
+        for _ in range(2):
+            response = await authenticator.authenticate_api_key(secret_token=API_KEY)
+            self.assertEqual(response.organization_id, "org_123")
+        self.assertEqual(self.backend_api.requests, 2)
+
+    async def test_cache_hit(self):
+        authenticator = self.authenticator(api_key_cache_size=10)
+        for _ in range(3):
+            response = await authenticator.authenticate_api_key(secret_token=API_KEY)
+            self.assertEqual(response.organization_id, "org_123")
+        self.assertEqual(self.backend_api.requests, 1)
+
+        stats = authenticator.api_key_cache_stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (2, 1, 1))
+
+    async def test_cache_does_not_store_secret_token(self):
+        authenticator = self.authenticator(api_key_cache_size=10)
+        await authenticator.authenticate_api_key(secret_token=API_KEY)
+        assert authenticator._api_key_cache is not None
+        self.assertNotIn(API_KEY.encode(), authenticator._api_key_cache._entries)
+
+    async def test_cache_ttl(self):
+        authenticator = self.authenticator(
+            api_key_cache_size=10, api_key_cache_ttl_seconds=0
+        )
+        await authenticator.authenticate_api_key(secret_token=API_KEY)
+        await authenticator.authenticate_api_key(secret_token=API_KEY)
+        self.assertEqual(self.backend_api.requests, 2)
+
+    async def test_negative_cache(self):
+        authenticator = self.authenticator(api_key_cache_size=10)
+        for _ in range(3):
+            with pytest.raises(InvalidApiKeyException):
+                await authenticator.authenticate_api_key(secret_token="api_key_bad")
+        self.assertEqual(self.backend_api.requests, 1)
+
+    async def test_backend_errors_are_not_cached(self):
+        authenticator = self.authenticator(api_key_cache_size=10)
+        self.backend_api.status_code = 500
+        with pytest.raises(Exception):
+            await authenticator.authenticate_api_key(secret_token=API_KEY)
+
+        self.backend_api.status_code = None
+        await authenticator.authenticate_api_key(secret_token=API_KEY)
+        self.assertEqual(self.backend_api.requests, 2)
+
+    async def test_invalidate_api_key(self):
+        authenticator = self.authenticator(api_key_cache_size=10)
+        await authenticator.authenticate_api_key(secret_token=API_KEY)
+
+        # the API key is revoked
+        del self.backend_api.api_keys[API_KEY]
+        authenticator.invalidate_api_key(secret_token=API_KEY)
+        with pytest.raises(InvalidApiKeyException):
+            await authenticator.authenticate_api_key(secret_token=API_KEY)
+
+    async def test_invalidate_api_key_during_authentication(self):
+        self.backend_api.latency_seconds = 0.05
+        authenticator = self.authenticator(api_key_cache_size=10)
+        in_flight = asyncio.ensure_future(
+            authenticator.authenticate_api_key(secret_token=API_KEY)
+        )
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.backend_api.requests, 1)
+
+        # the API key is revoked while the backend's response is on its way
+        del self.backend_api.api_keys[API_KEY]
+        authenticator.invalidate_api_key(secret_token=API_KEY)
+        with pytest.raises(InvalidApiKeyException):
+            await authenticator.authenticate_api_key(secret_token=API_KEY)
+        self.assertEqual(self.backend_api.requests, 2)
+
+        # the in-flight call still answers its caller, but does not cache its
+        # outdated result over the revocation
+        response = await in_flight
+        self.assertEqual(response.organization_id, "org_123")
+        with pytest.raises(InvalidApiKeyException):
+            await authenticator.authenticate_api_key(secret_token=API_KEY)
+        self.assertEqual(self.backend_api.requests, 2)
+
+    async def test_clear_api_key_cache_during_authentication(self):
+        self.backend_api.latency_seconds = 0.05
+        authenticator = self.authenticator(api_key_cache_size=10)
+        in_flight = asyncio.ensure_future(
+            authenticator.authenticate_api_key(secret_token=API_KEY)
+        )
+        await asyncio.sleep(0.01)
+
+        authenticator.clear_api_key_cache()
+        await in_flight
+        self.assertEqual(authenticator.api_key_cache_stats().size, 0)
+
+    async def test_concurrent_authentications_are_coalesced(self):
+        self.backend_api.latency_seconds = 0.05
+        authenticator = self.authenticator()
+        responses = await asyncio.gather(
+            *(
+                authenticator.authenticate_api_key(secret_token=API_KEY)
+                for _ in range(50)
+            )
+        )
+
+        self.assertTrue(all(r.organization_id == "org_123" for r in responses))
+        self.assertEqual(self.backend_api.requests, 1)
+        self.assertEqual(authenticator.coalesced_api_key_authentications(), 49)
+
+        # once the call completes, the next authentication calls the backend again
+        await authenticator.authenticate_api_key(secret_token=API_KEY)
+        self.assertEqual(self.backend_api.requests, 2)
+
+    async def test_concurrent_authentications_share_errors(self):
+        self.backend_api.latency_seconds = 0.05
+        self.backend_api.status_code = 500
+        authenticator = self.authenticator()
+        results = await asyncio.gather(
+            *(
+                authenticator.authenticate_api_key(secret_token=API_KEY)
+                for _ in range(10)
+            ),
+            return_exceptions=True,
+        )
+
+        self.assertTrue(all(isinstance(result, Exception) for result in results))
+        self.assertEqual(self.backend_api.requests, 1)
+
+    async def test_different_api_keys_are_not_coalesced(self):
+        self.backend_api.latency_seconds = 0.05
+        authenticator = self.authenticator()
+        results = await asyncio.gather(
+            authenticator.authenticate_api_key(secret_token=API_KEY),
+            authenticator.authenticate_api_key(secret_token="api_key_bad"),
+            return_exceptions=True,
+        )
+
+        self.assertEqual(results[0].organization_id, "org_123")
+        self.assertIsInstance(results[1], InvalidApiKeyException)
+        self.assertEqual(self.backend_api.requests, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
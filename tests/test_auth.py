@@ -4,6 +4,7 @@ import pytest
 from tesseral import AccessTokenClaims, AuthenticateApiKeyResponse
 from tesseral.core import parse_obj_as
 
+from tesseral_fastapi._access_token_authenticator import InvalidAccessTokenException
 from tesseral_fastapi._auth import Auth
 from tesseral_fastapi._errors import NotAnAccessTokenError
 
@@ -181,6 +182,68 @@ class TestAuth(unittest.TestCase):
         )
         self.assertFalse(auth.has_permission("a.b.c"))
 
+    def test_lazy_access_token_claims(self):
+        auth = Auth()
+        auth._access_token = "access_token_123"
+        auth._access_token_raw_claims = {
+            "organization": {"id": "org_123", "displayName": "Test Organization"},
+            "user": {"id": "user_123", "email": "test@example.com"},
+            "session": {"id": "session_123"},
+            "actions": ["a.b.c"],
+            "iss": "https://example.com",
+            "sub": "user_123",
+            "aud": "https://example.com",
+            "exp": 1741195468,
+            "nbf": 1741195168,
+            "iat": 1741195168,
+        }
+        self.assertEqual(auth.organization_id(), "org_123")
+        self.assertTrue(auth.has_permission("a.b.c"))
+        self.assertFalse(auth.has_permission("d.e.f"))
+        self.assertIsNone(auth._access_token_claims)
+
+        claims = auth.access_token_claims()
+        self.assertEqual(claims.organization.id, "org_123")
+        self.assertIs(auth.access_token_claims(), claims)
+
+    def test_malformed_access_token_claims(self):
+        auth = Auth()
+        auth._access_token = "access_token_123"
+        auth._access_token_raw_claims = {"organization": "org_123", "exp": 1741195468}
+        with pytest.raises(InvalidAccessTokenException):
+            auth.access_token_claims()
+
+    def test_slots(self):
+        auth = Auth()
+        with pytest.raises(AttributeError):
+            auth.unknown = "value"  # type: ignore[attr-defined]
+
+    def test_permission_batch_and_wildcards(self):
+        auth = Auth()
+        auth._access_token = None
+        auth._api_key_secret_token = "api_key_456"
+        auth._access_token_claims = None
+        auth._authenticate_api_key_response = parse_obj_as(
+            type_=AuthenticateApiKeyResponse,
+            object_={
+                "organization_id": "org_456",
+                "actions": ["acme.widgets.edit", "acme.gadgets.read"],
+            },
+        )
+        self.assertTrue(auth.has_permission("acme.widgets.*"))
+        self.assertTrue(auth.has_permission("acme.*"))
+        self.assertFalse(auth.has_permission("acme.widgets.edit.*"))
+        self.assertFalse(auth.has_permission("acme.widget.*"))
+        self.assertFalse(auth.has_permission("other.*"))
+        self.assertTrue(auth.has_any_permission(["a.b.c", "acme.gadgets.read"]))
+        self.assertFalse(auth.has_any_permission(["a.b.c", "acme.gadgets.edit"]))
+        self.assertFalse(auth.has_any_permission([]))
+        self.assertTrue(
+            auth.has_all_permissions(["acme.widgets.*", "acme.gadgets.read"])
+        )
+        self.assertFalse(auth.has_all_permissions(["acme.widgets.edit", "a.b.c"]))
+        self.assertTrue(auth.has_all_permissions([]))
+
 
 if __name__ == "__main__":
     unittest.main()
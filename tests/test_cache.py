@@ -0,0 +1,126 @@
+import random
+import threading
+import unittest
+
+from tesseral_fastapi._cache import _LRUCache, _StripedLRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_get_and_put(self):
+        cache: _LRUCache[str, int] = _LRUCache(max_size=2)
+        self.assertIsNone(cache.get("a", now_unix_seconds=0))
+        cache.put("a", 1, expires_unix_seconds=10)
+        self.assertEqual(cache.get("a", now_unix_seconds=0), 1)
+
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 1, 1))
+
+    def test_expiry(self):
+        cache: _LRUCache[str, int] = _LRUCache(max_size=2)
+        cache.put("a", 1, expires_unix_seconds=10)
+        self.assertEqual(cache.get("a", now_unix_seconds=9), 1)
+        self.assertIsNone(cache.get("a", now_unix_seconds=10))
+        self.assertEqual(cache.stats().size, 0)
+
+    def test_lru_eviction(self):
+        cache: _LRUCache[str, int] = _LRUCache(max_size=2)
+        cache.put("a", 1, expires_unix_seconds=10)
+        cache.put("b", 2, expires_unix_seconds=10)
+        cache.get("a", now_unix_seconds=0)
+        cache.put("c", 3, expires_unix_seconds=10)
+
+        self.assertEqual(cache.get("a", now_unix_seconds=0), 1)
+        self.assertIsNone(cache.get("b", now_unix_seconds=0))
+        self.assertEqual(cache.get("c", now_unix_seconds=0), 3)
+        self.assertEqual(cache.stats().evictions, 1)
+
+    def test_discard_where(self):
+        cache: _LRUCache[str, int] = _LRUCache(max_size=3)
+        cache.put("a", 1, expires_unix_seconds=10)
+        cache.put("b", 2, expires_unix_seconds=10)
+        cache.put("c", 3, expires_unix_seconds=10)
+        cache.discard_where(lambda value: value % 2 == 1)
+
+        self.assertIsNone(cache.get("a", now_unix_seconds=0))
+        self.assertEqual(cache.get("b", now_unix_seconds=0), 2)
+        self.assertIsNone(cache.get("c", now_unix_seconds=0))
+
+
+class TestStripedLRUCache(unittest.TestCase):
+    def test_get_and_put(self):
+        cache: _StripedLRUCache[str, int] = _StripedLRUCache(max_size=100)
+        self.assertIsNone(cache.get("a", now_unix_seconds=0))
+        cache.put("a", 1, expires_unix_seconds=10)
+        self.assertEqual(cache.get("a", now_unix_seconds=0), 1)
+        self.assertIsNone(cache.get("a", now_unix_seconds=10))
+
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 2, 0))
+
+    def test_max_size(self):
+        for max_size in [1, 10, 100]:
+            cache: _StripedLRUCache[int, int] = _StripedLRUCache(max_size=max_size)
+            for i in range(1000):
+                cache.put(i, i, expires_unix_seconds=10)
+
+            stats = cache.stats()
+            self.assertLessEqual(stats.size, max_size)
+            self.assertEqual(stats.size + stats.evictions, 1000)
+
+    def test_holds_max_size_keys(self):
+        # however the keys spread over the stripes
+        cache: _StripedLRUCache[int, int] = _StripedLRUCache(max_size=100)
+        for i in range(100):
+            cache.put(i, i, expires_unix_seconds=10)
+
+        self.assertTrue(all(cache.get(i, now_unix_seconds=0) == i for i in range(100)))
+        self.assertEqual(cache.stats().evictions, 0)
+
+    def test_discard_where(self):
+        cache: _StripedLRUCache[int, int] = _StripedLRUCache(max_size=100)
+        for i in range(10):
+            cache.put(i, i, expires_unix_seconds=10)
+        cache.discard_where(lambda value: value % 2 == 1)
+        cache.discard(0)
+
+        self.assertEqual(
+            [i for i in range(10) if cache.get(i, now_unix_seconds=0) is not None],
+            [2, 4, 6, 8],
+        )
+
+    def test_concurrent_access(self):
+        cache: _StripedLRUCache[int, int] = _StripedLRUCache(max_size=64)
+        threads = 8
+        operations = 5000
+        start_barrier = threading.Barrier(threads)
+        gets = [0] * threads
+        errors = []
+
+        def worker(i: int) -> None:
+            rng = random.Random(i)
+            start_barrier.wait()
+            for _ in range(operations):
+                key = rng.randrange(256)
+                if rng.random() < 0.5:
+                    cache.put(key, key, expires_unix_seconds=10)
+                else:
+                    gets[i] += 1
+                    value = cache.get(key, now_unix_seconds=0)
+                    if value is not None and value != key:
+                        errors.append((key, value))
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        stats = cache.stats()
+        self.assertEqual(stats.hits + stats.misses, sum(gets))
+        # racing puts may overshoot by at most one entry each
+        self.assertLessEqual(stats.size, 64 + threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+import pytest
+
+from tesseral_fastapi import CircuitBreaker, CircuitOpenError
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patchers = [
+            mock.patch("time.monotonic", lambda: self.now),
+            # no jitter
+            mock.patch("random.uniform", lambda a, b: b),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(
+            failure_threshold=3, min_backoff_seconds=1, max_backoff_seconds=4
+        )
+
+    def fail_calls(self, times: int = 1) -> None:
+        for _ in range(times):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail_calls(2)
+        self.breaker.before_call()
+        self.breaker.record_success()
+        self.fail_calls(2)
+        self.assertEqual(self.breaker.state, "closed")
+
+        self.fail_calls()
+        self.assertEqual(self.breaker.state, "open")
+        with pytest.raises(CircuitOpenError) as e:
+            self.breaker.before_call()
+        self.assertEqual(e.value.retry_after_seconds, 1)
+
+    def test_half_open_probe(self):
+        self.fail_calls(3)
+        self.now += 1
+        self.assertEqual(self.breaker.state, "half_open")
+
+        # one probe goes through, and the rest fail fast while it is in flight
+        self.breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.before_call()
+
+    def test_backoff_doubles_up_to_max(self):
+        self.fail_calls(3)
+        backoffs = []
+        for _ in range(4):
+            retry_after_seconds = self.breaker.retry_after_seconds()
+            assert retry_after_seconds is not None
+            backoffs.append(retry_after_seconds)
+            self.now += retry_after_seconds
+            self.fail_calls()
+        self.assertEqual(backoffs, [1, 2, 4, 4])
+
+    def test_lost_probe(self):
+        self.fail_calls(3)
+        self.now += 1
+        self.breaker.before_call()
+        # the probe never reports back; another goes through after a backoff
+        self.now += 2
+        self.breaker.before_call()
+
+    def test_jitter(self):
+        with mock.patch("random.uniform", lambda a, b: a):
+            self.fail_calls(3)
+        self.assertEqual(self.breaker.retry_after_seconds(), 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
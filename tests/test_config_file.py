@@ -0,0 +1,97 @@
+import os
+import tempfile
+import time
+import unittest
+
+from tesseral_fastapi._config_file import (
+    _ConfigSnapshot,
+    _config_file_path,
+    _read_config_snapshot,
+    _try_lock_config_file,
+    _unlock_config_file,
+    _write_config_snapshot,
+)
+
+from tests._fixtures import PUBLISHABLE_KEY
+
+
+class TestConfigFile(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = _config_file_path(directory.name, PUBLISHABLE_KEY)
+
+    def snapshot(self) -> _ConfigSnapshot:
+        snapshot = _ConfigSnapshot()
+        snapshot.publishable_key = PUBLISHABLE_KEY
+        snapshot.fetched_unix_seconds = 1000
+        snapshot.config_json = '{"projectId": "project_123", "keys": []}'
+        return snapshot
+
+    def test_write_and_read(self):
+        self.assertIsNone(_read_config_snapshot(self.path, PUBLISHABLE_KEY))
+        _write_config_snapshot(self.path, self.snapshot())
+
+        snapshot = _read_config_snapshot(self.path, PUBLISHABLE_KEY)
+        assert snapshot is not None
+        self.assertEqual(snapshot.fetched_unix_seconds, 1000)
+        self.assertEqual(snapshot.config_json, self.snapshot().config_json)
+        self.assertIsNone(_read_config_snapshot(self.path, "publishable_key_other"))
+        # no temporary files are left behind
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.path)), [os.path.basename(self.path)]
+        )
+
+    def test_read_corrupt(self):
+        for contents in [b"", b"{", b"[]", b'{"version": 999}', b"\xff"]:
+            with open(self.path, "wb") as f:
+                f.write(contents)
+            self.assertIsNone(_read_config_snapshot(self.path, PUBLISHABLE_KEY))
+
+    def test_read_untrusted(self):
+        _write_config_snapshot(self.path, self.snapshot())
+        self.assertIsNotNone(_read_config_snapshot(self.path, PUBLISHABLE_KEY))
+
+        for mode in [0o620, 0o602]:
+            os.chmod(self.path, mode)
+            self.assertIsNone(_read_config_snapshot(self.path, PUBLISHABLE_KEY))
+        os.chmod(self.path, 0o600)
+
+        if os.geteuid() == 0:
+            os.chown(self.path, os.geteuid() + 1000, -1)
+            self.assertIsNone(_read_config_snapshot(self.path, PUBLISHABLE_KEY))
+            os.chown(self.path, os.geteuid(), -1)
+
+        link = self.path + ".link"
+        os.symlink(self.path, link)
+        self.assertIsNone(_read_config_snapshot(link, PUBLISHABLE_KEY))
+
+    def test_read_future(self):
+        snapshot = self.snapshot()
+        snapshot.fetched_unix_seconds = 1e12
+        _write_config_snapshot(self.path, snapshot)
+        self.assertIsNone(_read_config_snapshot(self.path, PUBLISHABLE_KEY))
+
+        snapshot.fetched_unix_seconds = time.time() + 10
+        _write_config_snapshot(self.path, snapshot)
+        self.assertIsNotNone(_read_config_snapshot(self.path, PUBLISHABLE_KEY))
+
+    def test_lock(self):
+        lock = _try_lock_config_file(self.path)
+        self.assertIsNotNone(lock)
+        self.assertIsNone(_try_lock_config_file(self.path))
+
+        assert lock is not None
+        _unlock_config_file(lock)
+        lock = _try_lock_config_file(self.path)
+        self.assertIsNotNone(lock)
+        assert lock is not None
+        _unlock_config_file(lock)
+
+    def test_lock_unavailable(self):
+        with self.assertRaises(OSError):
+            _try_lock_config_file(os.path.join(self.path, "missing", "config.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
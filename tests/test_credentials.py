@@ -0,0 +1,42 @@
+import unittest
+
+from tesseral_fastapi._credentials import (
+    classify_credential,
+    is_api_key_format,
+    is_jwt_format,
+)
+
+
+class TestCredentials(unittest.TestCase):
+    def test_classify_credential(self):
+        self.assertEqual(classify_credential("a.b.c"), "access_token")
+        self.assertEqual(classify_credential("eyJ-_0.eyJ_-1.sig-_"), "access_token")
+        self.assertEqual(classify_credential("api_key_abc123"), "api_key")
+        self.assertEqual(classify_credential(""), None)
+        self.assertEqual(classify_credential("a.b"), None)
+        self.assertEqual(classify_credential("a.b.c.d"), None)
+        self.assertEqual(classify_credential("a..c"), None)
+        self.assertEqual(classify_credential("API_KEY"), None)
+        self.assertEqual(classify_credential("api key"), None)
+        self.assertEqual(classify_credential("a.b.c\n"), None)
+
+    def test_classify_credential_agrees_with_format_checks(self):
+        for value in ["a.b.c", "abc", "ABC", "a.b", "a_b-c", "", "a.b.c\n", "x\n"]:
+            if is_jwt_format(value):
+                expected = "access_token"
+            elif is_api_key_format(value):
+                expected = "api_key"
+            else:
+                expected = None
+            self.assertEqual(classify_credential(value), expected, value)
+
+    def test_format_checks_match_whole_value(self):
+        self.assertTrue(is_jwt_format("a.b.c"))
+        self.assertFalse(is_jwt_format("a.b.c.d"))
+        self.assertFalse(is_jwt_format("a.b.c\n"))
+        self.assertTrue(is_api_key_format("api_key_abc"))
+        self.assertFalse(is_api_key_format("api_key_abc\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
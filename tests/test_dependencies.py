@@ -0,0 +1,167 @@
+import unittest
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import Depends, FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from tesseral_fastapi import (
+    Auth,
+    RequireAuth,
+    RequireAuthMiddleware,
+    get_auth,
+    require_permission,
+)
+
+from tests._fixtures import PUBLISHABLE_KEY, BackendAPIStub, ConfigAPIStub, SigningKey
+
+
+class TestRequirePermission(unittest.TestCase):
+    def setUp(self):
+        self.signing_key = SigningKey("session_signing_key_1")
+        self.backend_api = BackendAPIStub(
+            {
+                "api_key_editor": {
+                    "organizationId": "org_123",
+                    "actions": ["acme.widgets.edit"],
+                },
+                "api_key_reader": {"organizationId": "org_123", "actions": None},
+            }
+        )
+        self.handled = 0
+
+        app = FastAPI()
+        app.add_middleware(
+            RequireAuthMiddleware,
+            publishable_key=PUBLISHABLE_KEY,
+            http_client=ConfigAPIStub(self.signing_key).http_client(),
+            api_keys_enabled=True,
+            tesseral_client=self.backend_api.tesseral_client(),
+        )
+
+        @app.post("/widgets")
+        async def edit_widget(
+            auth: Auth = Depends(require_permission("acme.widgets.edit")),
+        ):
+            self.handled += 1
+            return {"organization_id": auth.organization_id()}
+
+        @app.get("/widgets", dependencies=[Depends(require_permission("acme.*"))])
+        async def list_widgets():
+            self.handled += 1
+            return {}
+
+        self.client = TestClient(app)
+
+    def request(self, method: str, credential: str) -> int:
+        return self.client.request(
+            method, "/widgets", headers={"Authorization": f"Bearer {credential}"}
+        ).status_code
+
+    def test_access_token(self):
+        editor = self.signing_key.access_token(actions=["acme.widgets.edit"])
+        self.assertEqual(self.request("POST", editor), 200)
+        self.assertEqual(self.request("GET", editor), 200)
+
+        reader = self.signing_key.access_token(actions=["other.widgets.read"])
+        self.assertEqual(self.request("POST", reader), 403)
+        self.assertEqual(self.request("GET", reader), 403)
+        self.assertEqual(self.handled, 2)
+
+    def test_api_key(self):
+        self.assertEqual(self.request("POST", "api_key_editor"), 200)
+        self.assertEqual(self.request("GET", "api_key_editor"), 200)
+        self.assertEqual(self.request("POST", "api_key_reader"), 403)
+        self.assertEqual(self.request("GET", "api_key_reader"), 403)
+        self.assertEqual(self.handled, 2)
+
+
+class TestRequireAuth(unittest.TestCase):
+    def setUp(self):
+        self.signing_key = SigningKey("session_signing_key_1")
+        self.config_api = ConfigAPIStub(self.signing_key)
+        self.require_auth = RequireAuth(
+            publishable_key=PUBLISHABLE_KEY,
+            http_client=self.config_api.http_client(),
+            api_keys_enabled=True,
+            tesseral_client=BackendAPIStub(
+                {"api_key_editor": {"organizationId": "org_123"}}
+            ).tesseral_client(),
+        )
+
+        @asynccontextmanager
+        async def lifespan(app):
+            await self.require_auth.startup()
+            yield
+            await self.require_auth.shutdown()
+
+        app = FastAPI(lifespan=lifespan)
+
+        @app.get("/private")
+        async def private(auth: Auth = Depends(self.require_auth)):
+            return {"organization_id": auth.organization_id()}
+
+        @app.get(
+            "/widgets",
+            dependencies=[
+                Depends(self.require_auth),
+                Depends(require_permission("acme.widgets.read")),
+            ],
+        )
+        async def list_widgets(auth: Auth = Depends(get_auth)):
+            return {"organization_id": auth.organization_id()}
+
+        @app.get("/public")
+        async def public():
+            return {}
+
+        @app.websocket("/ws")
+        async def ws(websocket: WebSocket, auth: Auth = Depends(self.require_auth)):
+            await websocket.accept()
+            await websocket.send_json({"organization_id": auth.organization_id()})
+            await websocket.close()
+
+        self.client = TestClient(app)
+
+    def request(self, path: str, credential: str) -> int:
+        return self.client.get(
+            path, headers={"Authorization": f"Bearer {credential}"}
+        ).status_code
+
+    def test_authenticated_routes(self):
+        reader = self.signing_key.access_token(actions=["acme.widgets.read"])
+        self.assertEqual(self.request("/private", reader), 200)
+        self.assertEqual(self.request("/private", "api_key_editor"), 200)
+        self.assertEqual(self.request("/widgets", reader), 200)
+        self.assertEqual(self.request("/widgets", "api_key_editor"), 403)
+        self.assertEqual(self.client.get("/private").status_code, 401)
+        self.assertEqual(self.request("/widgets", "api_key_unknown"), 401)
+
+    def test_websocket(self):
+        with self.client.websocket_connect(
+            "/ws", headers={"Authorization": "Bearer api_key_editor"}
+        ) as websocket:
+            self.assertEqual(websocket.receive_json(), {"organization_id": "org_123"})
+
+        with pytest.raises(WebSocketDisconnect) as e:
+            with self.client.websocket_connect("/ws"):
+                pass
+        self.assertEqual(e.value.code, 1008)
+
+    def test_public_route(self):
+        self.assertEqual(self.client.get("/public").status_code, 200)
+        self.assertEqual(self.config_api.requests, 0)
+
+    def test_lifespan(self):
+        with self.client:
+            self.assertEqual(self.config_api.requests, 1)
+            self.assertIsNotNone(
+                self.require_auth.authenticator.access_token_authenticators[
+                    0
+                ]._background_refresh
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,395 @@
+import time
+import unittest
+from unittest import mock
+
+import httpx
+
+from fastapi import Depends, FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from tesseral_fastapi import Auth, CircuitBreaker, RequireAuthMiddleware, get_auth
+from tesseral_fastapi._access_token_authenticator import AsyncAccessTokenAuthenticator
+from tesseral_fastapi._request_authenticator import _cookie_value, _credential
+
+from tests._fixtures import (
+    PROJECT_ID,
+    PUBLISHABLE_KEY,
+    BackendAPIStub,
+    ConfigAPIStub,
+    SigningKey,
+    multi_project_http_client,
+)
+
+
+def _app(config_api: ConfigAPIStub, **kwargs) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        RequireAuthMiddleware,
+        publishable_key=PUBLISHABLE_KEY,
+        http_client=config_api.http_client(),
+        **kwargs,
+    )
+
+    @app.get("/")
+    async def read_root(auth: Auth = Depends(get_auth)):
+        return {"organization_id": auth.organization_id()}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            yield b"a"
+            yield b"b"
+
+        return StreamingResponse(chunks())
+
+    return app
+
+
+class TestRequireAuthMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.signing_key = SigningKey("session_signing_key_1")
+        self.config_api = ConfigAPIStub(self.signing_key)
+        self.client = TestClient(_app(self.config_api))
+
+    def test_bearer_token(self):
+        response = self.client.get(
+            "/",
+            headers={"Authorization": f"Bearer {self.signing_key.access_token()}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(), {"organization_id": "org_7908mz2ul9usdhy0gdd3tiean"}
+        )
+
+    def test_cookie(self):
+        self.client.cookies.set(
+            f"tesseral_{PROJECT_ID}_access_token", self.signing_key.access_token()
+        )
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_credentials(self):
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {"error": "Unauthorized"})
+
+    def test_invalid_access_token(self):
+        other_key = SigningKey("session_signing_key_1")
+        response = self.client.get(
+            "/", headers={"Authorization": f"Bearer {other_key.access_token()}"}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_api_key(self):
+        backend_api = BackendAPIStub({"api_key_123": {"organizationId": "org_123"}})
+        client = TestClient(
+            _app(
+                self.config_api,
+                api_keys_enabled=True,
+                tesseral_client=backend_api.tesseral_client(),
+            )
+        )
+
+        response = client.get("/", headers={"Authorization": "Bearer api_key_123"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"organization_id": "org_123"})
+
+        response = client.get("/", headers={"Authorization": "Bearer api_key_456"})
+        self.assertEqual(response.status_code, 401)
+
+    def test_streaming_response(self):
+        response = self.client.get(
+            "/stream",
+            headers={"Authorization": f"Bearer {self.signing_key.access_token()}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"ab")
+
+    def test_lifespan_starts_background_refresh(self):
+        with TestClient(_app(self.config_api)) as client:
+            for _ in range(100):
+                if self.config_api.requests:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(self.config_api.requests, 1)
+
+            response = client.get(
+                "/",
+                headers={"Authorization": f"Bearer {self.signing_key.access_token()}"},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.config_api.requests, 1)
+
+    def test_lifespan_prewarms_config(self):
+        with TestClient(_app(self.config_api)):
+            self.assertEqual(self.config_api.requests, 1)
+
+    def test_lifespan_prewarm_failure(self):
+        self.config_api.status_code = 503
+        with TestClient(_app(self.config_api)) as client:
+            self.config_api.status_code = 200
+            response = client.get(
+                "/",
+                headers={"Authorization": f"Bearer {self.signing_key.access_token()}"},
+            )
+            self.assertEqual(response.status_code, 200)
+
+
+class TestPublicPaths(unittest.TestCase):
+    def setUp(self):
+        self.config_api = ConfigAPIStub(SigningKey("session_signing_key_1"))
+        app = _app(
+            self.config_api,
+            public_paths=["/healthz"],
+            public_path_prefixes=["/public"],
+            public_methods=["OPTIONS"],
+        )
+
+        @app.get("/healthz")
+        async def healthz():
+            return {}
+
+        @app.get("/public/{name}")
+        async def public(name: str):
+            return {}
+
+        @app.options("/")
+        async def preflight():
+            return {}
+
+        self.client = TestClient(app)
+
+    def test_public_requests_skip_authentication(self):
+        self.assertEqual(self.client.get("/healthz").status_code, 200)
+        self.assertEqual(self.client.get("/public/a").status_code, 200)
+        self.assertEqual(self.client.options("/").status_code, 200)
+        # The config is not even fetched.
+        self.assertEqual(self.config_api.requests, 0)
+
+    def test_other_requests_require_authentication(self):
+        self.assertEqual(self.client.get("/").status_code, 401)
+        self.assertEqual(self.client.get("/healthz/a").status_code, 401)
+        self.assertEqual(self.client.get("/publicity").status_code, 401)
+
+
+class TestMultipleProjects(unittest.TestCase):
+    def setUp(self):
+        self.key_a = SigningKey("session_signing_key_a")
+        self.key_b = SigningKey("session_signing_key_b")
+        app = FastAPI()
+        app.add_middleware(
+            RequireAuthMiddleware,
+            publishable_keys=["publishable_key_a", "publishable_key_b"],
+            http_client=multi_project_http_client(
+                {
+                    "publishable_key_a": ConfigAPIStub(
+                        self.key_a, project_id="project_a"
+                    ),
+                    "publishable_key_b": ConfigAPIStub(
+                        self.key_b, project_id="project_b"
+                    ),
+                }
+            ),
+        )
+
+        @app.get("/")
+        async def read_root(auth: Auth = Depends(get_auth)):
+            return {"organization_id": auth.organization_id()}
+
+        self.client = TestClient(app)
+
+    def test_bearer_token(self):
+        for key in [self.key_a, self.key_b]:
+            response = self.client.get(
+                "/", headers={"Authorization": f"Bearer {key.access_token()}"}
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def test_cookies(self):
+        for project_id, key in [("project_a", self.key_a), ("project_b", self.key_b)]:
+            self.client.cookies.clear()
+            self.client.cookies.set(
+                f"tesseral_{project_id}_access_token", key.access_token()
+            )
+            self.assertEqual(self.client.get("/").status_code, 200)
+
+    def test_unknown_project(self):
+        other_key = SigningKey("session_signing_key_c")
+        response = self.client.get(
+            "/", headers={"Authorization": f"Bearer {other_key.access_token()}"}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_publishable_key_required(self):
+        with self.assertRaises(RuntimeError):
+            RequireAuthMiddleware(FastAPI())
+        with self.assertRaises(RuntimeError):
+            RequireAuthMiddleware(
+                FastAPI(), publishable_key="a", publishable_keys=["b"]
+            )
+
+
+class TestUpstreamOutage(unittest.TestCase):
+    def setUp(self):
+        self.signing_key = SigningKey("session_signing_key_1")
+        self.config_api = ConfigAPIStub(self.signing_key)
+        self.backend_api = BackendAPIStub({"api_key_1": {"organizationId": "org_123"}})
+        self.app = _app(
+            self.config_api,
+            api_keys_enabled=True,
+            tesseral_client=self.backend_api.tesseral_client(),
+            circuit_breaker_failure_threshold=3,
+            circuit_breaker_min_backoff_seconds=60,
+        )
+        self.client = TestClient(self.app, raise_server_exceptions=False)
+
+    def request(self, credential: str) -> int:
+        return self.client.get(
+            "/", headers={"Authorization": f"Bearer {credential}"}
+        ).status_code
+
+    def end_backoff(self, breaker: CircuitBreaker) -> None:
+        breaker._retry_monotonic_seconds = 0
+
+    def test_config_api_calls_bounded(self):
+        self.config_api.status_code = 503
+        access_token = self.signing_key.access_token()
+        statuses = [self.request(access_token) for _ in range(100)]
+        self.assertEqual(statuses, [500] * 100)
+        self.assertEqual(self.config_api.requests, 3)
+
+        # once the backoff passes, a probe goes through, and succeeds
+        self.config_api.status_code = 200
+        authenticator = _find_middleware(self.app).authenticator
+        self.end_backoff(authenticator.access_token_authenticators[0]._circuit_breaker)
+        self.assertEqual(self.request(access_token), 200)
+        self.assertEqual(self.config_api.requests, 4)
+
+    def test_api_key_backend_calls_bounded(self):
+        self.backend_api.status_code = 500
+        statuses = [self.request("api_key_1") for _ in range(100)]
+        self.assertEqual(statuses, [500] * 100)
+        self.assertEqual(self.backend_api.requests, 3)
+
+        self.backend_api.status_code = None
+        authenticator = _find_middleware(self.app).authenticator
+        self.end_backoff(authenticator.api_key_authenticator._circuit_breaker)
+        self.assertEqual(self.request("api_key_1"), 200)
+        # rejected API keys are not backend failures
+        for _ in range(5):
+            self.assertEqual(self.request("api_key_2"), 401)
+        self.assertEqual(self.request("api_key_1"), 200)
+
+
+class TestHTTPClient(unittest.TestCase):
+    def test_one_shared_client(self):
+        clients = []
+        transports = []
+        original_client_init = httpx.AsyncClient.__init__
+        original_transport_init = httpx.AsyncHTTPTransport.__init__
+
+        def client_init(client, *args, **kwargs):
+            clients.append(client)
+            original_client_init(client, *args, **kwargs)
+
+        def transport_init(transport, *args, **kwargs):
+            transports.append(transport)
+            original_transport_init(transport, *args, **kwargs)
+
+        with (
+            mock.patch.object(httpx.AsyncClient, "__init__", client_init),
+            mock.patch.object(httpx.AsyncHTTPTransport, "__init__", transport_init),
+            mock.patch.dict("os.environ", {"TESSERAL_BACKEND_API_KEY": "key"}),
+        ):
+            middleware = RequireAuthMiddleware(
+                FastAPI(),
+                publishable_key=PUBLISHABLE_KEY,
+                api_keys_enabled=True,
+                http_max_connections=7,
+                http_max_keepalive_connections=3,
+            )
+
+        authenticator = middleware.authenticator
+        self.assertEqual(clients, [authenticator.http_client])
+        self.assertEqual(len(transports), 1)
+        self.assertIs(
+            authenticator.access_token_authenticators[0]._http_client,
+            authenticator.http_client,
+        )
+        self.assertIs(
+            authenticator.tesseral_client._client_wrapper.httpx_client.httpx_client,
+            authenticator.http_client,
+        )
+        pool = transports[0]._pool
+        self.assertEqual(pool._max_connections, 7)
+        self.assertEqual(pool._max_keepalive_connections, 3)
+
+    def test_owned_client_closed_on_shutdown(self):
+        app = FastAPI()
+        app.add_middleware(
+            RequireAuthMiddleware,
+            publishable_key=PUBLISHABLE_KEY,
+            prewarm_on_startup=False,
+        )
+        # keep the test off the network
+        with (
+            mock.patch.object(
+                AsyncAccessTokenAuthenticator, "start_background_refresh"
+            ),
+            TestClient(app),
+        ):
+            http_client = _find_middleware(app).authenticator.http_client
+            self.assertFalse(http_client.is_closed)
+        self.assertTrue(http_client.is_closed)
+
+    def test_provided_client_not_closed_on_shutdown(self):
+        http_client = ConfigAPIStub(SigningKey("session_signing_key_1")).http_client()
+        app = FastAPI()
+        app.add_middleware(
+            RequireAuthMiddleware,
+            publishable_key=PUBLISHABLE_KEY,
+            http_client=http_client,
+        )
+        with TestClient(app):
+            pass
+        self.assertFalse(http_client.is_closed)
+
+
+def _find_middleware(app: FastAPI) -> RequireAuthMiddleware:
+    layer = app.middleware_stack
+    while not isinstance(layer, RequireAuthMiddleware):
+        layer = layer.app  # type: ignore[union-attr]
+    return layer
+
+
+class TestCredential(unittest.TestCase):
+    def test_authorization_header(self):
+        headers = [(b"authorization", b"Bearer a.b.c"), (b"cookie", b"x=y")]
+        self.assertEqual(_credential(headers, [PROJECT_ID]), "a.b.c")
+
+    def test_authorization_header_not_bearer(self):
+        headers = [(b"authorization", b"Basic abc")]
+        self.assertEqual(_credential(headers, [PROJECT_ID]), "")
+
+    def test_cookie(self):
+        headers = [
+            (b"cookie", f"a=b; tesseral_{PROJECT_ID}_access_token=a.b.c; c=d".encode())
+        ]
+        self.assertEqual(_credential(headers, [PROJECT_ID]), "a.b.c")
+
+    def test_cookie_value(self):
+        self.assertEqual(_cookie_value(b"name=value", b"name"), b"value")
+        self.assertEqual(_cookie_value(b"a=b;name=value", b"name"), b"value")
+        self.assertEqual(_cookie_value(b"a=b; name=value; c=d", b"name"), b"value")
+        self.assertEqual(_cookie_value(b"xname=bad; name=good", b"name"), b"good")
+        self.assertEqual(_cookie_value(b"names=bad", b"name"), None)
+        self.assertEqual(_cookie_value(b"a=name", b"name"), None)
+        self.assertEqual(_cookie_value(b"", b"name"), None)
+        self.assertEqual(_cookie_value(b'a=b; name="value"; c=d', b"name"), b"value")
+        self.assertEqual(_cookie_value(b'name="value"', b"name"), b"value")
+        self.assertEqual(_cookie_value(b'name="', b"name"), b'"')
+
+
+if __name__ == "__main__":
+    unittest.main()
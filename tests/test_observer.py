@@ -0,0 +1,158 @@
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from tesseral_fastapi import Histogram, InMemoryAuthObserver, RequireAuthMiddleware
+
+from tests._fixtures import PUBLISHABLE_KEY, BackendAPIStub, ConfigAPIStub, SigningKey
+
+
+def _app(config_api: ConfigAPIStub, **kwargs) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(
+        RequireAuthMiddleware,
+        publishable_key=PUBLISHABLE_KEY,
+        http_client=config_api.http_client(),
+        **kwargs,
+    )
+
+    @app.get("/")
+    async def read_root():
+        return {}
+
+    return app
+
+
+class TestHistogram(unittest.TestCase):
+    def test_observe(self):
+        histogram = Histogram((0.001, 0.01))
+        for seconds in [0.0005, 0.001, 0.005, 0.5]:
+            histogram.observe(seconds)
+
+        self.assertEqual(histogram.bucket_counts, [2, 1, 1])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum_seconds, 0.5065)
+
+    def test_quantile(self):
+        histogram = Histogram((0.001, 0.01))
+        self.assertEqual(histogram.quantile(0.5), 0)
+        for seconds in [0.0005] * 98 + [0.005, 0.5]:
+            histogram.observe(seconds)
+
+        self.assertEqual(histogram.quantile(0.5), 0.001)
+        self.assertEqual(histogram.quantile(0.99), 0.01)
+        self.assertEqual(histogram.quantile(1), float("inf"))
+
+
+class TestInMemoryAuthObserver(unittest.TestCase):
+    def setUp(self):
+        self.signing_key = SigningKey("session_signing_key_1")
+        self.config_api = ConfigAPIStub(self.signing_key)
+        self.backend_api = BackendAPIStub(
+            {"api_key_123": {"organizationId": "org_123"}}
+        )
+        self.observer = InMemoryAuthObserver()
+        self.client = TestClient(
+            _app(
+                self.config_api,
+                api_keys_enabled=True,
+                tesseral_client=self.backend_api.tesseral_client(),
+                access_token_cache_size=10,
+                observer=self.observer,
+            ),
+            raise_server_exceptions=False,
+        )
+
+    def get(self, credential: str) -> int:
+        headers = {"Authorization": f"Bearer {credential}"} if credential else {}
+        return self.client.get("/", headers=headers).status_code
+
+    def test_outcomes(self):
+        access_token = self.signing_key.access_token()
+        self.assertEqual(self.get(access_token), 200)
+        self.assertEqual(self.get(access_token), 200)
+        self.assertEqual(self.get("api_key_123"), 200)
+        self.assertEqual(self.get("api_key_456"), 401)
+        self.assertEqual(self.get(""), 401)
+        self.assertEqual(self.get("a.b.c"), 401)
+        self.assertEqual(
+            self.get(self.signing_key.access_token(now_unix_seconds=0)), 401
+        )
+        self.assertEqual(
+            self.get(SigningKey("session_signing_key_2").access_token()), 401
+        )
+
+        self.assertEqual(
+            self.observer.outcomes,
+            {
+                "success": 3,
+                "invalid_api_key": 1,
+                "missing_credentials": 1,
+                "invalid_token": 1,
+                "expired": 1,
+                "unknown_kid": 1,
+            },
+        )
+        self.assertEqual(
+            self.observer.events, {"jwks_refresh": 2, "jwks_unknown_kid_refresh": 1}
+        )
+        self.assertEqual(self.observer.cache_hits, {"access_token": 1})
+        self.assertEqual(
+            self.observer.cache_misses,
+            {"access_token": 4, "rejected_access_token": 4},
+        )
+
+    def test_timings(self):
+        self.assertEqual(self.get(self.signing_key.access_token()), 200)
+        self.assertEqual(self.get("api_key_123"), 200)
+
+        self.assertEqual(
+            set(self.observer.histograms),
+            {
+                "config_fetch",
+                "jwt_decode",
+                "signature_verify",
+                "claims_parse",
+                "api_key_backend",
+            },
+        )
+        for histogram in self.observer.histograms.values():
+            self.assertEqual(histogram.count, 1)
+
+    def test_backend_error(self):
+        self.config_api.status_code = 503
+        self.assertEqual(self.get(self.signing_key.access_token()), 500)
+        self.assertEqual(self.observer.outcomes, {"backend_error": 1})
+        self.assertEqual(self.observer.events, {"jwks_refresh_failed": 1})
+
+
+class TestServerTiming(unittest.TestCase):
+    def setUp(self):
+        self.signing_key = SigningKey("session_signing_key_1")
+        self.config_api = ConfigAPIStub(self.signing_key)
+
+    def test_disabled_by_default(self):
+        client = TestClient(_app(self.config_api))
+        response = client.get(
+            "/", headers={"Authorization": f"Bearer {self.signing_key.access_token()}"}
+        )
+        self.assertNotIn("server-timing", response.headers)
+
+    def test_server_timing(self):
+        client = TestClient(_app(self.config_api, server_timing=True))
+        response = client.get(
+            "/", headers={"Authorization": f"Bearer {self.signing_key.access_token()}"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response.headers["server-timing"], r"^tesseral-auth;dur=\d+\.\d{3}$"
+        )
+
+        response = client.get("/")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("server-timing", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+
+import pytest
+
+from tesseral_fastapi._access_token_authenticator import (
+    AsyncAccessTokenAuthenticator,
+    InvalidAccessTokenException,
+    _UnknownKeyIdException,
+)
+from tesseral_fastapi._project_router import _ProjectRouter
+
+from tests._fixtures import ConfigAPIStub, SigningKey, multi_project_http_client
+
+PUBLISHABLE_KEY_A = "publishable_key_a"
+PUBLISHABLE_KEY_B = "publishable_key_b"
+
+
+class TestProjectRouter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.key_a = SigningKey("session_signing_key_a")
+        self.key_b = SigningKey("session_signing_key_b")
+        self.config_api_a = ConfigAPIStub(self.key_a, project_id="project_a")
+        self.config_api_b = ConfigAPIStub(self.key_b, project_id="project_b")
+        http_client = multi_project_http_client(
+            {
+                PUBLISHABLE_KEY_A: self.config_api_a,
+                PUBLISHABLE_KEY_B: self.config_api_b,
+            }
+        )
+        self.authenticator_a = AsyncAccessTokenAuthenticator(
+            publishable_key=PUBLISHABLE_KEY_A, http_client=http_client
+        )
+        self.authenticator_b = AsyncAccessTokenAuthenticator(
+            publishable_key=PUBLISHABLE_KEY_B, http_client=http_client
+        )
+        self.router = _ProjectRouter([self.authenticator_a, self.authenticator_b])
+
+    async def test_project_ids(self):
+        self.assertEqual(await self.router.project_ids(), ["project_a", "project_b"])
+
+    async def test_project_ids_with_one_project_down(self):
+        self.config_api_b.status_code = 503
+        self.assertEqual(await self.router.project_ids(), ["project_a"])
+
+        self.config_api_a.status_code = 503
+        self.authenticator_a._config = self.authenticator_a._config.replace(
+            soft_refresh_unix_seconds=0,
+            next_refresh_unix_seconds=0,
+            stale_unix_seconds=0,
+        )
+        with pytest.raises(Exception):
+            await self.router.project_ids()
+
+    async def test_routes_by_kid(self):
+        await self.router.project_ids()
+        verify_a = _count_calls(self.authenticator_a)
+        verify_b = _count_calls(self.authenticator_b)
+
+        await self.router.verify_access_token(access_token=self.key_b.access_token())
+        self.assertEqual((verify_a.calls, verify_b.calls), (0, 1))
+        await self.router.verify_access_token(access_token=self.key_a.access_token())
+        self.assertEqual((verify_a.calls, verify_b.calls), (1, 1))
+
+    async def test_index_follows_key_rotation(self):
+        await self.router.project_ids()
+        await self.router.verify_access_token(access_token=self.key_b.access_token())
+
+        new_key = SigningKey("session_signing_key_b2")
+        self.config_api_b.keys = [self.key_b, new_key]
+        verified = await self.router.verify_access_token(
+            access_token=new_key.access_token()
+        )
+        self.assertEqual(verified.kid, "session_signing_key_b2")
+        self.assertIs(self.router._index()[new_key.kid], self.authenticator_b)
+
+    async def test_unknown_kid(self):
+        await self.router.project_ids()
+        with pytest.raises(_UnknownKeyIdException):
+            await self.router.verify_access_token(
+                access_token=SigningKey("session_signing_key_c").access_token()
+            )
+        # each project refreshed once, looking for the kid
+        self.assertEqual(
+            (self.config_api_a.requests, self.config_api_b.requests), (2, 2)
+        )
+
+    async def test_unknown_kid_with_one_project_down(self):
+        # the project that is down is tried first
+        self.router = _ProjectRouter([self.authenticator_b, self.authenticator_a])
+        await self.router.project_ids()
+        self.config_api_b.status_code = 503
+        self.authenticator_b._config = self.authenticator_b._config.replace(
+            soft_refresh_unix_seconds=0,
+            next_refresh_unix_seconds=0,
+            stale_unix_seconds=0,
+        )
+
+        # a key rotated into the project that is up still verifies
+        new_key = SigningKey("session_signing_key_a2")
+        self.config_api_a.keys = [self.key_a, new_key]
+        verified = await self.router.verify_access_token(
+            access_token=new_key.access_token()
+        )
+        self.assertEqual(verified.kid, "session_signing_key_a2")
+
+        with pytest.raises(_UnknownKeyIdException):
+            await self.router.verify_access_token(
+                access_token=SigningKey("session_signing_key_c").access_token()
+            )
+
+    async def test_unknown_kid_with_every_project_down(self):
+        self.config_api_a.status_code = 503
+        self.config_api_b.status_code = 503
+        with pytest.raises(Exception) as exc_info:
+            await self.router.verify_access_token(
+                access_token=SigningKey("session_signing_key_c").access_token()
+            )
+        self.assertNotIsInstance(exc_info.value, InvalidAccessTokenException)
+
+    async def test_malformed_header(self):
+        with pytest.raises(InvalidAccessTokenException):
+            await self.router.verify_access_token(access_token="a.b.c")
+
+
+class _CountingVerify:
+    calls: int
+
+    def __init__(self, verify):
+        self.calls = 0
+        self._verify = verify
+
+    async def __call__(self, **kwargs):
+        self.calls += 1
+        return await self._verify(**kwargs)
+
+
+def _count_calls(authenticator: AsyncAccessTokenAuthenticator) -> _CountingVerify:
+    verify = _CountingVerify(authenticator.verify_access_token)
+    authenticator.verify_access_token = verify  # type: ignore[method-assign]
+    return verify
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from tesseral_fastapi._public_paths import _PublicPathMatcher
+
+
+class TestPublicPathMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = _PublicPathMatcher(
+            paths=["/healthz", "/metrics"],
+            prefixes=["/public", "/docs/api/"],
+            methods=["options"],
+        )
+
+    def test_paths(self):
+        self.assertTrue(self.matcher.matches("GET", "/healthz"))
+        self.assertTrue(self.matcher.matches("POST", "/metrics"))
+        self.assertFalse(self.matcher.matches("GET", "/healthz/x"))
+        self.assertFalse(self.matcher.matches("GET", "/health"))
+        self.assertFalse(self.matcher.matches("GET", "/"))
+
+    def test_prefixes(self):
+        self.assertTrue(self.matcher.matches("GET", "/public"))
+        self.assertTrue(self.matcher.matches("GET", "/public/"))
+        self.assertTrue(self.matcher.matches("GET", "/public/a/b"))
+        self.assertTrue(self.matcher.matches("GET", "/docs/api"))
+        self.assertTrue(self.matcher.matches("GET", "/docs/api/v1"))
+        self.assertFalse(self.matcher.matches("GET", "/publicity"))
+        self.assertFalse(self.matcher.matches("GET", "/docs"))
+        self.assertFalse(self.matcher.matches("GET", "/docs/apis"))
+        self.assertFalse(self.matcher.matches("GET", "/private/public"))
+
+    def test_methods(self):
+        self.assertTrue(self.matcher.matches("OPTIONS", "/private"))
+        self.assertFalse(self.matcher.matches("GET", "/private"))
+
+    def test_root_prefix(self):
+        matcher = _PublicPathMatcher(prefixes=["/"])
+        self.assertTrue(matcher.matches("GET", "/"))
+        self.assertTrue(matcher.matches("GET", "/a/b"))
+
+    def test_empty(self):
+        matcher = _PublicPathMatcher()
+        self.assertFalse(matcher.matches("GET", "/"))
+        self.assertFalse(matcher.matches("OPTIONS", "/healthz"))
+
+
+if __name__ == "__main__":
+    unittest.main()
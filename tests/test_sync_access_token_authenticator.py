@@ -0,0 +1,246 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from httpx import HTTPStatusError
+
+from tesseral_fastapi import InvalidAccessTokenException, SyncAccessTokenAuthenticator
+
+from tests._fixtures import PROJECT_ID, PUBLISHABLE_KEY, ConfigAPIStub, SigningKey
+
+
+class TestSyncAccessTokenAuthenticator(unittest.TestCase):
+    def setUp(self):
+        self.signing_key = SigningKey("session_signing_key_1")
+        self.config_api = ConfigAPIStub(self.signing_key)
+
+    def authenticator(self, **kwargs) -> SyncAccessTokenAuthenticator:
+        return SyncAccessTokenAuthenticator(
+            publishable_key=PUBLISHABLE_KEY,
+            http_client=self.config_api.sync_http_client(),
+            **kwargs,
+        )
+
+    def test_authenticate_access_token(self):
+        authenticator = self.authenticator()
+        claims = authenticator.authenticate_access_token(
+            access_token=self.signing_key.access_token()
+        )
+        self.assertEqual(claims.organization.id, "org_7908mz2ul9usdhy0gdd3tiean")
+        self.assertEqual(authenticator.project_id(), PROJECT_ID)
+
+        with pytest.raises(InvalidAccessTokenException):
+            authenticator.authenticate_access_token(
+                access_token=SigningKey("session_signing_key_1").access_token()
+            )
+
+    def test_malformed_claims(self):
+        authenticator = self.authenticator()
+        access_token = self.signing_key.access_token(organization="org_123")
+        with pytest.raises(InvalidAccessTokenException):
+            authenticator.authenticate_access_token(access_token=access_token)
+
+    def test_access_token_cache_hit(self):
+        authenticator = self.authenticator(access_token_cache_size=10)
+        access_token = self.signing_key.access_token()
+        first = authenticator.authenticate_access_token(access_token=access_token)
+        second = authenticator.authenticate_access_token(access_token=access_token)
+
+        self.assertEqual(first, second)
+        stats = authenticator.access_token_cache_stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 1, 1))
+
+    def test_rejected_access_token_cache(self):
+        authenticator = self.authenticator()
+        forged = SigningKey("session_signing_key_1").access_token()
+        for _ in range(3):
+            with pytest.raises(InvalidAccessTokenException):
+                authenticator.authenticate_access_token(access_token=forged)
+
+        self.assertEqual(
+            authenticator.access_token_rejection_stats(),
+            {"signature": 1, "rejected_cache": 2},
+        )
+        stats = authenticator.rejected_access_token_cache_stats()
+        self.assertEqual((stats.hits, stats.size), (2, 1))
+
+    def test_concurrent_config_fetches_are_coalesced(self):
+        self.config_api.latency_seconds = 0.1
+        authenticator = self.authenticator()
+        access_tokens = [self.signing_key.access_token() for _ in range(20)]
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            list(
+                executor.map(
+                    lambda access_token: authenticator.authenticate_access_token(
+                        access_token=access_token
+                    ),
+                    access_tokens,
+                )
+            )
+        self.assertEqual(self.config_api.requests, 1)
+
+    def test_concurrent_config_fetch_failure(self):
+        self.config_api.latency_seconds = 0.1
+        self.config_api.status_code = 503
+        authenticator = self.authenticator()
+        barrier = threading.Barrier(10)
+
+        def project_id() -> None:
+            barrier.wait()
+            with pytest.raises(HTTPStatusError):
+                authenticator.project_id()
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            for future in [executor.submit(project_id) for _ in range(10)]:
+                future.result()
+        # Threads that waited on the failed fetch share its failure.
+        self.assertEqual(self.config_api.requests, 1)
+
+    def test_soft_refresh_happens_in_background(self):
+        authenticator = self.authenticator()
+        authenticator.prewarm()
+        self.config_api.latency_seconds = 0.1
+        authenticator._config = authenticator._config.replace(
+            fetched_unix_seconds=0, soft_refresh_unix_seconds=0
+        )
+
+        start = time.perf_counter()
+        authenticator.authenticate_access_token(
+            access_token=self.signing_key.access_token()
+        )
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+        # wait for the background refresh
+        with authenticator._refresh_lock:
+            pass
+        self.assertEqual(self.config_api.requests, 2)
+        self.assertGreater(authenticator._config.soft_refresh_unix_seconds, 0)
+
+    def test_refresh_intervals_must_be_positive(self):
+        for kwargs in [
+            {"jwks_refresh_interval_seconds": 0},
+            {"jwks_soft_refresh_interval_seconds": 0},
+        ]:
+            with pytest.raises(RuntimeError):
+                self.authenticator(**kwargs)
+
+    def test_short_soft_refresh_interval_does_not_refresh_per_verification(self):
+        authenticator = self.authenticator(
+            jwks_refresh_interval_seconds=60, jwks_soft_refresh_interval_seconds=0.001
+        )
+        access_token = self.signing_key.access_token()
+        for _ in range(2000):
+            authenticator.authenticate_access_token(access_token=access_token)
+        with authenticator._refresh_lock:
+            pass
+        self.assertEqual(self.config_api.requests, 1)
+
+    def test_refresh_skipped_if_config_replaced_since_read(self):
+        authenticator = self.authenticator()
+        authenticator.prewarm()
+        config = authenticator._config
+
+        # another thread refreshes the config before we get to
+        authenticator._refresh_config(config)
+        self.assertEqual(self.config_api.requests, 2)
+        authenticator._refresh_config(config)
+        self.assertEqual(self.config_api.requests, 2)
+
+    def test_stale_keys_served_during_outage(self):
+        authenticator = self.authenticator()
+        authenticator.prewarm()
+        self.config_api.status_code = 503
+        authenticator._config = authenticator._config.replace(
+            soft_refresh_unix_seconds=0, next_refresh_unix_seconds=0
+        )
+
+        authenticator.authenticate_access_token(
+            access_token=self.signing_key.access_token()
+        )
+
+        authenticator._config = authenticator._config.replace(stale_unix_seconds=0)
+        with pytest.raises(HTTPStatusError):
+            authenticator.authenticate_access_token(
+                access_token=self.signing_key.access_token()
+            )
+
+    def test_unknown_kid_refresh(self):
+        authenticator = self.authenticator()
+        authenticator.prewarm()
+
+        new_key = SigningKey("session_signing_key_2")
+        self.config_api.keys = [self.signing_key, new_key]
+        authenticator.authenticate_access_token(access_token=new_key.access_token())
+        self.assertEqual(self.config_api.requests, 2)
+
+        # Refreshes for further unknown kids are rate-limited.
+        with pytest.raises(InvalidAccessTokenException):
+            authenticator.authenticate_access_token(
+                access_token=SigningKey("session_signing_key_3").access_token()
+            )
+        self.assertEqual(self.config_api.requests, 2)
+
+    def test_concurrent_verification_during_config_swaps(self):
+        # Two projects' configs are swapped in over and over, while threads
+        # verify tokens and read the config.
+        new_key = SigningKey("session_signing_key_2")
+        configs = {
+            "project_a": [self.signing_key],
+            "project_b": [self.signing_key, new_key],
+        }
+        self.config_api.project_id = "project_a"
+        authenticator = self.authenticator(
+            access_token_cache_size=16,
+            jwks_unknown_kid_refresh_interval_seconds=None,
+        )
+        authenticator.prewarm()
+        old_key_access_tokens = [
+            self.signing_key.access_token(ttl_seconds=300 + i) for i in range(32)
+        ]
+        access_tokens = old_key_access_tokens + [
+            new_key.access_token(ttl_seconds=300 + i) for i in range(32)
+        ]
+
+        stop = threading.Event()
+        errors = []
+
+        def worker(i: int) -> None:
+            while not stop.is_set():
+                config = authenticator._config
+                kids = {key.kid for key in configs[config.project_id]}
+                if set(config.jwks) != kids:
+                    errors.append(f"{config.project_id} with {set(config.jwks)}")
+
+                access_token = access_tokens[i % len(access_tokens)]
+                i += 1
+                try:
+                    authenticator.verify_access_token(access_token=access_token)
+                except InvalidAccessTokenException:
+                    # the old key is in both projects' configs
+                    if access_token in old_key_access_tokens:
+                        errors.append("rejected a token signed with the old key")
+                except Exception as e:
+                    errors.append(repr(e))
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in workers:
+            thread.start()
+        for i in range(50):
+            self.config_api.project_id = ["project_b", "project_a"][i % 2]
+            self.config_api.keys = configs[self.config_api.project_id]
+            authenticator._refresh_config()
+        stop.set()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        stats = authenticator.access_token_cache_stats()
+        self.assertGreater(stats.hits, 0)
+        self.assertLessEqual(stats.size, 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
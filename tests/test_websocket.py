@@ -0,0 +1,166 @@
+import time
+import unittest
+
+import pytest
+from fastapi import Depends, FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from tesseral_fastapi import Auth, RequireAuthMiddleware, get_auth
+from tesseral_fastapi._websocket import _websocket_credential
+
+from tests._fixtures import (
+    PROJECT_ID,
+    PUBLISHABLE_KEY,
+    BackendAPIStub,
+    ConfigAPIStub,
+    SigningKey,
+)
+
+_SUBPROTOCOL_PREFIX = "tesseral-access-token."
+
+
+class TestWebSocket(unittest.TestCase):
+    def setUp(self):
+        self.signing_key = SigningKey("session_signing_key_1")
+        app = FastAPI()
+        app.add_middleware(
+            RequireAuthMiddleware,
+            publishable_key=PUBLISHABLE_KEY,
+            http_client=ConfigAPIStub(self.signing_key).http_client(),
+            api_keys_enabled=True,
+            tesseral_client=BackendAPIStub(
+                {"api_key_1": {"organizationId": "org_123"}}
+            ).tesseral_client(),
+            public_paths=["/public"],
+            websocket_access_token_subprotocol_prefix=_SUBPROTOCOL_PREFIX,
+            websocket_access_token_query_param="access_token",
+        )
+
+        @app.websocket("/ws")
+        async def ws(websocket: WebSocket, auth: Auth = Depends(get_auth)):
+            await websocket.accept(
+                subprotocol=websocket.scope["subprotocols"][0]
+                if websocket.scope["subprotocols"]
+                else None
+            )
+            await websocket.send_json(
+                {
+                    "organization_id": auth.organization_id(),
+                    "subprotocols": websocket.scope["subprotocols"],
+                }
+            )
+            try:
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                pass
+
+        @app.websocket("/public")
+        async def public(websocket: WebSocket):
+            await websocket.accept()
+            await websocket.send_json({})
+            await websocket.close()
+
+        self.client = TestClient(app)
+
+    def test_header(self):
+        access_token = self.signing_key.access_token()
+        with self.client.websocket_connect(
+            "/ws", headers={"Authorization": f"Bearer {access_token}"}
+        ) as websocket:
+            self.assertEqual(
+                websocket.receive_json()["organization_id"],
+                "org_7908mz2ul9usdhy0gdd3tiean",
+            )
+
+    def test_cookie(self):
+        self.client.cookies.set(
+            f"tesseral_{PROJECT_ID}_access_token", self.signing_key.access_token()
+        )
+        with self.client.websocket_connect("/ws") as websocket:
+            websocket.receive_json()
+
+    def test_subprotocol(self):
+        access_token = self.signing_key.access_token()
+        with self.client.websocket_connect(
+            "/ws", subprotocols=["chat", _SUBPROTOCOL_PREFIX + access_token]
+        ) as websocket:
+            # the app does not see the credential
+            self.assertEqual(websocket.receive_json()["subprotocols"], ["chat"])
+            self.assertEqual(websocket.accepted_subprotocol, "chat")
+
+    def test_only_credential_subprotocol(self):
+        # as a browser that only needs the subprotocol to pass its credential
+        subprotocol = _SUBPROTOCOL_PREFIX + self.signing_key.access_token()
+        with self.client.websocket_connect(
+            "/ws", subprotocols=[subprotocol]
+        ) as websocket:
+            self.assertEqual(websocket.receive_json()["subprotocols"], [])
+            self.assertEqual(websocket.accepted_subprotocol, subprotocol)
+
+    def test_query_param(self):
+        with self.client.websocket_connect("/ws?access_token=api_key_1") as websocket:
+            self.assertEqual(websocket.receive_json()["organization_id"], "org_123")
+
+    def test_unauthenticated(self):
+        with pytest.raises(WebSocketDisconnect) as e:
+            with self.client.websocket_connect("/ws"):
+                pass
+        self.assertEqual(e.value.code, 1008)
+
+        with pytest.raises(WebSocketDisconnect) as e:
+            with self.client.websocket_connect("/ws?access_token=api_key_2"):
+                pass
+        self.assertEqual(e.value.code, 1008)
+
+    def test_public_path(self):
+        with self.client.websocket_connect("/public") as websocket:
+            self.assertEqual(websocket.receive_json(), {})
+
+    def test_closed_on_expiry(self):
+        # exp is in whole seconds; start just after a second boundary, so that
+        # the token lives for almost a second.
+        time.sleep(1.05 - time.time() % 1)
+        access_token = self.signing_key.access_token(ttl_seconds=1)
+        with self.client.websocket_connect(
+            "/ws", headers={"Authorization": f"Bearer {access_token}"}
+        ) as websocket:
+            websocket.receive_json()
+            with pytest.raises(WebSocketDisconnect) as e:
+                websocket.receive_json()
+            self.assertEqual(e.value.code, 1008)
+            self.assertEqual(e.value.reason, "Access token expired")
+
+
+class TestWebSocketCredential(unittest.TestCase):
+    def scope(self, subprotocols, query_string=b""):
+        return {"subprotocols": subprotocols, "query_string": query_string}
+
+    def test_subprotocol(self):
+        scope, credential = _websocket_credential(
+            self.scope(["a", "token.a.b.c", "b"]), "token.", None
+        )
+        self.assertEqual(credential, "a.b.c")
+        self.assertEqual(scope["subprotocols"], ["a", "b"])
+
+    def test_query_param(self):
+        scope, credential = _websocket_credential(
+            self.scope([], b"x=1&access_token=a.b.c"), "token.", "access_token"
+        )
+        self.assertEqual(credential, "a.b.c")
+
+    def test_none(self):
+        original = self.scope(["a"], b"x=1")
+        scope, credential = _websocket_credential(original, "token.", "access_token")
+        self.assertEqual(credential, "")
+        self.assertIs(scope, original)
+
+        scope, credential = _websocket_credential(
+            self.scope(["token.a.b.c"], b"access_token=x"), None, None
+        )
+        self.assertEqual(credential, "")
+
+
+if __name__ == "__main__":
+    unittest.main()